@@ -0,0 +1,175 @@
+"""
+このファイルは、回答のキャッシュに関する処理が記述されたファイルです。
+会話履歴なしでも理解できる入力テキスト（検索クエリ）の埋め込みベクトルが、過去の質問と十分に近い場合は、
+検索とLLMの呼び出しを行わずに保存済みの回答と参照元を返します。
+"""
+
+############################################################
+# ライブラリの読み込み
+############################################################
+import threading
+import time
+from collections import OrderedDict
+from itertools import count
+import numpy as np
+
+
+############################################################
+# クラス定義
+############################################################
+
+class SemanticAnswerCache:
+    """
+    (検索クエリの埋め込みベクトル, 回答モード, 検索対象の絞り込み条件, インデックスのバージョン) をキーに回答を保存するキャッシュ
+    インデックスのバージョンが変わった時点で全件破棄し、有効期限（TTL）と件数の上限（LRU）でも削除する
+    """
+
+    def __init__(self, max_entries, ttl_seconds, similarity_threshold, clock=time.monotonic):
+        """
+        Args:
+            max_entries: 保存する回答の件数の上限
+            ttl_seconds: 回答の有効期限（秒）
+            similarity_threshold: 同じ質問とみなすコサイン類似度の下限
+            clock: 現在時刻（秒）を返す関数（有効期限の判定に使う）
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._entries = OrderedDict()
+        self._version = None
+        self._ids = count()
+        self._lock = threading.Lock()
+
+    def lookup(self, query_vector, mode, version, search_filter=None):
+        """
+        キャッシュから、検索クエリが最も近い回答を検索
+
+        Args:
+            query_vector: 検索クエリの埋め込みベクトル
+            mode: 回答モード
+            version: 現在のインデックスのバージョン
+            search_filter: 検索対象の絞り込み条件（Noneの場合は絞り込みなし）
+
+        Returns:
+            「answer」「context」「similarity」「elapsed_seconds」をキーに持つ辞書（該当がない場合はNone）
+        """
+        vector = normalize_vector(query_vector)
+        with self._lock:
+            self._sync_version(version)
+            self._evict_expired()
+
+            best_key, best_similarity = None, -1.0
+            for key, entry in self._entries.items():
+                if entry["mode"] != mode or entry["search_filter"] != search_filter:
+                    continue
+                similarity = float(np.dot(vector, entry["vector"]))
+                if similarity > best_similarity:
+                    best_key, best_similarity = key, similarity
+
+            if best_key is None or best_similarity < self.similarity_threshold:
+                self.misses += 1
+                return None
+
+            # 最近使われた回答として、削除の順番を後ろに回す
+            self._entries.move_to_end(best_key)
+            entry = self._entries[best_key]
+            self.hits += 1
+            self.saved_seconds += entry["elapsed_seconds"]
+            return {
+                "answer": entry["answer"],
+                "context": entry["context"],
+                "similarity": best_similarity,
+                "elapsed_seconds": entry["elapsed_seconds"],
+            }
+
+    def store(self, query_vector, mode, version, answer, context, elapsed_seconds, search_filter=None):
+        """
+        回答をキャッシュに保存
+
+        Args:
+            query_vector: 検索クエリの埋め込みベクトル
+            mode: 回答モード
+            version: 回答の作成に使ったインデックスのバージョン
+            answer: 回答
+            context: 参照元のドキュメントの一覧
+            elapsed_seconds: 回答の作成にかかった時間（秒）。キャッシュによる短縮時間の集計に使う
+            search_filter: 検索対象の絞り込み条件（Noneの場合は絞り込みなし）
+        """
+        with self._lock:
+            self._sync_version(version)
+            # 回答の作成中にインデックスが差し替わった場合は、古いインデックスによる回答のため保存しない
+            if version != self._version:
+                return
+            self._entries[next(self._ids)] = {
+                "vector": normalize_vector(query_vector),
+                "mode": mode,
+                "search_filter": search_filter,
+                "answer": answer,
+                "context": context,
+                "elapsed_seconds": elapsed_seconds,
+                "created_at": self.clock(),
+            }
+            # 上限を超えた場合、最も長く使われていないものから削除
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_stats(self):
+        """
+        キャッシュの利用状況の取得
+
+        Returns:
+            「hits」「misses」「hit_rate」「saved_seconds」「entries」をキーに持つ辞書
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "saved_seconds": self.saved_seconds,
+                "entries": len(self._entries),
+            }
+
+    def _sync_version(self, version):
+        """
+        インデックスのバージョンが新しくなった場合、保存済みの回答を全件破棄
+
+        Args:
+            version: インデックスのバージョン
+        """
+        if self._version is None or version > self._version:
+            if self._version is not None:
+                self._entries.clear()
+            self._version = version
+
+    def _evict_expired(self):
+        """
+        有効期限切れの回答を削除
+        """
+        now = self.clock()
+        expired_keys = [key for key, entry in self._entries.items() if now - entry["created_at"] > self.ttl_seconds]
+        for key in expired_keys:
+            del self._entries[key]
+
+
+############################################################
+# 関数定義
+############################################################
+
+def normalize_vector(vector):
+    """
+    ベクトルを長さ1に正規化（内積がそのままコサイン類似度になるようにする）
+
+    Args:
+        vector: ベクトル
+
+    Returns:
+        正規化したベクトル
+    """
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -0,0 +1,627 @@
+"""
+このファイルは、インデックス作成・検索・回答生成の処理時間を計測するベンチマークのファイルです。
+OpenAIのAPIは呼び出さず、決定的な埋め込みモデルと固定応答のチャットモデルで代用します。
+
+実行例:
+    python benchmark.py --k 4 10 50 --repeat 20
+"""
+
+############################################################
+# ライブラリの読み込み
+############################################################
+import os
+import argparse
+import json
+import logging
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models import FakeListChatModel
+from langchain.schema import AIMessage, HumanMessage
+import constants as ct
+import indexer
+import file_loader
+import utils
+import components as cn
+from embedding_cache import CachedEmbeddings
+from lexical_index import get_doc_key
+from numpy_vector_store import NumpyVectorStore
+
+
+############################################################
+# 設定関連
+############################################################
+# 検索・回答生成の計測に使う質問
+DEFAULT_QUERIES = [
+    "社員の育成方針について教えて",
+    "有給休暇の取得方法を知りたい",
+    "人事部に所属している従業員情報を一覧化して",
+    "MCPについて教えて",
+    "経費精算の申請手順は？",
+    "リモートワークのルールを教えて",
+    "新入社員研修のスケジュール",
+    "顧客との打ち合わせの議事録はある？",
+]
+# 固定応答のチャットモデルが返す回答
+FAKE_LLM_RESPONSES = ["ベンチマーク用の回答です。"]
+# 計測に使う埋め込みモデル名（埋め込みキャッシュのキーに含まれる）
+FAKE_EMBEDDING_MODEL = "benchmark-fake-embedding"
+
+
+############################################################
+# クラス定義
+############################################################
+
+class LatencyFakeEmbedding(DeterministicFakeEmbedding):
+    """
+    APIの応答時間を模擬するため、呼び出しごとに一定時間待機する決定的な埋め込みモデル
+    """
+    latency: float = 0.0
+
+    def embed_documents(self, texts):
+        if self.latency:
+            time.sleep(self.latency)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        if self.latency:
+            time.sleep(self.latency)
+        return super().embed_query(text)
+
+
+############################################################
+# 関数定義
+############################################################
+
+def main():
+    """
+    ベンチマークの実行
+    """
+    args = parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger(ct.LOGGER_NAME).setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+    # インデックスや各種キャッシュの保存先を一時フォルダに切り替え、既存のインデックスには触れない
+    work_dir = tempfile.mkdtemp(prefix="benchmark-")
+    ct.RAG_TOP_FOLDER_PATH = args.data_dir
+    ct.VECTOR_STORE_DIR_PATH = os.path.join(work_dir, "chroma")
+    ct.INDEX_MANIFEST_PATH = os.path.join(work_dir, "manifest.json")
+    ct.WEB_CACHE_DIR_PATH = os.path.join(work_dir, "web_cache")
+    ct.NUMPY_INDEX_DIR_PATH = os.path.join(work_dir, "numpy")
+    if not args.with_web:
+        ct.WEB_URL_LOAD_TARGETS = []
+
+    queries = load_queries(args.queries_file)
+    results = {
+        "meta": get_run_metadata(args),
+        "stages": {},
+    }
+
+    try:
+        source_paths = indexer.collect_source_files(ct.RAG_TOP_FOLDER_PATH)
+
+        docs, results["stages"]["parse"] = bench_parse(source_paths)
+        chunks, results["stages"]["split"] = bench_split(docs)
+        results["stages"]["embed_store"] = bench_embed_store(chunks, args, work_dir)
+
+        index, results["stages"]["build"] = bench_build(args, work_dir)
+        results["stages"]["retrieval"] = bench_retrieval(index, queries, args.k, args.repeat)
+        results["stages"]["vector_backends"] = bench_vector_backends(index, queries, args.k, args.repeat, work_dir)
+        results["stages"]["end_to_end"] = bench_end_to_end(index, queries, args.repeat)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    results["peak_rss_mb"] = get_peak_rss_mb()
+
+    output_path = args.output or os.path.join(
+        ct.BENCHMARK_RESULT_DIR_PATH,
+        f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{results['meta']['git_sha'][:8]}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+    print_summary(results)
+    print(f"\n結果の保存先: {output_path}")
+
+
+def parse_args():
+    """
+    コマンドライン引数の解析
+
+    Returns:
+        解析済みの引数
+    """
+    parser = argparse.ArgumentParser(description="インデックス作成・検索・回答生成のベンチマーク")
+    parser.add_argument("--data-dir", default=ct.RAG_TOP_FOLDER_PATH, help="データソースのフォルダ")
+    parser.add_argument("--k", type=int, nargs="+", default=[4, 10, ct.SEARCH_KWARGS["k"]], help="検索件数（複数指定可）")
+    parser.add_argument("--repeat", type=int, default=10, help="検索・回答生成で、質問の一覧を繰り返す回数")
+    parser.add_argument("--queries-file", help="1行1件の質問を記載したテキストファイル")
+    parser.add_argument("--embedding-size", type=int, default=1536, help="埋め込みベクトルの次元数")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="埋め込みAPIの1呼び出しあたりの模擬応答時間（秒）")
+    parser.add_argument("--with-web", action="store_true", help="WebページもRAGの参照先に含める")
+    parser.add_argument("--output", help="結果を保存するJSONファイルのパス")
+    parser.add_argument("--verbose", action="store_true", help="アプリのログも表示する")
+    return parser.parse_args()
+
+
+def load_queries(queries_file):
+    """
+    計測に使う質問の読み込み
+
+    Args:
+        queries_file: 1行1件の質問を記載したテキストファイルのパス（Noneの場合は既定の質問）
+
+    Returns:
+        質問の一覧
+    """
+    if not queries_file:
+        return DEFAULT_QUERIES
+    with open(queries_file, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def create_fake_embeddings(args, work_dir):
+    """
+    計測用の埋め込みモデルの作成（アプリと同様に埋め込みキャッシュを挟む）
+
+    Args:
+        args: コマンドライン引数
+        work_dir: 埋め込みキャッシュの保存先フォルダ
+
+    Returns:
+        埋め込みモデル
+    """
+    fake = LatencyFakeEmbedding(size=args.embedding_size, latency=args.embed_latency)
+    return CachedEmbeddings(fake, FAKE_EMBEDDING_MODEL, cache_path=os.path.join(work_dir, "embedding_cache.sqlite3"))
+
+
+def bench_parse(source_paths):
+    """
+    ファイル形式ごとの読み込み速度の計測
+
+    Args:
+        source_paths: 読み込み対象のファイルパスの一覧
+
+    Returns:
+        (読み込んだドキュメントの一覧, 計測結果の辞書) のタプル
+    """
+    stats = defaultdict(lambda: {"files": 0, "bytes": 0, "docs": 0, "seconds": 0.0})
+    docs = []
+    for path in source_paths:
+        start = time.perf_counter()
+        file_docs, error = file_loader.load_file_safely(path)
+        elapsed = time.perf_counter() - start
+        stat = stats[os.path.splitext(path)[1].lower()]
+        stat["files"] += 1
+        stat["bytes"] += os.path.getsize(path)
+        stat["docs"] += len(file_docs)
+        stat["seconds"] += elapsed
+        if error is None:
+            docs.extend(file_docs)
+
+    for stat in stats.values():
+        stat["files_per_second"] = _rate(stat["files"], stat["seconds"])
+        stat["mb_per_second"] = _rate(stat["bytes"] / 1024 / 1024, stat["seconds"])
+
+    # アプリと同じ並列読み込みの所要時間
+    start = time.perf_counter()
+    for _ in indexer.load_files(source_paths):
+        pass
+    parallel_seconds = time.perf_counter() - start
+
+    return docs, {
+        "by_type": dict(stats),
+        "serial_seconds": sum(stat["seconds"] for stat in stats.values()),
+        "parallel_seconds": parallel_seconds,
+        "peak_rss_mb": get_peak_rss_mb(),
+    }
+
+
+def bench_split(docs):
+    """
+    文字列調整・チャンク分割の速度の計測
+
+    Args:
+        docs: 読み込んだドキュメントの一覧
+
+    Returns:
+        (チャンクの一覧, 計測結果の辞書) のタプル
+    """
+    start = time.perf_counter()
+    chunks = indexer.split_documents(docs)
+    elapsed = time.perf_counter() - start
+    characters = sum(len(chunk.page_content) for chunk in chunks)
+    return chunks, {
+        "docs": len(docs),
+        "chunks": len(chunks),
+        "characters": characters,
+        "seconds": elapsed,
+        "chunks_per_second": _rate(len(chunks), elapsed),
+        "peak_rss_mb": get_peak_rss_mb(),
+    }
+
+
+def bench_embed_store(chunks, args, work_dir):
+    """
+    バッチ化・埋め込み・ベクターストアへの保存の速度の計測
+
+    Args:
+        chunks: チャンクの一覧
+        args: コマンドライン引数
+        work_dir: 作業用フォルダ
+
+    Returns:
+        計測結果の辞書
+    """
+    embeddings = create_fake_embeddings(args, os.path.join(work_dir, "embed_store"))
+    db = indexer.open_vector_store(embeddings, f"{ct.COLLECTION_NAME}_benchmark")
+
+    start = time.perf_counter()
+    batches = list(indexer.iter_embedding_batches((chunk, str(i)) for i, chunk in enumerate(chunks)))
+    batch_seconds = time.perf_counter() - start
+    stored = sum(indexer.embed_and_store(db, embeddings, iter(batches)))
+    elapsed = time.perf_counter() - start
+    db.delete_collection()
+
+    return {
+        "chunks": stored,
+        "batches": len(batches),
+        "batching_seconds": batch_seconds,
+        "seconds": elapsed,
+        "chunks_per_second": _rate(stored, elapsed),
+        "peak_rss_mb": get_peak_rss_mb(),
+    }
+
+
+def bench_build(args, work_dir):
+    """
+    インデックス作成の所要時間の計測（初回作成と、差分がない場合の再作成）
+
+    Args:
+        args: コマンドライン引数
+        work_dir: 作業用フォルダ
+
+    Returns:
+        (作成したインデックス, 計測結果の辞書) のタプル
+    """
+    embeddings = create_fake_embeddings(args, os.path.join(work_dir, "build"))
+
+    # 最初に検索可能になるまでの時間も記録する
+    first_ready = []
+    def publish(_):
+        if not first_ready:
+            first_ready.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    index = indexer.build_index(publish=publish, embeddings=embeddings)
+    cold_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    indexer.build_index(embeddings=embeddings)
+    warm_seconds = time.perf_counter() - start
+
+    return index, {
+        "cold_seconds": cold_seconds,
+        "cold_first_searchable_seconds": first_ready[0] if first_ready else None,
+        "unchanged_rebuild_seconds": warm_seconds,
+        "chunks": len(index["retriever"].vectorstore.get()["ids"]),
+        "lexical_index_docs": len(index["retriever"].lexical_index.docs),
+        "peak_rss_mb": get_peak_rss_mb(),
+    }
+
+
+def bench_retrieval(index, queries, k_values, repeat):
+    """
+    検索件数ごとの検索レイテンシの計測（ハイブリッド検索と、比較用のベクトル検索のみ・語句検索のみ）
+
+    Args:
+        index: 作成したインデックス
+        queries: 質問の一覧
+        k_values: 検索件数の一覧
+        repeat: 質問の一覧を繰り返す回数
+
+    Returns:
+        検索件数をキー、(検索方式をキー、計測結果を値とする辞書) を値とする辞書
+    """
+    hybrid_retriever = index["retriever"]
+    results = {}
+    for k in k_values:
+        search_functions = {
+            "hybrid": hybrid_retriever.model_copy(update={"k": k}).invoke,
+            "vector": lambda query: hybrid_retriever.vectorstore.similarity_search(query, k=k),
+            "lexical": lambda query: hybrid_retriever.lexical_index.search(query, k),
+        }
+        results[str(k)] = {}
+        for name, search in search_functions.items():
+            # 初回呼び出しのオーバーヘッドを除くため、1回空打ちする
+            search(queries[0])
+            latencies = []
+            for _ in range(repeat):
+                for query in queries:
+                    start = time.perf_counter()
+                    search(query)
+                    latencies.append(time.perf_counter() - start)
+            results[str(k)][name] = summarize_latencies(latencies)
+    return results
+
+
+def bench_vector_backends(index, queries, k_values, repeat, work_dir):
+    """
+    ベクターストアの実装ごとの比較（Chromaと、NumPyの配列の各保持形式）
+    起動時に開く・読み込むまでの時間、ベクトルのメモリ・ディスク使用量、検索レイテンシ、
+    厳密な検索結果（NumPyのfloat32）に対する再現率を計測する
+
+    Args:
+        index: 作成したインデックス
+        queries: 質問の一覧
+        k_values: 検索件数の一覧
+        repeat: 質問の一覧を繰り返す回数
+        work_dir: 作業用フォルダ
+
+    Returns:
+        実装名をキー、計測結果を値とする辞書
+    """
+    embeddings = index["retriever"].vectorstore.embeddings
+    manifest = indexer.load_manifest()
+
+    # 各実装を、アプリの起動時と同じ方法で開く（初回の検索までを含める）
+    stores, results = {}, {}
+    start = time.perf_counter()
+    db = indexer.open_vector_store(embeddings, manifest["collection"])
+    db.similarity_search(queries[0], k=1)
+    stores["chroma"] = db
+    results["chroma"] = {
+        "open_seconds": time.perf_counter() - start,
+        "disk_mb": get_dir_size_mb(ct.VECTOR_STORE_DIR_PATH),
+    }
+    for dtype in ["float32", "float16", "int8"]:
+        path = os.path.join(work_dir, "numpy-bench", dtype)
+        os.makedirs(path, exist_ok=True)
+        start = time.perf_counter()
+        NumpyVectorStore.from_vectorstore(db, dtype).save(path)
+        build_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        store = NumpyVectorStore.load(path, embeddings)
+        store.similarity_search(queries[0], k=1)
+        stores[f"numpy-{dtype}"] = store
+        results[f"numpy-{dtype}"] = {
+            "build_seconds": build_seconds,
+            "open_seconds": time.perf_counter() - start,
+            "vector_mb": store.nbytes / 1024 / 1024,
+            "disk_mb": get_dir_size_mb(path),
+        }
+
+    # 再現率の基準とする厳密な検索結果
+    exact_store = stores["numpy-float32"]
+    for name, store in stores.items():
+        results[name]["by_k"] = {}
+        for k in k_values:
+            latencies, recalls = [], []
+            for _ in range(repeat):
+                for query in queries:
+                    start = time.perf_counter()
+                    docs = store.similarity_search(query, k=k)
+                    latencies.append(time.perf_counter() - start)
+                    expected = {get_doc_key(doc) for doc in exact_store.similarity_search(query, k=k)}
+                    recalls.append(len(expected & {get_doc_key(doc) for doc in docs}) / len(expected) if expected else 1.0)
+            results[name]["by_k"][str(k)] = {**summarize_latencies(latencies), "recall": float(np.mean(recalls))}
+
+    # NumPyの配列の場合、複数の質問をまとめて1回の行列積で検索した場合の1質問あたりの時間も計測する
+    query_vectors = [embeddings.embed_query(query) for query in queries]
+    for name, store in stores.items():
+        if not isinstance(store, NumpyVectorStore):
+            continue
+        start = time.perf_counter()
+        for _ in range(repeat):
+            store.search_by_vectors(query_vectors, max(k_values))
+        results[name]["batched_ms_per_query"] = (time.perf_counter() - start) * 1000 / (repeat * len(queries))
+
+    return results
+
+
+def get_dir_size_mb(path):
+    """
+    フォルダ内のファイルサイズの合計の取得
+
+    Args:
+        path: フォルダのパス
+
+    Returns:
+        ファイルサイズの合計（MB）
+    """
+    total = 0
+    for dir_path, _, file_names in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(dir_path, file_name)) for file_name in file_names)
+    return total / 1024 / 1024
+
+
+def bench_end_to_end(index, queries, repeat):
+    """
+    回答モードごとの「質問 → 検索 → 回答生成 → 表示用データの作成」のレイテンシの計測
+
+    Args:
+        index: 作成したインデックス
+        queries: 質問の一覧
+        repeat: 質問の一覧を繰り返す回数
+
+    Returns:
+        回答モードをキー、計測結果を値とする辞書
+    """
+    llm = FakeListChatModel(responses=FAKE_LLM_RESPONSES)
+    # 会話履歴ありの状態（独立した質問文の生成が行われる状態）で計測する
+    chat_history = [HumanMessage(content=queries[0]), AIMessage(content=FAKE_LLM_RESPONSES[0])]
+    prepare_content = {
+        ct.ANSWER_MODE_1: cn.prepare_search_content,
+        ct.ANSWER_MODE_2: cn.prepare_contact_content,
+    }
+
+    results = {}
+    for mode, prepare in prepare_content.items():
+        # 「社内文書検索」モードはChainを使わず、関連度スコアのみで回答を作成する
+        if mode == ct.ANSWER_MODE_1:
+            question_generator_chain = utils.create_question_generator_chain(llm)
+            answer = lambda query: utils.search_documents(
+                query, chat_history,
+                utils.get_standalone_question(query, chat_history, question_generator_chain),
+                index["retriever"]
+            )
+        else:
+            chain = utils.create_rag_chain(llm, index["retriever"], mode)
+            answer = lambda query: chain.invoke({"input": query, "chat_history": chat_history})
+        latencies = []
+        for _ in range(repeat):
+            for query in queries:
+                start = time.perf_counter()
+                prepare(answer(query))
+                latencies.append(time.perf_counter() - start)
+        results[mode] = summarize_latencies(latencies)
+    return results
+
+
+def summarize_latencies(latencies):
+    """
+    レイテンシの集計
+
+    Args:
+        latencies: レイテンシ（秒）の一覧
+
+    Returns:
+        件数・平均・パーセンタイル（ミリ秒）の辞書
+    """
+    values = np.array(latencies) * 1000
+    return {
+        "count": len(latencies),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+    }
+
+
+def get_peak_rss_mb():
+    """
+    自プロセスと子プロセス（ファイル読み込み用のプロセスプール）の最大メモリ使用量の取得
+
+    Returns:
+        最大メモリ使用量（MB）。取得できない環境（Windows）の場合はNone
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Linuxではキロバイト、macOSではバイト単位で返される
+    unit = 1 if sys.platform == "darwin" else 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit / 1024 / 1024,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit / 1024 / 1024,
+    }
+
+
+def get_run_metadata(args):
+    """
+    実行環境と設定値の取得（コミット間で結果を比較するため）
+
+    Args:
+        args: コマンドライン引数
+
+    Returns:
+        実行環境と設定値の辞書
+    """
+    try:
+        git_sha = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        git_dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        git_sha, git_dirty = "unknown", None
+
+    return {
+        "git_sha": git_sha,
+        "git_dirty": git_dirty,
+        "run_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "args": vars(args),
+        "settings": {
+            "chunk_token_size": ct.CHUNK_TOKEN_SIZE,
+            "search_kwargs": ct.SEARCH_KWARGS,
+            "batch_size": ct.BATCH_SIZE,
+            "embedding_batch_max_tokens": ct.EMBEDDING_BATCH_MAX_TOKENS,
+            "embedding_max_workers": ct.EMBEDDING_MAX_WORKERS,
+            "load_max_workers": ct.LOAD_MAX_WORKERS,
+            "load_parallel_min_bytes": ct.LOAD_PARALLEL_MIN_BYTES,
+        },
+    }
+
+
+def print_summary(results):
+    """
+    計測結果の要約を表示
+
+    Args:
+        results: 計測結果の辞書
+    """
+    stages = results["stages"]
+    print(f"commit: {results['meta']['git_sha'][:8]}{' (dirty)' if results['meta']['git_dirty'] else ''}")
+
+    print("\n[読み込み]")
+    for ext, stat in sorted(stages["parse"]["by_type"].items()):
+        print(f"  {ext:6} {stat['files']:4}件  {stat['seconds']:.3f}s  {stat['files_per_second']:.1f}件/s  {stat['mb_per_second']:.2f}MB/s")
+    print(f"  直列: {stages['parse']['serial_seconds']:.3f}s  並列: {stages['parse']['parallel_seconds']:.3f}s")
+
+    print("\n[チャンク分割]")
+    print(f"  {stages['split']['chunks']}チャンク  {stages['split']['seconds']:.3f}s  {stages['split']['chunks_per_second']:.0f}チャンク/s")
+
+    print("\n[埋め込み・保存]")
+    print(f"  {stages['embed_store']['batches']}バッチ  {stages['embed_store']['seconds']:.3f}s  {stages['embed_store']['chunks_per_second']:.0f}チャンク/s")
+
+    print("\n[インデックス作成]")
+    print(f"  初回: {stages['build']['cold_seconds']:.3f}s  差分なしの再作成: {stages['build']['unchanged_rebuild_seconds']:.3f}s")
+
+    print("\n[検索]")
+    for k, stats in stages["retrieval"].items():
+        for name, stat in stats.items():
+            print(f"  k={k:<4} {name:8} p50 {stat['p50_ms']:.1f}ms  p95 {stat['p95_ms']:.1f}ms  p99 {stat['p99_ms']:.1f}ms")
+
+    print("\n[ベクターストアの実装の比較]")
+    for name, stat in stages["vector_backends"].items():
+        memory = f"  ベクトル {stat['vector_mb']:.1f}MB" if "vector_mb" in stat else ""
+        batched = f"  まとめて検索 {stat['batched_ms_per_query']:.2f}ms/件" if "batched_ms_per_query" in stat else ""
+        print(f"  {name:14} 起動 {stat['open_seconds'] * 1000:.0f}ms  ディスク {stat['disk_mb']:.1f}MB{memory}{batched}")
+        for k, k_stat in stat["by_k"].items():
+            print(f"    k={k:<4} p50 {k_stat['p50_ms']:.2f}ms  p95 {k_stat['p95_ms']:.2f}ms  再現率 {k_stat['recall']:.3f}")
+
+    print("\n[回答生成（エンドツーエンド）]")
+    for mode, stat in stages["end_to_end"].items():
+        print(f"  {mode}  p50 {stat['p50_ms']:.1f}ms  p95 {stat['p95_ms']:.1f}ms  p99 {stat['p99_ms']:.1f}ms")
+
+    if results["peak_rss_mb"]:
+        print(f"\n[最大メモリ使用量] 本体: {results['peak_rss_mb']['self']:.0f}MB  子プロセス: {results['peak_rss_mb']['children']:.0f}MB")
+
+
+def _rate(amount, seconds):
+    """
+    1秒あたりの処理量の計算
+
+    Args:
+        amount: 処理量
+        seconds: 所要時間（秒）
+
+    Returns:
+        1秒あたりの処理量
+    """
+    return amount / seconds if seconds else 0.0
+
+
+if __name__ == "__main__":
+    main()
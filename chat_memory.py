@@ -0,0 +1,98 @@
+"""
+このファイルは、LLMとのやりとり用の会話履歴の上限管理に関する処理が記述されたファイルです。
+会話履歴がトークン数の上限（CHAT_HISTORY_TOKEN_BUDGET）または往復数の上限を超えた場合、
+古い往復をLLMで要約文にまとめ、プロンプトには「要約文 + 直近の往復」のみを渡すことで、
+長い会話でも1回あたりのプロンプトのトークン数をほぼ一定に保ちます。
+"""
+
+############################################################
+# ライブラリの読み込み
+############################################################
+from langchain.schema import SystemMessage
+import constants as ct
+import tokenizer
+
+
+############################################################
+# 関数定義
+############################################################
+
+def get_compaction_size(chat_history, token_budget=None, max_turns=None):
+    """
+    要約文にまとめる、会話履歴の先頭からのメッセージ数を取得
+    上限を超えた場合は、上限の一定割合（CHAT_HISTORY_COMPACT_RATIO）まで減らし、要約の頻度を抑える（直近の1往復は必ず残す）
+
+    Args:
+        chat_history: 会話履歴（ユーザー入力とLLMからの回答のメッセージが交互に並んだもの）
+        token_budget: 会話履歴のトークン数の上限（省略時は CHAT_HISTORY_TOKEN_BUDGET）
+        max_turns: 会話履歴に残す往復数の上限（省略時は CHAT_HISTORY_MAX_TURNS）
+
+    Returns:
+        要約文にまとめるメッセージ数（上限を超えていない場合は0）
+    """
+    if token_budget is None:
+        token_budget = ct.CHAT_HISTORY_TOKEN_BUDGET
+    if max_turns is None:
+        max_turns = ct.CHAT_HISTORY_MAX_TURNS
+
+    tokens = [count_message_tokens(message) for message in chat_history]
+    total_tokens = sum(tokens)
+    if total_tokens <= token_budget and len(chat_history) <= max_turns * 2:
+        return 0
+
+    target_tokens = token_budget * ct.CHAT_HISTORY_COMPACT_RATIO
+    target_messages = max(2, int(max_turns * ct.CHAT_HISTORY_COMPACT_RATIO) * 2)
+    size = 0
+    # 往復（ユーザー入力と回答の2件）単位で、古いものから要約の対象にする
+    while size + 2 < len(chat_history) and (total_tokens > target_tokens or len(chat_history) - size > target_messages):
+        total_tokens -= tokens[size] + tokens[size + 1]
+        size += 2
+    return size
+
+
+def count_message_tokens(message):
+    """
+    メッセージのトークン数を計算（ロールなどの付加情報の分を加える）
+
+    Args:
+        message: メッセージ
+
+    Returns:
+        トークン数
+    """
+    return tokenizer.count_tokens(message.content, ct.CONTEXT_ENCODING_NAME) + ct.CHAT_MESSAGE_TOKEN_OVERHEAD
+
+
+def summarize_history(summary_chain, summary, messages):
+    """
+    これまでの要約文に古い往復の内容を加えた、新しい要約文を作成
+
+    Args:
+        summary_chain: 「summary」「conversation」を入力とし、要約文を返すChain
+        summary: これまでの要約文（ない場合は空文字）
+        messages: 要約文にまとめるメッセージの一覧
+
+    Returns:
+        新しい要約文（CHAT_SUMMARY_MAX_LENGTH 文字まで）
+    """
+    conversation = ct.SEPARATOR.join(
+        f"{ct.CHAT_SUMMARY_ROLE_LABELS.get(message.type, message.type)}: {message.content}" for message in messages
+    )
+    new_summary = summary_chain.invoke({"summary": summary or "（なし）", "conversation": conversation})
+    return new_summary.strip()[:ct.CHAT_SUMMARY_MAX_LENGTH]
+
+
+def build_prompt_history(summary, chat_history):
+    """
+    プロンプトに渡す会話履歴を作成（要約文がある場合は、先頭にシステムメッセージとして加える）
+
+    Args:
+        summary: これまでの要約文（ない場合は空文字）
+        chat_history: 要約文にまとめていない直近の会話履歴
+
+    Returns:
+        メッセージの一覧
+    """
+    if not summary:
+        return list(chat_history)
+    return [SystemMessage(content=f"{ct.CHAT_SUMMARY_PREFIX}{summary}"), *chat_history]
@@ -8,6 +8,7 @@
 import streamlit as st
 import utils
 import constants as ct
+import indexer
 
 
 
@@ -41,6 +42,9 @@ def display_main_layout():
     アプリ全体のレイアウト構成
     左カラム：モード設定
     右カラム：メイン画面（チャット表示）
+
+    Returns:
+        (会話ログコンテナ, チャット入力欄のコンテナ) のタプル
     """
 
     # ======== CSSでデザイン調整 ========
@@ -134,6 +138,12 @@ def display_main_layout():
         st.markdown("**【「社内問い合わせ」を選択した場合】**")
         st.info("質問・要望に対して、社内文書の情報をもとに回答を得られます。")
         st.code("【入力例】\n人事部に所属している従業員情報を一覧化して", wrap_lines=True)
+
+        st.markdown("----")
+        display_search_scope()
+
+        st.markdown("----")
+        display_index_status()
         st.markdown("</div>", unsafe_allow_html=True)
 
     # ============== 右カラム ==============
@@ -150,20 +160,36 @@ def display_main_layout():
 
         st.markdown("</div>", unsafe_allow_html=True)
 
-        # チャット入力欄
-        response_container = st.container()
-        with st.form(key="chat_form", clear_on_submit=True):
-            user_input = st.text_input(
-                "",
-                placeholder=ct.CHAT_INPUT_HELPER_TEXT,
-                key="main_chat_text"
-            )
-            submitted = st.form_submit_button("送信")
-
-        # フォーム送信時
-        if submitted and user_input.strip():
-            return user_input, response_container, conversation_container
-        return None, response_container, conversation_container
+        # チャット入力欄のコンテナ（入力欄と送信時の処理は display_chat_form() のフラグメントで描画する）
+        chat_container = st.container()
+
+    return conversation_container, chat_container
+
+
+@st.fragment
+def display_chat_form(on_submit, conversation_container):
+    """
+    チャット入力欄の表示と、送信時の処理の呼び出し
+    フラグメントとして、送信時は過去の会話ログを描画し直さずにこの部分のみを再実行する
+    （フラグメントの外側で作成した conversation_container に書き込んだメッセージは、再実行で消えずに追記されていく）
+
+    Args:
+        on_submit: 送信時に (ユーザー入力値, 回答表示用コンテナ, 会話ログコンテナ) を渡して呼び出す関数
+        conversation_container: 会話ログコンテナ
+    """
+    # 回答の逐次表示・スピナー・表などの一時的な表示用コンテナ（次の送信時に消える）
+    response_container = st.container()
+    with st.form(key="chat_form", clear_on_submit=True):
+        user_input = st.text_input(
+            "",
+            placeholder=ct.CHAT_INPUT_HELPER_TEXT,
+            key="main_chat_text"
+        )
+        submitted = st.form_submit_button("送信")
+
+    # フォーム送信時
+    if submitted and user_input.strip():
+        on_submit(user_input, response_container, conversation_container)
 
     
 def display_app_title():
@@ -180,6 +206,87 @@ def display_app_title():
     """
     st.markdown(f"## {ct.APP_NAME}")
 
+@st.fragment
+def display_index_status():
+    """
+    RAGのインデックスのバージョンと最終構築日時、更新ボタンを表示
+    （フラグメントとして、更新ボタンの操作時は会話ログを描画し直さずにこの部分のみを再実行する）
+    """
+    status = indexer.get_index_status()
+    if status["ready"]:
+        built_at = status["built_at"] or "不明"
+        st.caption(f"インデックス: v{status['version']}（最終構築: {built_at}）")
+    else:
+        st.caption("インデックス: 作成中")
+
+    # 回答キャッシュのヒット率と、キャッシュによって短縮できた回答時間の累計
+    cache_stats = utils.get_answer_cache_stats()
+    if cache_stats["hits"] + cache_stats["misses"]:
+        st.caption(
+            f"回答キャッシュ: ヒット率 {cache_stats['hit_rate']:.0%}"
+            f"（短縮時間の累計: {cache_stats['saved_seconds']:.1f}秒）"
+        )
+
+    # 更新中も、検索は更新前のインデックスで行われる
+    if status["building"]:
+        st.caption("⏳ 最新のデータソースでインデックスを更新中です。")
+    elif st.button(ct.INDEX_REBUILD_BUTTON_LABEL):
+        indexer.start_index_build()
+        st.rerun(scope="fragment")
+
+
+def display_search_scope():
+    """
+    検索対象（カテゴリ・部署・顧客など）を絞り込むセレクトボックスを表示
+    インデックスの作成中は選択肢を作成できないため、作成完了を一定間隔で確認するフラグメントで表示する
+    """
+    if indexer.is_index_ready():
+        display_search_scope_options()
+    else:
+        display_search_scope_until_ready()
+
+
+@st.fragment
+def display_search_scope_options():
+    """
+    インデックスのチャンクのメタデータから作成した選択肢で、検索対象のセレクトボックスを表示
+    （フラグメントとして、選択を変えた際は会話ログを描画し直さずにこの部分のみを再実行する）
+    """
+    display_search_scope_select(indexer.get_shared_index()["facets"])
+
+
+@st.fragment(run_every=ct.SEARCH_SCOPE_POLL_SECONDS)
+def display_search_scope_until_ready():
+    """
+    インデックスの作成中に、「絞り込みなし」のみのセレクトボックスを表示
+    （一定間隔で再実行し、インデックスが検索可能になった時点でアプリ全体を再実行して選択肢を表示し直す）
+    """
+    if indexer.is_index_ready():
+        st.rerun()
+    display_search_scope_select({})
+
+
+def display_search_scope_select(facets):
+    """
+    検索対象のセレクトボックスを表示し、選択結果を「search_scope」に絞り込み条件の辞書として保持する
+
+    Args:
+        facets: メタデータの項目名をキー、値の一覧を値とする辞書
+    """
+    # (メタデータの項目名, 値) のタプルを選択肢とする（Noneは絞り込みなし）
+    options = [None]
+    for field in ct.SEARCH_FILTER_FIELDS:
+        options.extend((field, value) for value in facets.get(field, []))
+
+    selected = st.selectbox(
+        ct.SEARCH_SCOPE_LABEL,
+        options,
+        format_func=lambda option: ct.SEARCH_SCOPE_ALL_LABEL if option is None else f"{ct.SEARCH_FILTER_FIELDS[option[0]]}: {option[1]}",
+        key="search_scope_option"
+    )
+    st.session_state.search_scope = {selected[0]: selected[1]} if selected else None
+
+
 def display_select_mode():
     """
     回答モードのラジオボタンを表示
@@ -207,91 +314,182 @@ def display_initial_ai_message():
         st.warning("⚠️具体的に入力したほうが期待通りの回答を得やすいです。")
 
 
-def display_conversation_log():
+def display_conversation_log(messages=None):
     """
     会話ログの一覧表示
+    参照元のラベル・アイコンは回答の作成時に作成済みのものを使い、表示のたびに組み立て直さない
+
+    Args:
+        messages: 表示するメッセージの一覧（省略時は会話ログの全件。新しいメッセージのみを追記する場合に指定する）
     """
+    if messages is None:
+        messages = st.session_state.messages
     # 会話ログのループ処理
-    for message in st.session_state.messages:
-        # 「message」辞書の中の「role」キーには「user」か「assistant」が入っている
-        with st.chat_message(message["role"]):
+    for message in messages:
+        display_message(message)
 
-            # ユーザー入力値の場合、そのままテキストを表示するだけ
-            if message["role"] == "user":
-                st.markdown(message["content"])
-            
-            # LLMからの回答の場合
-            else:
-                # 「社内文書検索」の場合、テキストの種類に応じて表示形式を分岐処理
-                if message["content"]["mode"] == ct.ANSWER_MODE_1:
-                    
-                    # ファイルのありかの情報が取得できた場合（通常時）の表示処理
-                    if "no_file_path_flg" not in message["content"]:
-                        # ==========================================
-                        # ユーザー入力値と最も関連性が高いメインドキュメントのありかを表示
-                        # ==========================================
-                        # 補足文の表示
-                        st.markdown(message["content"]["main_message"])
-
-                        # 参照元のありかに応じて、適したアイコンを取得
-                        icon = utils.get_source_icon(message['content']['main_file_path'])
-                        # ページ番号があれば表示に含める
-                        if "main_page_number" in message['content']:
-                            st.success(f"{message['content']['main_file_path']} (ページNo.{message['content']['main_page_number']})", icon=icon)
-                        else:
-                            st.success(f"{message['content']['main_file_path']}", icon=icon)
-                        
-                        # ==========================================
-                        # サブドキュメント（関連資料）の表示
-                        # ==========================================
-                        if "sub_message" in message["content"]:
-                            st.markdown(message["content"]["sub_message"])
-
-                            # ✅ ここで「上位5件 or 全件表示」を制御
-                            all_docs = message["content"]["sub_choices"]
-                            show_all = st.session_state.get("show_all_related_docs", False)
-
-                            if not show_all:
-                                docs_to_show = all_docs[:5]  # 上位5件のみ表示
-                                if len(all_docs) > 5:
-                                    st.markdown(f"上位5件を表示中（全{len(all_docs)}件中）。『すべて』と入力すると全件表示します。")
-                            else:
-                                docs_to_show = all_docs
-                                st.markdown(f"全{len(all_docs)}件を表示中。")
-
-                            for sub_choice in docs_to_show:
-                                icon = utils.get_source_icon(sub_choice['source'])
-                                if "page_number" in sub_choice:
-                                    st.info(f"{sub_choice['source']} (ページNo.{sub_choice['page_number']})", icon=icon)
-                                else:
-                                    st.info(f"{sub_choice['source']}", icon=icon)
-                                        
-                # 「社内問い合わせ」の場合の表示処理
+
+def display_message(message):
+    """
+    会話ログのメッセージ1件の表示
+
+    Args:
+        message: 「role」「content」をキーに持つ辞書
+    """
+    # 「message」辞書の中の「role」キーには「user」か「assistant」が入っている
+    with st.chat_message(message["role"]):
+
+        # ユーザー入力値の場合、そのままテキストを表示するだけ
+        if message["role"] == "user":
+            st.markdown(message["content"])
+            return
+
+        content = message["content"]
+        # 「社内文書検索」の場合、テキストの種類に応じて表示形式を分岐処理
+        if content["mode"] == ct.ANSWER_MODE_1:
+
+            # ファイルのありかの情報が取得できなかった場合、「該当資料なし」のメッセージを表示
+            if "no_file_path_flg" in content:
+                st.markdown(content["answer"])
+                return
+
+            # ==========================================
+            # ユーザー入力値と最も関連性が高いメインドキュメントのありかを表示
+            # ==========================================
+            # 補足文の表示
+            st.markdown(content["main_message"])
+            # 「st.success()」とすると緑枠で表示される
+            st.success(content["main_source"]["label"], icon=content["main_source"]["icon"])
+
+            # ==========================================
+            # サブドキュメント（関連資料）の表示
+            # ==========================================
+            if "sub_message" in content:
+                st.markdown(content["sub_message"])
+
+                # 「上位5件 or 全件表示」を制御
+                all_docs = content["sub_choices"]
+                if not st.session_state.get("show_all_related_docs", False):
+                    docs_to_show = all_docs[:ct.RELATED_DOCS_DISPLAY_LIMIT]
+                    if len(all_docs) > ct.RELATED_DOCS_DISPLAY_LIMIT:
+                        st.markdown(f"上位{ct.RELATED_DOCS_DISPLAY_LIMIT}件を表示中（全{len(all_docs)}件中）。『すべて』と入力すると全件表示します。")
                 else:
-                    # LLMからの回答を表示
-                    st.markdown(message["content"]["answer"])
-
-                    # 参照元のありかを一覧表示
-                    if "file_info_list" in message["content"]:
-                        # 区切り線の表示
-                        st.divider()
-                        # 「情報源」の文字を太字で表示
-                        st.markdown(f"##### {message['content']['message']}")
-                        # ドキュメントのありかを一覧表示
-                        for file_info in message["content"]["file_info_list"]:
-                            # file_info は辞書（source, optional page_number）
-                            source = file_info.get("source") if isinstance(file_info, dict) else str(file_info)
-                            icon = utils.get_source_icon(source)
-                            if isinstance(file_info, dict) and "page_number" in file_info:
-                                st.info(f"{source} (ページNo.{file_info['page_number']})", icon=icon)
-                            else:
-                                st.info(source, icon=icon)
+                    docs_to_show = all_docs
+                    st.markdown(f"全{len(all_docs)}件を表示中。")
+
+                for sub_choice in docs_to_show:
+                    st.info(sub_choice["label"], icon=sub_choice["icon"])
+
+        # 「社内問い合わせ」の場合の表示処理
+        else:
+            # LLMからの回答を表示
+            st.markdown(content["answer"])
+
+            # 参照元のありかを一覧表示
+            display_contact_sources(content)
+
+
+def display_contact_sources(content):
+    """
+    「社内問い合わせ」モードの回答の参照元（情報源）のありかを一覧表示
+
+    Args:
+        content: prepare_contact_content() で作成した表示用の辞書
+    """
+    if "file_info_list" not in content:
+        return
+
+    # 区切り線の表示
+    st.divider()
+    # 「情報源」の文字を太字で表示
+    st.markdown(f"##### {content['message']}")
+    # ドキュメントのありかを一覧表示（ラベル・アイコンは make_source_info() で作成済み）
+    for file_info in content["file_info_list"]:
+        st.info(file_info["label"], icon=file_info["icon"])
+
+
+def make_source_info(source, page_number=None):
+    """
+    参照元のありかの表示用の辞書を作成（表示のたびに組み立てないよう、回答の作成時に1度だけ呼び出す）
+
+    Args:
+        source: ファイルパスまたはURL
+        page_number: ページ番号（1始まり。ページがない場合はNone）
+
+    Returns:
+        「source」「label」「icon」（ページがある場合は「page_number」も）をキーに持つ辞書
+    """
+    source_info = {"source": source, "icon": utils.get_source_icon(source)}
+    if page_number is None:
+        source_info["label"] = f"{source}"
+    else:
+        source_info["page_number"] = page_number
+        source_info["label"] = f"{source} (ページNo.{page_number})"
+    return source_info
+
+
+def get_page_number(metadata):
+    """
+    チャンクのメタデータから、表示用のページ番号を取得（0始まりのページを1始まりに変換する）
+
+    Args:
+        metadata: チャンクのメタデータ
+
+    Returns:
+        ページ番号（ページがない場合はNone）
+    """
+    raw = metadata.get("page") if metadata else None
+    if raw is None:
+        return None
+    try:
+        return int(raw) + 1
+    except Exception:
+        return raw
+
+
+def display_streaming_contact_response(chat_message, container):
+    """
+    「社内問い合わせ」モードの回答を、トークン単位で逐次表示
+    参照元のありかは検索が終わった時点で先に表示し、回答はその上に生成されたそばから表示する
+    （表示はあくまで一時的なもので、回答完了後に会話ログとして再描画される）
+
+    Args:
+        chat_message: ユーザー入力値
+        container: 逐次表示に使うコンテナ
+
+    Returns:
+        utils.get_llm_response() と同じ形式のLLMからの回答
+    """
+    placeholder = container.empty()
+    with placeholder.container():
+        with st.chat_message("user"):
+            st.markdown(chat_message)
+        with st.chat_message("assistant"):
+            # 回答の表示領域を、参照元の一覧より上に確保しておく
+            answer_area = st.empty()
+            with st.spinner(ct.SPINNER_TEXT):
+                context, answer_stream = utils.stream_llm_response(chat_message)
+            display_contact_sources(prepare_contact_content({"answer": "", "context": context}))
+            with answer_area.container():
+                answer = st.write_stream(answer_stream)
+    # 逐次表示した内容は、会話ログの再描画で置き換える
+    placeholder.empty()
+
+    return {"input": chat_message, "context": context, "answer": answer}
 
 
 def prepare_search_content(llm_response):
     """
     LLMの検索モードのレスポンスから、表示用の content 辞書を作成して返す（描画はしない）。
     """
+    # 関連するドキュメントがない場合は、ファイルパスが取得できなかったことを示すフラグを立てる
+    if not llm_response.get("context") or llm_response.get("answer") == ct.NO_DOC_MATCH_ANSWER:
+        return {
+            "mode": ct.ANSWER_MODE_1,
+            "answer": ct.NO_DOC_MATCH_MESSAGE,
+            "no_file_path_flg": True,
+        }
+
     content = {
         "mode": ct.ANSWER_MODE_1,
         "answer": llm_response.get("answer", ""),
@@ -299,16 +497,9 @@ def prepare_search_content(llm_response):
     }
 
     # main file
-    if llm_response.get("context"):
-        main_file_path = llm_response["context"][0].metadata.get("source")
-        content["main_file_path"] = main_file_path
-        # page normalization (0-based -> 1-based when possible)
-        raw = llm_response["context"][0].metadata.get("page")
-        if raw is not None:
-            try:
-                content["main_page_number"] = int(raw) + 1
-            except Exception:
-                content["main_page_number"] = raw
+    main_document = llm_response["context"][0]
+    content["main_file_path"] = main_document.metadata.get("source")
+    content["main_source"] = make_source_info(content["main_file_path"], get_page_number(main_document.metadata))
 
     # sub choices
     sub_choices = []
@@ -320,14 +511,7 @@ def prepare_search_content(llm_response):
         if sub_file_path in duplicate_check_list:
             continue
         duplicate_check_list.append(sub_file_path)
-        if "page" in document.metadata:
-            try:
-                sub_page = int(document.metadata.get("page")) + 1
-            except Exception:
-                sub_page = document.metadata.get("page")
-            sub_choices.append({"source": sub_file_path, "page_number": sub_page})
-        else:
-            sub_choices.append({"source": sub_file_path})
+        sub_choices.append(make_source_info(sub_file_path, get_page_number(document.metadata)))
 
     if sub_choices:
         content["sub_message"] = "その他、ファイルありかの候補を提示します。"
@@ -351,15 +535,7 @@ def prepare_contact_content(llm_response):
         file_path = document.metadata.get("source")
         if file_path in file_path_list:
             continue
-        page_raw = document.metadata.get("page") if document.metadata else None
-        if page_raw is not None:
-            try:
-                page = int(page_raw) + 1
-            except Exception:
-                page = page_raw
-            file_info_list.append({"source": file_path, "page_number": page})
-        else:
-            file_info_list.append({"source": file_path})
+        file_info_list.append(make_source_info(file_path, get_page_number(document.metadata)))
         file_path_list.append(file_path)
 
     if llm_response.get("answer") != ct.INQUIRY_NO_MATCH_ANSWER:
@@ -25,6 +25,15 @@ LINK_SOURCE_ICON = ":material/link: "
 WARNING_ICON = ":material/warning:"
 ERROR_ICON = ":material/error:"
 SPINNER_TEXT = "回答生成中..."
+INDEX_REBUILD_BUTTON_LABEL = "インデックスを更新"
+SEARCH_SCOPE_LABEL = "検索対象"
+SEARCH_SCOPE_ALL_LABEL = "すべての資料"
+# インデックスの作成中に、作成完了（検索対象の選択肢が揃ったか）を確認する間隔（秒）
+SEARCH_SCOPE_POLL_SECONDS = 2
+# 「社内文書検索」モードで、初期状態で表示する関連資料の件数
+RELATED_DOCS_DISPLAY_LIMIT = 5
+# 入力にいずれかが含まれる場合、関連資料を全件表示に切り替える（回答の取得は行わない）
+SHOW_ALL_RELATED_DOCS_KEYWORDS = ["すべて", "全件", "全て表示", "全部見せて"]
 
 
 # ==========================================
@@ -34,6 +43,19 @@ LOG_DIR_PATH = "./logs"
 LOGGER_NAME = "ApplicationLog"
 LOG_FILE = "application.log"
 APP_BOOT_MESSAGE = "アプリが起動されました。"
+INDEX_BUILD_DONE_MESSAGE = "インデックスの作成処理が完了しました。"
+INDEX_RESET_MESSAGE = "インデックスの設定が変更されたため、インデックスを作り直します。"
+INDEX_UPDATED_MESSAGE = "インデックスを更新しました。"
+INDEX_UNCHANGED_MESSAGE = "データソースに変更がないため、現在のインデックスを使います。"
+INDEX_PARTIAL_UPDATE_MESSAGE = "変更されたファイルをインデックスに反映しました。"
+WATCHER_START_MESSAGE = "データソースのフォルダの監視を開始しました。"
+WEB_CACHE_UPDATED_MESSAGE = "Webページの内容が更新されたため、インデックスを更新します。"
+FILE_LOAD_ERROR_MESSAGE = "ファイルの読み込みに失敗したため、スキップしました。"
+EMBEDDING_RATE_LIMIT_MESSAGE = "埋め込みAPIのレート制限に達しました。"
+TOKEN_ENCODING_ERROR_MESSAGE = "トークン数計算用のエンコーディングを取得できなかったため、文字数で代用します。"
+EMBEDDING_CACHE_STATS_MESSAGE = "埋め込みキャッシュの利用状況"
+ANSWER_CACHE_HIT_MESSAGE = "過去の類似した質問の回答をキャッシュから返しました。"
+CHAT_HISTORY_COMPACTED_MESSAGE = "会話履歴が上限を超えたため、古い会話を要約しました。"
 
 
 # ==========================================
@@ -41,6 +63,43 @@ APP_BOOT_MESSAGE = "アプリが起動されました。"
 # ==========================================
 MODEL = "gpt-4o-mini"
 TEMPERATURE = 0.5
+# LLMのHTTPクライアントの設定（プロセス全体で共有し、コネクションを再利用する）
+LLM_HTTP_MAX_CONNECTIONS = 20
+LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS = 60.0
+LLM_HTTP_TIMEOUT_SECONDS = 60.0
+# 会話履歴を踏まえた質問の書き換え（独立した入力テキストの生成）が必要と判断する語句
+# 入力にいずれかが含まれる場合、入力が短い場合、主題を省略した質問の場合のみ、書き換えのためにLLMを呼び出す
+HISTORY_REFERENCE_KEYWORDS = [
+    "それ", "その", "これ", "この", "あれ", "あの", "そこ", "ここ", "そちら", "こちら",
+    "上記", "前述", "先ほど", "先程", "さっき", "前の", "同じ", "他に", "ほかに", "他の", "ほかの",
+    "続き", "詳しく", "もっと", "具体的に", "彼", "彼女", "その人", "さらに", "逆に",
+]
+# 指示語を含むが、会話履歴を参照しない語句（判定の前に入力から除く）
+HISTORY_REFERENCE_EXCLUDED_WORDS = ["それぞれ", "これから", "これまで", "ここ数", "その他", "そのほか", "他社"]
+# 入力がこれらの語句で終わる場合は、主題を省略した質問（「営業部の場合は？」など）とみなして書き換える
+HISTORY_ELLIPSIS_ENDINGS = [
+    "の場合は", "の場合はどう", "の場合はどうなりますか", "ならどう", "だとどう", "だとどうなりますか",
+    "はどうですか", "はどうでしょう", "も教えて", "についても", "も同じ",
+]
+# 入力がこの文字数以下の場合は、会話履歴への依存が強いとみなして書き換える
+HISTORY_REWRITE_SHORT_INPUT_LENGTH = 8
+# 書き換え結果をキャッシュする件数（(会話履歴, 入力) の組ごと）
+HISTORY_REWRITE_CACHE_SIZE = 256
+# プロンプトに渡す会話履歴のトークン数の上限と、そのまま残す往復数の上限
+# いずれかを超えた場合、古い往復を要約文にまとめ、上限の CHAT_HISTORY_COMPACT_RATIO 倍まで減らす
+CHAT_HISTORY_TOKEN_BUDGET = 2000
+CHAT_HISTORY_MAX_TURNS = 10
+CHAT_HISTORY_COMPACT_RATIO = 0.5
+# メッセージ1件あたりの、ロールなどの付加情報のトークン数の目安
+CHAT_MESSAGE_TOKEN_OVERHEAD = 4
+# 古い往復をまとめた要約文の文字数の上限と、プロンプトに渡す際の前置き
+CHAT_SUMMARY_MAX_LENGTH = 800
+CHAT_SUMMARY_PREFIX = "これまでの会話の要約:\n"
+CHAT_SUMMARY_ROLE_LABELS = {"human": "ユーザー", "ai": "アシスタント", "system": "要約"}
+# 要約は回答の表示を待たせないようバックグラウンドで行い、その同時実行数の上限（全セッション合計）
+CHAT_SUMMARY_MAX_WORKERS = 2
+# 画面に表示する会話ログの件数の上限（超えた場合は古いものから削除）
+CHAT_DISPLAY_MAX_MESSAGES = 200
 
 
 # ==========================================
@@ -57,6 +116,96 @@ SUPPORTED_EXTENSIONS = {
 WEB_URL_LOAD_TARGETS = [
     "https://generative-ai.web-camp.io/"
 ]
+# ファイル読み込みを並列に行うプロセス数（Noneの場合はCPUのコア数）
+LOAD_MAX_WORKERS = None
+# 解析の負荷が高い形式のファイルの合計サイズ（バイト）がこの値未満の場合は、並列化せずに読み込む
+# （ワーカーの起動とライブラリの読み込みに1プロセスあたり1秒程度かかり、PDFの解析は1秒あたり数MB程度のため）
+LOAD_PARALLEL_MIN_BYTES = 32 * 1024 * 1024
+LOAD_PARALLEL_EXTENSIONS = [".pdf", ".docx"]
+# データソースのフォルダ構成から、チャンクのメタデータを作成するためのフォルダ名
+# 「MTG議事録/<部署>/」は部署、「MTG議事録/顧客/<既存・見込み>/<顧客名>/」は顧客区分と顧客名として扱う
+MEETING_MINUTES_FOLDER_NAME = "MTG議事録"
+CUSTOMER_MINUTES_FOLDER_NAME = "顧客"
+# Webページのチャンクのカテゴリ
+WEB_SOURCE_CATEGORY = "Webページ"
+
+
+# ==========================================
+# インデックス永続化系
+# ==========================================
+VECTOR_STORE_DIR_PATH = "./.index/chroma"
+INDEX_MANIFEST_PATH = "./.index/manifest.json"
+# インデックスの作成・部分更新・公開を、同じ「.index」フォルダを使う複数のプロセス間で排他制御するためのロックファイル
+INDEX_LOCK_PATH = "./.index/index.lock"
+# コレクション名の接頭辞（実際のコレクション名には「_v<バージョン>」が付く）
+COLLECTION_NAME = "company_docs"
+# コレクションを複製する際に、一度に読み込むチャンク数
+COLLECTION_COPY_PAGE_SIZE = 1000
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_CACHE_PATH = "./.index/embedding_cache.sqlite3"
+# メモリ上に保持する検索クエリのベクトルの上限数（検索クエリのベクトルはディスクには保存しない）
+EMBEDDING_QUERY_CACHE_SIZE = 1000
+# インデックスの構造（メタデータやチャンクIDの付け方など）を変更した場合に値を上げ、既存のインデックスを作り直す
+INDEX_SCHEMA_VERSION = 6
+# インデックスが検索可能になるまで待つ時間の上限（秒）。超えた場合は作成に失敗したものとして扱う
+# （初回作成時は、最初の埋め込みのバッチが追加された時点で検索可能になる）
+INDEX_BUILD_WAIT_TIMEOUT_SECONDS = 300
+# ベクターストアの距離関数（コサイン距離の場合、関連度スコアはコサイン類似度になる）
+VECTOR_STORE_DISTANCE = "cosine"
+# 検索に使うベクターストアの実装
+# "chroma": Chromaのコレクションでそのまま検索する
+# "numpy": Chromaのコレクションの内容をNumPyの配列に展開し、全件の内積で検索する（コーパスが数千チャンク規模の場合に速い）
+# いずれの場合も、インデックスの作成・更新と永続化はChromaで行う
+VECTOR_STORE_BACKEND = "numpy"
+# NumPyの配列の保存先（インデックスのバージョンごとにフォルダを作成する）
+NUMPY_INDEX_DIR_PATH = "./.index/numpy"
+# ベクトルの保持形式（"float32" / "float16" / "int8"。後者ほどメモリ使用量が小さく、類似度の精度は下がる）
+NUMPY_VECTOR_DTYPE = "float32"
+# float16・int8の場合に、一度にfloat32に変換して内積を計算する行数
+NUMPY_SCAN_BLOCK_ROWS = 8192
+
+
+# ==========================================
+# データソース監視系
+# ==========================================
+# Trueの場合、データソースのフォルダを監視し、変更されたファイルのみを自動でインデックスに反映する
+WATCH_DATA_FOLDER = False
+# 最後の変更から、この秒数だけ変更がなければ反映する（保存途中のファイルを読み込まないため）
+WATCH_DEBOUNCE_SECONDS = 5.0
+# watchdogが使えない環境で、更新日時をポーリングして変更を検知する間隔（秒）
+WATCH_POLL_INTERVAL_SECONDS = 30.0
+
+
+# ==========================================
+# Webページ取得系
+# ==========================================
+# 取得したWebページのキャッシュの保存先
+WEB_CACHE_DIR_PATH = "./.index/web_cache"
+# Webページを再取得する間隔（秒）。0以下の場合は定期的な再取得を行わない
+WEB_REFRESH_INTERVAL_SECONDS = 6 * 60 * 60
+# 1リクエストあたりのタイムアウト（秒）
+WEB_FETCH_TIMEOUT_SECONDS = 10
+# Webページを並行して取得するスレッド数の上限
+WEB_FETCH_MAX_WORKERS = 8
+WEB_FETCH_USER_AGENT = "company-inner-search-app"
+
+
+# ==========================================
+# 回答キャッシュ系
+# ==========================================
+# 検索クエリの埋め込みベクトルのコサイン類似度がこの値以上の場合、過去の質問と同じとみなして保存済みの回答を返す
+ANSWER_CACHE_SIMILARITY_THRESHOLD = 0.95
+# 保存済みの回答の有効期限（秒）
+ANSWER_CACHE_TTL_SECONDS = 60 * 60
+# 保存する回答の件数の上限（超えた場合は最も長く使われていないものから削除）
+ANSWER_CACHE_MAX_ENTRIES = 500
+
+
+# ==========================================
+# ベンチマーク系
+# ==========================================
+# ベンチマーク（benchmark.py）の結果の保存先
+BENCHMARK_RESULT_DIR_PATH = "./benchmark_results"
 
 
 # ==========================================
@@ -64,6 +213,19 @@ WEB_URL_LOAD_TARGETS = [
 # ==========================================
 SYSTEM_PROMPT_CREATE_INDEPENDENT_TEXT = "会話履歴と最新の入力をもとに、会話履歴なしでも理解できる独立した入力テキストを生成してください。"
 
+SYSTEM_PROMPT_SUMMARIZE_HISTORY = f"""
+    あなたは社内向けのアシスタントとユーザーの会話を記録する担当者です。
+    これまでの要約と、新たに要約に加える会話をもとに、以降の質問への回答に必要な情報
+    （ユーザーが知りたいこと、話題になった社員・顧客・資料名、回答の要点）を残した要約を作成してください。
+    要約は{CHAT_SUMMARY_MAX_LENGTH}文字以内とし、要約の本文のみを出力してください。
+
+    【これまでの要約】
+    {{summary}}
+
+    【新たに要約に加える会話】
+    {{conversation}}
+"""
+
 SYSTEM_PROMPT_DOC_SEARCH = """
     あなたは社内の文書検索アシスタントです。
     以下の条件に基づき、ユーザー入力に対して回答してください。
@@ -105,6 +267,9 @@ NO_DOC_MATCH_ANSWER = "該当資料なし"
 # ==========================================
 COMMON_ERROR_MESSAGE = "このエラーが繰り返し発生する場合は、管理者にお問い合わせください。"
 INITIALIZE_ERROR_MESSAGE = "初期化処理に失敗しました。"
+INDEX_BUILD_ERROR_MESSAGE = "インデックスの作成に失敗しました。"
+WATCHER_ERROR_MESSAGE = "データソースの変更の反映に失敗しました。"
+WEB_FETCH_ERROR_MESSAGE = "Webページの取得に失敗したため、キャッシュを使用します。"
 NO_DOC_MATCH_MESSAGE = """
     入力内容と関連する社内文書が見つかりませんでした。\n
     入力内容を変更してください。
@@ -112,13 +277,111 @@ NO_DOC_MATCH_MESSAGE = """
 CONVERSATION_LOG_ERROR_MESSAGE = "過去の会話履歴の表示に失敗しました。"
 GET_LLM_RESPONSE_ERROR_MESSAGE = "回答生成に失敗しました。"
 DISP_ANSWER_ERROR_MESSAGE = "回答表示に失敗しました。"
+CHAT_SUMMARY_ERROR_MESSAGE = "会話履歴の要約に失敗したため、古い会話履歴を要約せずに削除しました。"
 
 
 # ==========================================
 # 分割設定系
 # ==========================================
-CHUNK_SIZE = 500
-CHUNK_OVERLAP = 10
+# 1チャンクあたりのトークン数の上限（見出しで区切った節を、この上限までまとめて1チャンクにする）
+CHUNK_TOKEN_SIZE = 600
+# チャンクのトークン数の計算に使うエンコーディング（text-embedding-3-small に対応するもの）
+CHUNK_ENCODING_NAME = "cl100k_base"
+# この文字数を超える行は、番号で始まっていても見出しとみなさない
+HEADING_MAX_LENGTH = 40
+# CSVファイルは1行を1チャンクとし、これらの列の値を行のID（メタデータの「row_id」）とする（該当する列がない場合は行番号）
+CSV_ROW_ID_COLUMNS = ["社員ID"]
 SEPARATOR = "\n"
 BATCH_SIZE = 50
-SEARCH_KWARGS = {"k": 50}
+# 検索件数（ハイブリッド検索で統合した後の件数）
+SEARCH_KWARGS = {"k": 10}
+# ハイブリッド検索で、ベクトル検索・語句検索のそれぞれから取得する件数
+HYBRID_FETCH_K = 20
+# 順位の逆数の和（RRF）で統合する際に、順位に加える定数
+HYBRID_RRF_K = 60
+# 語句検索（BM25）のパラメータ
+LEXICAL_BM25_K1 = 1.2
+LEXICAL_BM25_B = 0.75
+# 「社内文書検索」モードで、語句の完全一致を関連ありとみなすのは、その語句を含むチャンクが全体のこの割合以下の場合のみ
+LEXICAL_EXACT_TERM_MAX_DOC_RATIO = 0.05
+# 「社内問い合わせ」モードで、回答生成用のプロンプトに含める検索結果のトークン数の上限
+# 検索結果は関連度の高い順に、重複の除去と隣り合うチャンクの結合を行った上でこの上限まで詰める
+CONTEXT_TOKEN_BUDGET = 4000
+# トークン数の計算に使うエンコーディング（gpt-4o-mini に対応するもの）
+CONTEXT_ENCODING_NAME = "o200k_base"
+# 文字の3-gramの重複率（Jaccard係数）がこの値以上のチャンクは、ほぼ同じ内容とみなして除く
+CONTEXT_DUPLICATE_THRESHOLD = 0.9
+# 「社内文書検索」モードで、関連があるとみなす関連度スコア（コサイン類似度）の下限
+# いずれのチャンクもこの値に満たない場合は、LLMを呼び出さずに「該当資料なし」とする
+DOC_SEARCH_RELEVANCE_THRESHOLD = 0.3
+# 検索対象の絞り込みに使うメタデータの項目名と、画面上の表示名
+SEARCH_FILTER_FIELDS = {
+    "category": "カテゴリ",
+    "department": "部署",
+    "customer_status": "顧客区分",
+    "customer": "顧客",
+}
+# 入力に顧客名が含まれる場合、その顧客の資料に絞り込んで検索する（顧客名の照合時は法人格を除く）
+COMPANY_NAME_SUFFIXES = ["株式会社", "合同会社", "有限会社"]
+# 入力に部署名とこれらの語句が含まれる場合、その部署の議事録に絞り込んで検索する
+MEETING_MINUTES_KEYWORDS = ["議事録", "ミーティング", "MTG", "会議"]
+
+
+# ==========================================
+# 社員名簿の構造化クエリ系
+# ==========================================
+# 構造化クエリの対象とするCSVファイル名
+ROSTER_FILE_NAME = "社員名簿.csv"
+# 社員名簿に関する質問であることを表す語句（名簿の値・年の範囲の条件がある場合は、なくてもよい）
+# 「正社員」の「社員」のように、質問文から見つけた名簿の値の一部として含まれるものは数えない
+ROSTER_QUERY_KEYWORDS = ["社員", "従業員", "名簿", "所属", "在籍", "メンバー"]
+# 社員名簿の一覧・人数を求めていることを表す語句
+# 「営業部の社員の評価制度」「正社員の就業規則」のような文書の質問と区別するため、名簿の列による並べ替えの指定がない場合は、
+# これらの語句かグループ分けの指定（「部署ごと」など）がある場合のみ、構造化クエリとして扱う
+# （「資料一覧」などと区別するため、「一覧」は社員を表す語句と続けたもの・「一覧化」のみとする）
+ROSTER_LISTING_KEYWORDS = [
+    "名簿", "人数", "何名", "何人", "社員数", "従業員数", "誰", "だれ",
+    "社員一覧", "社員の一覧", "従業員一覧", "従業員の一覧", "メンバー一覧", "メンバーの一覧", "一覧化", "リストアップ",
+]
+# 文書の検索を求めていることを表す語句（含まれる場合は、名簿の列による並べ替えの指定がない限り、構造化クエリとして扱わない）
+ROSTER_DOCUMENT_KEYWORDS = ["資料", "議事録", "MTG", "会議", "規則", "規程", "規定", "制度", "研修", "マニュアル", "方針"]
+# カテゴリ型として扱う列（値が複数の列に含まれる場合は、先の列の値とみなす）
+ROSTER_CATEGORY_COLUMNS = ["部署", "従業員区分", "役職", "性別"]
+# カンマ区切りで複数の値を持つ列と、その区切り文字
+ROSTER_MULTI_VALUE_COLUMNS = ["スキルセット", "保有資格"]
+ROSTER_MULTI_VALUE_SEPARATOR = ","
+# 日付型として扱う列
+ROSTER_DATE_COLUMNS = ["生年月日", "入社日", "卒業年月日"]
+# 「2020年以降に入社」のような年の範囲の条件で、語句に対応する日付の列
+ROSTER_DATE_KEYWORDS = {"入社": "入社日", "生まれ": "生年月日", "卒業": "卒業年月日"}
+# 「部署ごと」「役職別」のようなグループ分けの指定で、語句に対応する列
+ROSTER_GROUP_KEYWORDS = {
+    "部署": "部署",
+    "従業員区分": "従業員区分",
+    "雇用形態": "従業員区分",
+    "役職": "役職",
+    "性別": "性別",
+    "男女": "性別",
+    "スキル": "スキルセット",
+    "資格": "保有資格",
+}
+ROSTER_GROUP_SUFFIXES = ["ごと", "別"]
+# 「年齢が高い順」「入社日が新しい順」のような並べ替えの指定で、語句に対応する列
+ROSTER_SORT_KEYWORDS = {"年齢": "年齢", "入社": "入社日", "生年月日": "生年月日", "生まれ": "生年月日", "卒業": "卒業年月日"}
+# グループ別の件数の表の、件数の列名
+ROSTER_COUNT_COLUMN_NAME = "人数"
+
+
+# ==========================================
+# 埋め込み処理系
+# ==========================================
+# バッチあたりのトークン数の上限（件数の上限は BATCH_SIZE）
+EMBEDDING_BATCH_MAX_TOKENS = 20000
+# トークン数の計算に使うエンコーディング（text-embedding-3-small に対応するもの）
+EMBEDDING_ENCODING_NAME = "cl100k_base"
+# 並行して埋め込みAPIを呼び出すスレッド数
+EMBEDDING_MAX_WORKERS = 4
+# レート制限（HTTP 429）時の再試行回数と待機時間（秒）
+EMBEDDING_MAX_RETRIES = 6
+EMBEDDING_RETRY_BASE_SECONDS = 1.0
+EMBEDDING_RETRY_MAX_SECONDS = 60.0
@@ -0,0 +1,181 @@
+"""
+このファイルは、検索結果のチャンクを回答生成用のプロンプトに詰める処理が記述されたファイルです。
+関連度の高い順に、ほぼ同じ内容のチャンクを除き、同じファイル・同じページで隣り合うチャンクを結合しながら、
+トークン数の上限（CONTEXT_TOKEN_BUDGET）まで詰めます。
+"""
+
+############################################################
+# ライブラリの読み込み
+############################################################
+from langchain.schema import Document as LangchainDocument
+import constants as ct
+import tokenizer
+
+
+############################################################
+# 関数定義
+############################################################
+
+def pack_context(docs, token_budget=None):
+    """
+    検索結果のチャンクを、トークン数の上限まで詰める
+
+    Args:
+        docs: 関連度の高い順に並んだ検索結果のドキュメントの一覧
+        token_budget: トークン数の上限（省略時は CONTEXT_TOKEN_BUDGET）
+
+    Returns:
+        詰めたドキュメントの一覧（結合したチャンクは1件のドキュメントになる。順序は各まとまりの中で最も関連度の高いチャンクの順）
+    """
+    if token_budget is None:
+        token_budget = ct.CONTEXT_TOKEN_BUDGET
+
+    # 隣り合うチャンクのまとまり（関連度の高い順）と、採用済みのチャンクの3-gramの集合
+    groups = []
+    selected_shingles = []
+    used_tokens = 0
+
+    for doc in docs:
+        # ほぼ同じ内容のチャンクがすでに採用されている場合は除く
+        shingles = get_shingles(doc.page_content)
+        if any(get_jaccard(shingles, other) >= ct.CONTEXT_DUPLICATE_THRESHOLD for other in selected_shingles):
+            continue
+
+        # 上限を超える場合は、より短いチャンクが入る可能性があるため次のチャンクを試す
+        tokens = tokenizer.count_tokens(doc.page_content, ct.CONTEXT_ENCODING_NAME)
+        if used_tokens + tokens > token_budget:
+            continue
+
+        group = find_adjacent_group(groups, doc)
+        if group is None:
+            groups.append({"metadata": dict(doc.metadata), "chunks": {get_chunk_index(doc): doc.page_content}})
+        else:
+            group["chunks"][get_chunk_index(doc)] = doc.page_content
+        selected_shingles.append(shingles)
+        used_tokens += tokens
+
+    return [
+        LangchainDocument(page_content=merge_chunks(group["chunks"]), metadata=group["metadata"])
+        for group in groups
+    ]
+
+
+def find_adjacent_group(groups, doc):
+    """
+    チャンクと同じファイル・同じページで隣り合うチャンクを持つまとまりを探す
+
+    Args:
+        groups: チャンクのまとまりの一覧
+        doc: 検索結果のドキュメント
+
+    Returns:
+        隣り合うチャンクを持つまとまり（ない場合、またはチャンクの位置が分からない場合はNone）
+    """
+    chunk_index = get_chunk_index(doc)
+    if chunk_index is None:
+        return None
+
+    for group in groups:
+        metadata = group["metadata"]
+        if metadata.get("source") != doc.metadata.get("source") or metadata.get("page") != doc.metadata.get("page"):
+            continue
+        if None in group["chunks"]:
+            continue
+        if chunk_index - 1 in group["chunks"] or chunk_index + 1 in group["chunks"]:
+            return group
+    return None
+
+
+def merge_chunks(chunks):
+    """
+    隣り合うチャンクを、位置の順に重なり（続きのチャンクに付けた見出しの行）を除いて結合
+
+    Args:
+        chunks: チャンクの位置をキー、チャンクの文字列を値とする辞書
+
+    Returns:
+        結合した文字列
+    """
+    if None in chunks:
+        return chunks[None]
+
+    merged = ""
+    previous_index = None
+    for chunk_index in sorted(chunks):
+        text = chunks[chunk_index]
+        if previous_index is None:
+            merged = text
+        elif chunk_index == previous_index + 1:
+            remaining_text = strip_overlap(merged, text)
+            merged += ct.SEPARATOR + (text if remaining_text is None else remaining_text)
+        else:
+            # 間のチャンクが採用されなかった場合は、段落を分けて結合する
+            merged += "\n\n" + text
+        previous_index = chunk_index
+    return merged
+
+
+def strip_overlap(previous_text, text):
+    """
+    次のチャンクの先頭にある、前のチャンクと重なっている部分を除く
+    （1つの節を複数のチャンクに分割した場合、続きのチャンクの先頭には前のチャンクと同じ節の見出しの行が付いている）
+
+    Args:
+        previous_text: 前のチャンクの文字列
+        text: 次のチャンクの文字列
+
+    Returns:
+        重なりを除いた次のチャンクの文字列（重なりがない場合はNone）
+    """
+    first_line, _, remaining_text = text.partition(ct.SEPARATOR)
+    if not remaining_text:
+        return None
+    # 見出しの行が前のチャンクに含まれている場合のみ除く
+    if (ct.SEPARATOR + first_line + ct.SEPARATOR) in (ct.SEPARATOR + previous_text + ct.SEPARATOR):
+        return remaining_text
+    return None
+
+
+def get_chunk_index(doc):
+    """
+    チャンクのデータソース内での位置を取得
+
+    Args:
+        doc: 検索結果のドキュメント
+
+    Returns:
+        チャンクの位置（位置を持たないドキュメントの場合はNone）
+    """
+    return doc.metadata.get("chunk_index")
+
+
+def get_shingles(text):
+    """
+    文字列の3-gramの集合を作成（ほぼ同じ内容かどうかの判定に使う）
+
+    Args:
+        text: 対象の文字列
+
+    Returns:
+        3-gramの集合
+    """
+    text = "".join(text.split())
+    if len(text) < 3:
+        return {text}
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def get_jaccard(a, b):
+    """
+    2つの集合のJaccard係数を計算
+
+    Args:
+        a: 集合
+        b: 集合
+
+    Returns:
+        Jaccard係数（0〜1）
+    """
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
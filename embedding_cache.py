@@ -0,0 +1,212 @@
+"""
+このファイルは、埋め込みベクトルのキャッシュに関する処理が記述されたファイルです。
+チャンクの文字列が同じであれば、埋め込みモデルのAPIを呼び出さずにローカルのキャッシュからベクトルを返します。
+"""
+
+############################################################
+# ライブラリの読み込み
+############################################################
+import os
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+from langchain_core.embeddings import Embeddings
+import constants as ct
+
+
+############################################################
+# 設定関連
+############################################################
+# SQLiteの「IN」句に一度に渡すキーの上限数
+_LOOKUP_CHUNK_SIZE = 500
+
+
+############################################################
+# クラス定義
+############################################################
+
+class CachedEmbeddings(Embeddings):
+    """
+    埋め込みモデルをラップし、(モデル名, 正規化したチャンク文字列のハッシュ値) をキーにベクトルをキャッシュするクラス
+    SQLiteに永続化するのはチャンクのベクトルのみで、検索クエリのベクトルは件数に上限のあるメモリ上のキャッシュに保持する
+    """
+
+    def __init__(self, embeddings, model_name, cache_path=ct.EMBEDDING_CACHE_PATH, query_cache_size=ct.EMBEDDING_QUERY_CACHE_SIZE):
+        """
+        Args:
+            embeddings: 実際に埋め込みを行う埋め込みモデル
+            model_name: 埋め込みモデル名（キャッシュのキーに含める）
+            cache_path: キャッシュ用のSQLiteファイルのパス
+            query_cache_size: メモリ上に保持する検索クエリのベクトルの上限数
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        # チャンクのベクトルのヒット数・ミス数（インデックスの作成・更新ごとの集計に使う）
+        self.hits = 0
+        self.misses = 0
+        # 検索クエリのベクトルのヒット数・ミス数（作成・更新中の検索でチャンクの集計がずれないよう、別に数える）
+        self.query_hits = 0
+        self.query_misses = 0
+        self._lock = threading.Lock()
+        # 検索クエリのハッシュ値をキー、ベクトルを値とする辞書（上限を超えた場合は、最も長く使われていないものから削除）
+        self._query_cache = OrderedDict()
+        self._query_cache_size = query_cache_size
+
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        # 複数スレッドから利用するため、接続はロックで保護した上で共有する
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        # 複数プロセスから同時に読み書きしても待たされにくいよう、WALモードを使う
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.commit()
+
+    def embed_documents(self, texts):
+        """
+        複数の文字列の埋め込み（キャッシュにない文字列のみ埋め込みモデルを呼び出す）
+
+        Args:
+            texts: 埋め込み対象の文字列の一覧
+
+        Returns:
+            ベクトルの一覧
+        """
+        keys = [get_text_hash(text) for text in texts]
+        cached = self._lookup(set(keys))
+
+        # キャッシュにない文字列を、重複を除いて抽出
+        miss_texts = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in miss_texts:
+                miss_texts[key] = text
+
+        if miss_texts:
+            vectors = self.embeddings.embed_documents(list(miss_texts.values()))
+            new_entries = dict(zip(miss_texts.keys(), vectors))
+            self._store(new_entries)
+            cached.update(new_entries)
+
+        with self._lock:
+            self.misses += len(miss_texts)
+            self.hits += len(texts) - len(miss_texts)
+
+        return [list(cached[key]) for key in keys]
+
+    def embed_query(self, text):
+        """
+        検索クエリの埋め込み
+        （ユーザー入力はアクセスのたびに増え続けるため、SQLiteには保存せず、メモリ上のキャッシュのみを使う）
+
+        Args:
+            text: 検索クエリ
+
+        Returns:
+            ベクトル
+        """
+        key = get_text_hash(text)
+        with self._lock:
+            vector = self._query_cache.get(key)
+            if vector is not None:
+                self._query_cache.move_to_end(key)
+                self.query_hits += 1
+                return list(vector)
+
+        vector = self.embeddings.embed_query(text)
+        with self._lock:
+            self.query_misses += 1
+            if self._query_cache_size > 0:
+                self._query_cache[key] = vector
+                self._query_cache.move_to_end(key)
+                while len(self._query_cache) > self._query_cache_size:
+                    self._query_cache.popitem(last=False)
+        return vector
+
+    def get_stats(self):
+        """
+        キャッシュのヒット数・ミス数の取得
+
+        Returns:
+            チャンクの「hits」「misses」「hit_rate」と、検索クエリの「query_hits」「query_misses」をキーに持つ辞書
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "query_hits": self.query_hits,
+                "query_misses": self.query_misses,
+            }
+
+    def reset_stats(self):
+        """
+        チャンクのキャッシュのヒット数・ミス数を0に戻す
+        （プロセス内で1つのインスタンスを使い回すため、インデックスの作成・更新ごとの利用状況を集計する際に呼び出す）
+        """
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def _lookup(self, keys):
+        """
+        キャッシュからベクトルを検索
+
+        Args:
+            keys: ハッシュ値の集合
+
+        Returns:
+            ハッシュ値をキー、ベクトルを値とする辞書（キャッシュにあったもののみ）
+        """
+        found = {}
+        keys = list(keys)
+        with self._lock:
+            for i in range(0, len(keys), _LOOKUP_CHUNK_SIZE):
+                chunk = keys[i:i + _LOOKUP_CHUNK_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [self.model_name, *chunk]
+                ).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def _store(self, entries):
+        """
+        ベクトルをキャッシュに保存
+
+        Args:
+            entries: ハッシュ値をキー、ベクトルを値とする辞書
+        """
+        rows = [
+            (self.model_name, key, np.asarray(vector, dtype=np.float32).tobytes())
+            for key, vector in entries.items()
+        ]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+
+
+############################################################
+# 関数定義
+############################################################
+
+def get_text_hash(text):
+    """
+    チャンク文字列を正規化した上でハッシュ値を作成
+    （Unicode正規化・改行コードの統一・前後の空白除去を行い、見た目が同じ文字列は同じキーになるようにする）
+
+    Args:
+        text: チャンク文字列
+
+    Returns:
+        ハッシュ値
+    """
+    normalized = unicodedata.normalize("NFC", text).replace("\r\n", "\n").strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
@@ -0,0 +1,96 @@
+"""
+このファイルは、RAGの参照先となるファイルの読み込みに関する処理が記述されたファイルです。
+ファイルの並列読み込みでは、ワーカープロセスがこのファイルのみを読み込むため、
+ベクターストアや埋め込みモデルなど、読み込みに使わないライブラリはここで読み込まないこと。
+"""
+
+############################################################
+# ライブラリの読み込み
+############################################################
+import os
+import pandas as pd
+from langchain.schema import Document as LangchainDocument
+import constants as ct
+
+
+############################################################
+# 関数定義
+############################################################
+
+def load_file_safely(path):
+    """
+    1ファイルの読み込み（ワーカープロセスで実行される）
+    1ファイルの読み込み失敗で全体の初期化処理が中断しないよう、例外は呼び出し元に返す
+
+    Args:
+        path: ファイルパス
+
+    Returns:
+        (ドキュメントの一覧, エラー内容) のタプル（成功時のエラー内容はNone）
+    """
+    docs = []
+    try:
+        file_load(path, docs)
+    except Exception as e:
+        return [], f"{type(e).__name__}: {e}"
+    return docs, None
+
+
+def file_load(path, docs_all):
+    """
+    ファイル内のデータ読み込み
+
+    Args:
+        path: ファイルパス
+        docs_all: データソースを格納する用のリスト
+    """
+    # ファイルの拡張子を取得
+    file_extension = os.path.splitext(path)[1].lower()
+
+    # 想定していたファイル形式の場合のみ読み込む
+    if file_extension in ct.SUPPORTED_EXTENSIONS:
+        # CSV は構造化データなので、ベクターストアには「1行を一つの Document」として格納する
+        # （構造化クエリ用の DataFrame は load_csv_tables() で別途読み込む）
+        if file_extension == ".csv":
+            try:
+                df = pd.read_csv(path)
+            except Exception:
+                # 文字コードなどで失敗した場合は、TextLoader にフォールバック
+                loader = ct.SUPPORTED_EXTENSIONS[file_extension](path)
+                docs = loader.load()
+                docs_all.extend(docs)
+                return
+
+            docs_all.extend(csv_rows_to_documents(df, path))
+            return
+
+        # 通常のファイルは既存の loader を使う
+        loader = ct.SUPPORTED_EXTENSIONS[file_extension](path)
+        docs = loader.load()
+        docs_all.extend(docs)
+
+
+def csv_rows_to_documents(df, path):
+    """
+    CSVファイルのDataFrameを、1行ごとのドキュメントに変換
+    本文は「列名: 値」の行を並べたもの（値が空の列は除く）とし、検索結果から行を特定できるよう行のIDをメタデータに持たせる
+
+    Args:
+        df: CSVファイルから読み込んだDataFrame
+        path: ファイルパス
+
+    Returns:
+        ドキュメントの一覧
+    """
+    id_column = next((column for column in ct.CSV_ROW_ID_COLUMNS if column in df.columns), None)
+    file_name = os.path.basename(path)
+    docs = []
+    for row_index, row in enumerate(df.itertuples(index=False)):
+        values = dict(zip(df.columns, row))
+        lines = [f"{column}: {value}" for column, value in values.items() if not pd.isna(value) and str(value).strip()]
+        row_id = str(values[id_column]) if id_column and not pd.isna(values[id_column]) else str(row_index)
+        docs.append(LangchainDocument(
+            page_content=ct.SEPARATOR.join([file_name, *lines]),
+            metadata={"source": path, "file_name": file_name, "type": "csv", "row_id": row_id, "row_index": row_index}
+        ))
+    return docs
@@ -0,0 +1,1388 @@
+"""
+このファイルは、RAGの参照先となるインデックス（ベクターストア）の構築・共有に関する処理が記述されたファイルです。
+インデックスはブラウザのセッションごとではなく、プロセス全体で1つだけ作成し、全セッションで共有します。
+"""
+
+############################################################
+# ライブラリの読み込み
+############################################################
+import os
+import contextlib
+import functools
+import hashlib
+import json
+import logging
+import multiprocessing
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+from collections import deque
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+try:
+    import fcntl
+except ImportError:
+    # Windowsではfcntlが使えないため、msvcrtでロックファイルを排他制御する
+    fcntl = None
+    import msvcrt
+import numpy as np
+import openai
+import pandas as pd
+from dotenv import load_dotenv
+from langchain_openai import OpenAIEmbeddings
+from langchain_community.vectorstores import Chroma
+import constants as ct
+from embedding_cache import CachedEmbeddings
+from file_loader import load_file_safely
+from lexical_index import LexicalIndex, HybridRetriever
+from structured_splitter import split_structured_documents
+from tokenizer import count_tokens
+from numpy_vector_store import NumpyVectorStore
+from roster import RosterTable
+import web_cache
+
+
+############################################################
+# 設定関連
+############################################################
+# 「.env」ファイルで定義した環境変数の読み込み
+load_dotenv()
+
+# プロセス全体で共有するインデックス（Retrieverと構造化データ）
+_shared_index = None
+# インデックス作成処理の排他制御用ロック（同時に複数のセッションから作成処理が走らないようにする）
+_index_lock = threading.Lock()
+# インデックス作成用スレッド（プロセス内で同時に1つだけ起動する）
+_build_thread = None
+# コレクションへの書き込み（インデックス作成・部分更新）の排他制御用ロック
+# （プロセス間の排他制御は、hold_write_lock() でロックファイルを使って行う）
+_write_lock = threading.Lock()
+# 共有中のインデックスの差し替えの排他制御用ロック
+_publish_lock = threading.Lock()
+# 他のプロセスが公開したバージョンの読み込み処理の排他制御用ロック
+_reload_lock = threading.Lock()
+# 最後に確認した時点のマニフェストファイルの更新日時（他のプロセスによる新しいバージョンの公開の検知に使う）
+_manifest_mtime = None
+# 実行中（または直近）のインデックス作成処理の状態
+# 「ready」は検索可能になった（または作成に失敗した）ことを待機中のセッションに知らせるイベント、「error」は作成時に発生した例外
+# 作成処理ごとに作り直すため、待機中のセッションが読む前に、後続の作成処理で例外が戻されることはない
+_build_state = {"ready": threading.Event(), "error": None}
+
+
+############################################################
+# 関数定義
+############################################################
+
+def get_shared_index():
+    """
+    プロセス全体で共有するインデックスを取得（未作成の場合は作成を開始し、検索可能になるまで待つ）
+    インデックスはバックグラウンドで作り直されると差し替わるため、呼び出し元で保持し続けず、利用のたびに取得すること
+
+    Returns:
+        「retriever」「csv_tables」「roster」「facets」「version」「built_at」をキーに持つ辞書
+    """
+    # 作成済みの場合はロックを取らずにそのまま返す
+    # （他のプロセスが新しいバージョンを公開していた場合は、保存済みのファイルから開き直したものに差し替える）
+    if _shared_index is not None:
+        reload_published_index()
+    index = _shared_index
+    if index is not None:
+        return index
+
+    # 複数のセッションから同時に呼ばれた場合でも、作成処理は1回だけ実行する
+    # （後から来たセッションは、先行する作成処理で検索可能になるのをここで待つ）
+    # （待機する作成処理の状態はロック内で取得し、その作成処理の結果のみを参照する）
+    with _index_lock:
+        _start_build_thread()
+        build_state = _build_state
+
+    # 作成処理が応答しなくなった場合に、全てのセッションが待ち続けないよう、上限時間まで待つ
+    if not build_state["ready"].wait(ct.INDEX_BUILD_WAIT_TIMEOUT_SECONDS):
+        raise RuntimeError(ct.INDEX_BUILD_ERROR_MESSAGE)
+
+    index = _shared_index
+    if index is None:
+        raise RuntimeError(ct.INDEX_BUILD_ERROR_MESSAGE) from build_state["error"]
+    return index
+
+
+def reload_published_index():
+    """
+    マニフェストファイルの更新日時を確認し、他のプロセスが新しいバージョンを公開していた場合は、
+    そのバージョンの保存済みのファイルをメモリマップで開き、共有中のインデックスを差し替える
+    （同じ「.index」フォルダを使う複数のワーカーのプロセスで、インデックスの作成・更新を1つのプロセスで行えば済むようにする）
+    """
+    global _manifest_mtime
+
+    try:
+        mtime = os.stat(ct.INDEX_MANIFEST_PATH).st_mtime_ns
+    except OSError:
+        return
+    # 変更がない場合や、別のセッションが読み込み中の場合は、共有中のインデックスをそのまま使う
+    if mtime == _manifest_mtime or not _reload_lock.acquire(blocking=False):
+        return
+
+    try:
+        _manifest_mtime = mtime
+        manifest = load_manifest()
+        index = _shared_index
+        if (
+            index is None
+            or not manifest["collection"]
+            or manifest["version"] <= index["version"]
+            or manifest["settings"] != get_index_settings()
+        ):
+            return
+        db = open_vector_store(create_embeddings(), manifest["collection"])
+        source_paths = [key for key in manifest["sources"] if os.path.isfile(key)]
+        _publish_index(make_index(db, load_csv_tables(source_paths), manifest), newer_only=True)
+    except Exception as e:
+        # 読み込みに失敗した場合は、共有中のインデックスを使い続ける
+        logging.getLogger(ct.LOGGER_NAME).error(f"{ct.INDEX_BUILD_ERROR_MESSAGE}\n{e}")
+    finally:
+        _reload_lock.release()
+
+
+def is_index_ready():
+    """
+    共有インデックスが検索可能かどうかを判定
+
+    Returns:
+        検索可能な場合はTrue
+    """
+    return _shared_index is not None
+
+
+def get_index_status():
+    """
+    画面表示用に、共有インデックスの状態を取得
+
+    Returns:
+        「ready」「building」「version」「built_at」をキーに持つ辞書
+    """
+    index = _shared_index
+    return {
+        "ready": index is not None,
+        "building": _build_thread is not None and _build_thread.is_alive(),
+        "version": index["version"] if index else None,
+        "built_at": index["built_at"] if index else None,
+    }
+
+
+def warm_up():
+    """
+    共有インデックスの作成をバックグラウンドで開始する
+    最初にアクセスしたユーザーがインデックス作成を待たずに済むよう、アプリ起動時に呼び出す
+    """
+    if not is_index_ready():
+        start_index_build()
+
+
+def start_index_build():
+    """
+    インデックス作成用スレッドの起動（作成中の場合は何もしない）
+    作成済みの場合は、データソースの差分を反映した新しいバージョンをバックグラウンドで作成し、完成後に差し替える
+
+    Returns:
+        スレッドを起動した場合はTrue
+    """
+    with _index_lock:
+        return _start_build_thread()
+
+
+def _start_build_thread():
+    """
+    インデックス作成用スレッドの起動（_index_lock を取得した状態で呼び出すこと）
+
+    Returns:
+        スレッドを起動した場合はTrue
+    """
+    global _build_thread, _build_state
+
+    if _build_thread is not None and _build_thread.is_alive():
+        return False
+    # 前回の作成処理の状態は引き継がず、今回の作成処理用の状態を用意する
+    # （検索可能なインデックスを共有中の場合は、作成完了を待つ必要がないため、最初から完了済みとする）
+    _build_state = {"ready": threading.Event(), "error": None}
+    if _shared_index is not None:
+        _build_state["ready"].set()
+    _build_thread = threading.Thread(target=_build_worker, args=(_build_state,), name="index-build", daemon=True)
+    _build_thread.start()
+    return True
+
+
+def _build_worker(build_state):
+    """
+    インデックス作成用スレッドで実行する処理
+
+    Args:
+        build_state: 今回の作成処理の状態（「ready」「error」をキーに持つ辞書）
+    """
+    logger = logging.getLogger(ct.LOGGER_NAME)
+    try:
+        # ファイル監視による部分更新や、他のプロセスの作成処理と同時にコレクションを書き換えないよう、排他制御する
+        with hold_write_lock():
+            build_index(publish=_publish_index)
+        logger.info(ct.INDEX_BUILD_DONE_MESSAGE)
+    except Exception as e:
+        # 作成に失敗した場合、待機中のセッションには例外を返し、次のセッションの初期化処理で再度作成を試みる
+        # （すでに共有中のインデックスがある場合は、そのまま使い続ける）
+        build_state["error"] = e
+        logger.error(f"{ct.INDEX_BUILD_ERROR_MESSAGE}\n{e}")
+    finally:
+        build_state["ready"].set()
+
+
+def _publish_index(index, newer_only=False):
+    """
+    検索可能になったインデックスを共有し、待機中のセッションに知らせる
+    参照の差し替えのみで行うため、検索中のセッションは差し替え前のインデックスで処理を終えられる
+
+    Args:
+        index: 「retriever」「csv_tables」「roster」「facets」「version」「built_at」をキーに持つ辞書
+        newer_only: Trueの場合、共有中のインデックスより新しいバージョンの場合のみ差し替える
+    """
+    global _shared_index
+
+    with _publish_lock:
+        if newer_only and _shared_index is not None and index["version"] <= _shared_index["version"]:
+            return
+        _shared_index = index
+    _build_state["ready"].set()
+
+
+@contextlib.contextmanager
+def hold_write_lock():
+    """
+    インデックスの作成・部分更新・公開の排他制御
+    同じプロセス内のスレッド間は _write_lock で、同じ「.index」フォルダを使う別のプロセス（サーバーのワーカー）間は
+    ロックファイルで排他制御し、同じバージョンのコレクションを複数のプロセスが同時に作成・削除しないようにする
+    """
+    with _write_lock:
+        os.makedirs(os.path.dirname(ct.INDEX_LOCK_PATH), exist_ok=True)
+        with open(ct.INDEX_LOCK_PATH, "a+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                # msvcrtのロックは一定回数の再試行で失敗するため、取得できるまで繰り返す
+                f.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def build_index(publish=None, embeddings=None):
+    """
+    RAGの参照先となるデータソースを読み込み、インデックスを作成
+    ベクターストアはディスクに永続化し、前回作成時から追加・変更されたファイルのみを読み込み・埋め込み対象とする
+    差分がある場合は、現在のコレクションを新しいコレクションに複製した上で差分を反映し、完成後に差し替える
+    （作成中も、検索は差し替え前のコレクションで行われる）
+    「読み込み → 文字列調整 → チャンク分割 → 埋め込み」はファイル単位で順次流れるため、
+    データソースが増えてもメモリ使用量は一定に保たれる
+
+    Args:
+        publish: インデックスが検索可能になった時点で呼び出す関数（引数は戻り値と同じ辞書）
+        embeddings: 埋め込みモデル（省略時は create_embeddings() の埋め込みモデル）
+
+    Returns:
+        「retriever」「csv_tables」「roster」「facets」「version」「built_at」をキーに持つ辞書
+    """
+    logger = logging.getLogger(ct.LOGGER_NAME)
+
+    # 埋め込みモデルの用意
+    if embeddings is None:
+        embeddings = create_embeddings()
+    # キャッシュの利用状況は、今回の作成処理の分のみを集計する
+    if isinstance(embeddings, CachedEmbeddings):
+        embeddings.reset_stats()
+
+    # 前回作成時のマニフェスト（ファイルごとのフィンガープリントとチャンクIDの一覧）を読み込み
+    manifest = load_manifest()
+    settings = get_index_settings()
+
+    # 現在のコレクションを開く
+    live_db = open_vector_store(embeddings, manifest["collection"]) if manifest["collection"] else None
+
+    # チャンク分割や埋め込みモデルの設定が変わった場合、既存のベクトルは引き継がずに作り直す
+    reuse_live = live_db is not None and manifest["settings"] == settings
+    if live_db is not None and not reuse_live:
+        logger.info(ct.INDEX_RESET_MESSAGE)
+    old_sources = manifest["sources"] if reuse_live else {}
+    new_sources = {}
+
+    # ファイルの差分チェック（更新日時とサイズが前回と同じ場合はハッシュ値の再計算を省略する）
+    source_paths = collect_source_files(ct.RAG_TOP_FOLDER_PATH)
+    changed_paths = []
+    for path in source_paths:
+        old_entry = old_sources.get(path)
+        fingerprint = get_file_fingerprint(path, old_entry)
+        if old_entry and old_entry["sha256"] == fingerprint["sha256"]:
+            # 内容に変更がない場合、前回作成したチャンクIDを引き継ぐ
+            new_sources[path] = {**fingerprint, "ids": old_entry["ids"]}
+            continue
+        changed_paths.append(path)
+        new_sources[path] = fingerprint
+
+    # Webページの差分チェック（取得した内容のハッシュ値で比較）
+    changed_web_docs = check_web_sources(ct.WEB_URL_LOAD_TARGETS, old_sources, new_sources)
+
+    # 削除されたデータソースの一覧
+    current_keys = set(source_paths) | set(ct.WEB_URL_LOAD_TARGETS)
+    removed_keys = [key for key in old_sources if key not in current_keys]
+
+    # CSVファイルは内容の変更有無によらず、構造化クエリ用にDataFrameとして読み込む
+    csv_tables = load_csv_tables(source_paths)
+
+    # 現在のコレクションが同じ埋め込みモデルで作られている場合は、差分の反映を待たずに検索可能とする
+    live_index = None
+    published = False
+    if live_db is not None and manifest["settings"] and manifest["settings"]["embedding_model"] == ct.EMBEDDING_MODEL:
+        live_index = make_index(live_db, csv_tables, manifest)
+        if publish is not None:
+            publish(live_index)
+            published = True
+
+    # 差分がない場合は、現在のコレクションをそのまま使う
+    if reuse_live and not changed_paths and not changed_web_docs and not removed_keys:
+        manifest["sources"] = new_sources
+        saved_index = save_query_vector_store(live_index, manifest)
+        save_manifest(manifest)
+        # 保存したファイルを開き直した場合は、メモリ上の配列の代わりにそちらを共有する
+        if publish is not None and saved_index is not live_index:
+            publish(saved_index)
+        live_index = saved_index
+        logger.info(f"{ct.INDEX_UNCHANGED_MESSAGE} バージョン: {manifest['version']}")
+        return live_index
+
+    # 新しいバージョンのコレクションを用意（前回の作成が途中で中断していた場合に備え、一度空にする）
+    version = manifest["version"] + 1
+    collection_name = f"{ct.COLLECTION_NAME}_v{version}"
+    db = open_vector_store(embeddings, collection_name)
+    db.delete_collection()
+    db = open_vector_store(embeddings, collection_name)
+
+    # 現在のコレクションのベクトルを、削除されたデータソースの分を除いて複製
+    if reuse_live:
+        removed_ids = {chunk_id for key in removed_keys for chunk_id in old_sources[key]["ids"]}
+        copy_collection(live_db, db, removed_ids)
+
+    built_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    new_manifest = {
+        "settings": settings,
+        "sources": new_sources,
+        "collection": collection_name,
+        "previous_collection": manifest["collection"],
+        "version": version,
+        "built_at": built_at,
+        # 設定が変わらない場合のみ、前回のベクトルの次元数を引き継ぐ
+        "embedding_dimension": manifest["embedding_dimension"] if reuse_live else None,
+    }
+
+    # 追加・変更されたデータソースを、読み込み → チャンク分割 → バッチ化 → 埋め込みの順に流す
+    changed_sources = iter_changed_sources(changed_paths, changed_web_docs, old_sources, new_sources)
+    chunks = iter_split_chunks(db, changed_sources, old_sources, new_sources)
+    batches = iter_embedding_batches(chunks)
+    changed_count = 0
+    for stored_count in embed_and_store(db, embeddings, batches):
+        changed_count += stored_count
+        # 検索に使えるインデックスがまだない場合（初回作成時など）は、最初のバッチが追加された時点で検索可能とする
+        # （語句検索用の転置インデックスは、その時点でコレクションにあるチャンクから作成される）
+        if publish is not None and not published:
+            publish(make_index(db, csv_tables, new_manifest))
+            published = True
+
+    log_update_result(version, old_sources, new_sources, len(removed_keys), changed_count, embeddings)
+
+    # 検索用のファイル、マニフェストの順に保存してから、共有中のインデックスを新しいバージョンに差し替え
+    # （他のプロセスがマニフェストの新しいバージョンを検知した時点で、そのバージョンのファイルが揃っているようにする）
+    index = make_index(db, csv_tables, new_manifest)
+    index = save_query_vector_store(index, new_manifest)
+    save_manifest(new_manifest)
+    if publish is not None:
+        publish(index)
+
+    # 差し替え直後はまだ前のバージョンで検索中のセッションがあり得るため、2世代前以前のコレクションのみ削除
+    drop_old_collections(db, {collection_name, manifest["collection"]})
+
+    return index
+
+
+def update_sources(paths):
+    """
+    指定したファイル・Webページの追加・変更・削除のみを反映した、新しいバージョンのインデックスを作成して差し替え
+    （ファイル監視・Webページの定期的な再取得から呼び出され、処理量は変更のあったデータソース数に比例する）
+    検索に使うNumPyの配列と転置インデックスは、共有中のものを書き換えずに、変更のあった行のみを差し替えた複製を作る
+    Chromaで直接検索する設定の場合は、コレクションを直接書き換えると反映途中の状態が検索されるため、
+    新しいバージョンのコレクションを作成するインデックス全体の作成処理に切り替える
+
+    Args:
+        paths: 追加・変更・削除されたファイル、フォルダのパス、またはWebページのURLの一覧
+    """
+    logger = logging.getLogger(ct.LOGGER_NAME)
+
+    # バックグラウンドでのインデックス作成や、他のプロセスの更新処理と同時にコレクションを書き換えないよう、排他制御する
+    with hold_write_lock():
+        manifest = load_manifest()
+        live_index = _shared_index
+        # 反映先のコレクションがない、設定が変わっている、または共有中のインデックスが反映先と異なる場合は、
+        # インデックス全体の作成に切り替える
+        if (
+            not manifest["collection"]
+            or manifest["settings"] != get_index_settings()
+            or live_index is None
+            or live_index["version"] != manifest["version"]
+            or not isinstance(live_index["retriever"].vectorstore, NumpyVectorStore)
+        ):
+            start_index_build()
+            return
+
+        embeddings = create_embeddings()
+        if isinstance(embeddings, CachedEmbeddings):
+            embeddings.reset_stats()
+        db = open_vector_store(embeddings, manifest["collection"])
+        old_sources = manifest["sources"]
+        new_sources = dict(old_sources)
+
+        # WebページのURLは、キャッシュから読み込んで差分をチェック
+        web_urls = [path for path in paths if path in ct.WEB_URL_LOAD_TARGETS]
+        changed_web_docs = check_web_sources(web_urls, old_sources, new_sources)
+
+        # 対象のファイルパスを洗い出し（フォルダの場合は、配下のファイルとマニフェスト上の配下のファイルに展開）
+        target_paths = set()
+        for path in paths:
+            if path in web_urls:
+                continue
+            if os.path.isdir(path):
+                target_paths.update(collect_source_files(path))
+            prefix = os.path.join(path, "")
+            target_paths.update(key for key in old_sources if key == path or key.startswith(prefix))
+            if os.path.isfile(path) and os.path.splitext(path)[1].lower() in ct.SUPPORTED_EXTENSIONS:
+                target_paths.add(path)
+
+        changed_paths = []
+        removed_keys = []
+        for path in sorted(target_paths):
+            old_entry = old_sources.get(path)
+            if not os.path.isfile(path):
+                if old_entry:
+                    removed_keys.append(path)
+                    del new_sources[path]
+                continue
+            fingerprint = get_file_fingerprint(path, old_entry)
+            if old_entry and old_entry["sha256"] == fingerprint["sha256"]:
+                new_sources[path] = {**fingerprint, "ids": old_entry["ids"]}
+                continue
+            changed_paths.append(path)
+            new_sources[path] = fingerprint
+
+        if not changed_paths and not changed_web_docs and not removed_keys:
+            manifest["sources"] = new_sources
+            save_manifest(manifest)
+            return
+
+        # 削除されたファイルのベクトルを削除
+        # （検索は共有中のNumPyの配列で行われるため、コレクションへの書き込みは差し替えまで検索結果に影響しない）
+        removed_ids = [chunk_id for key in removed_keys for chunk_id in old_sources[key]["ids"]]
+        if removed_ids:
+            db.delete(ids=removed_ids)
+
+        # 追加・変更されたファイルを、読み込み → チャンク分割 → バッチ化 → 埋め込みの順に流す
+        changed_sources = iter_changed_sources(changed_paths, changed_web_docs, old_sources, new_sources)
+        chunks = iter_split_chunks(db, changed_sources, old_sources, new_sources)
+        batches = iter_embedding_batches(chunks)
+        changed_count = sum(embed_and_store(db, embeddings, batches))
+
+        manifest["sources"] = new_sources
+        manifest["version"] += 1
+        manifest["built_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        log_update_result(manifest["version"], old_sources, new_sources, len(removed_keys), changed_count, embeddings)
+
+        # 変更のあったデータソースのチャンクのみを、共有中のインデックスに反映した新しいバージョンを作成
+        updated_keys = changed_paths + list(changed_web_docs) + removed_keys
+        index = apply_source_changes(live_index, db, updated_keys, old_sources, new_sources, manifest)
+        index = save_query_vector_store(index, manifest)
+        save_manifest(manifest)
+        _publish_index(index)
+        logger.info(f"{ct.INDEX_PARTIAL_UPDATE_MESSAGE} {', '.join(updated_keys)}")
+
+
+def apply_source_changes(live_index, db, updated_keys, old_sources, new_sources, manifest):
+    """
+    共有中のインデックスから、変更のあったデータソースのチャンクのみを差し替えた新しいインデックスを作成
+    コレクションから読み込むのは変更後のチャンクのみで、他のチャンクのベクトル・転置インデックスの出現情報はそのまま引き継ぐ
+
+    Args:
+        live_index: 共有中のインデックス（NumPyのベクターストアを使うもの）
+        db: 変更を反映済みのChromaのベクターストア
+        updated_keys: 追加・変更・削除されたデータソースのファイルパスまたはURLの一覧
+        old_sources: 変更前のマニフェストのデータソース一覧
+        new_sources: 変更後のマニフェストのデータソース一覧
+        manifest: 変更後のマニフェスト
+
+    Returns:
+        「retriever」「csv_tables」「roster」「facets」「version」「built_at」をキーに持つ辞書
+    """
+    replaced_ids = {chunk_id for key in updated_keys for chunk_id in old_sources.get(key, {}).get("ids", [])}
+    added_ids = [chunk_id for key in updated_keys for chunk_id in new_sources.get(key, {}).get("ids", [])]
+    records = {"ids": [], "embeddings": [], "documents": [], "metadatas": []}
+    # 「ids」が空の場合は全件が返るため、変更後のチャンクがある場合のみ取得する
+    if added_ids:
+        records = db._collection.get(ids=added_ids, include=["embeddings", "documents", "metadatas"])
+
+    retriever = live_index["retriever"]
+    kept_rows = retriever.vectorstore.get_kept_rows(replaced_ids)
+    vectorstore = retriever.vectorstore.apply_changes(kept_rows, records, get_query_vector_store_info(manifest))
+    lexical_index = retriever.lexical_index.apply_changes(kept_rows, vectorstore, records["documents"])
+
+    # CSVファイルは変更のあったもののみ読み込み直し、社員名簿の表は名簿に変更があった場合のみ作り直す
+    csv_tables = dict(live_index["csv_tables"])
+    roster = live_index["roster"]
+    updated_csv_paths = [key for key in updated_keys if os.path.splitext(key)[1].lower() == ".csv"]
+    for path in updated_csv_paths:
+        csv_tables.pop(os.path.basename(path), None)
+    csv_tables.update(load_csv_tables([path for path in updated_csv_paths if path in new_sources]))
+    if any(os.path.basename(path) == ct.ROSTER_FILE_NAME for path in updated_csv_paths):
+        roster = RosterTable.from_csv_tables(csv_tables)
+
+    return assemble_index(vectorstore, lexical_index, csv_tables, roster, manifest)
+
+
+def log_update_result(version, old_sources, new_sources, removed_count, changed_count, embeddings):
+    """
+    インデックスの更新結果と埋め込みキャッシュの利用状況をログに出力
+
+    Args:
+        version: 更新後のバージョン
+        old_sources: 更新前のマニフェストのデータソース一覧
+        new_sources: 更新後のマニフェストのデータソース一覧
+        removed_count: 削除されたデータソースの件数
+        changed_count: 埋め込みを行ったチャンクの件数
+        embeddings: 埋め込みモデル（キャッシュ付きの場合のみ、キャッシュの利用状況を出力する）
+    """
+    logger = logging.getLogger(ct.LOGGER_NAME)
+
+    updated_count = sum(
+        1 for key, entry in new_sources.items()
+        if key not in old_sources or entry["sha256"] != old_sources[key]["sha256"]
+    )
+    logger.info(
+        f"{ct.INDEX_UPDATED_MESSAGE} バージョン: {version}、追加・変更: {updated_count}件、"
+        f"削除: {removed_count}件、"
+        f"変更なし: {len(new_sources) - updated_count}件、"
+        f"埋め込みチャンク: {changed_count}件"
+    )
+    if not isinstance(embeddings, CachedEmbeddings):
+        return
+    cache_stats = embeddings.get_stats()
+    logger.info(
+        f"{ct.EMBEDDING_CACHE_STATS_MESSAGE} ヒット: {cache_stats['hits']}件、"
+        f"ミス: {cache_stats['misses']}件、ヒット率: {cache_stats['hit_rate']:.1%}"
+    )
+
+
+def make_index(db, csv_tables, manifest):
+    """
+    共有するインデックスの辞書を作成
+
+    Args:
+        db: ベクターストア
+        csv_tables: CSVファイルから読み込んだDataFrameの辞書
+        manifest: インデックスのマニフェスト
+
+    Returns:
+        「retriever」「csv_tables」「roster」「facets」「version」「built_at」をキーに持つ辞書
+    """
+    # 検索に使うベクターストア（設定によっては、コレクションの内容をNumPyの配列に展開したもの）
+    vectorstore = open_query_vector_store(db, manifest)
+    # 語句検索用の転置インデックスは、ベクトル検索と同じチャンクから作成する
+    lexical_index = open_lexical_index(vectorstore, manifest)
+    # 社員名簿の構造化クエリ用の表（カテゴリ型の列・値ごとの該当行などを、読み込み時に作成しておく）
+    roster = RosterTable.from_csv_tables(csv_tables)
+    return assemble_index(vectorstore, lexical_index, csv_tables, roster, manifest)
+
+
+def assemble_index(vectorstore, lexical_index, csv_tables, roster, manifest):
+    """
+    検索に使うベクターストア・転置インデックスなどから、共有するインデックスの辞書を作成
+
+    Args:
+        vectorstore: 検索に使うベクターストア
+        lexical_index: 語句検索用の転置インデックス
+        csv_tables: CSVファイルから読み込んだDataFrameの辞書
+        roster: 社員名簿の構造化クエリ用の表
+        manifest: インデックスのマニフェスト
+
+    Returns:
+        「retriever」「csv_tables」「roster」「facets」「version」「built_at」をキーに持つ辞書
+    """
+    return {
+        # ベクトル検索と語句検索を組み合わせたRetrieverの作成
+        "retriever": HybridRetriever(
+            vectorstore=vectorstore,
+            lexical_index=lexical_index,
+            k=ct.SEARCH_KWARGS["k"],
+            fetch_k=ct.HYBRID_FETCH_K
+        ),
+        "csv_tables": csv_tables,
+        "roster": roster,
+        # 検索対象の絞り込みの選択肢（メタデータの項目名をキー、値の一覧を値とする辞書）
+        "facets": lexical_index.get_facets(),
+        "version": manifest["version"],
+        "built_at": manifest["built_at"],
+    }
+
+
+def open_query_vector_store(db, manifest):
+    """
+    検索に使うベクターストアの取得
+    VECTOR_STORE_BACKEND が「numpy」の場合、同じバージョンの保存済みの配列があればメモリマップで読み込み、なければコレクションから作成する
+
+    Args:
+        db: Chromaのベクターストア
+        manifest: インデックスのマニフェスト
+
+    Returns:
+        ベクターストア
+    """
+    if ct.VECTOR_STORE_BACKEND != "numpy":
+        return db
+
+    info = get_query_vector_store_info(manifest)
+    store = NumpyVectorStore.load(get_numpy_index_path(manifest["version"]), db.embeddings)
+    # マニフェストを作り直した場合などに、同じバージョン番号の古い配列を使わないよう、作成元の情報も一致を確認する
+    if store is not None and store.info == info:
+        return store
+    # コレクションが空の場合は、マニフェストに記録したベクトルの次元数を使う（埋め込みモデルのAPIは呼び出さない）
+    return NumpyVectorStore.from_vectorstore(db, ct.NUMPY_VECTOR_DTYPE, info, manifest.get("embedding_dimension"))
+
+
+def open_lexical_index(vectorstore, manifest):
+    """
+    語句検索用の転置インデックスの取得
+    ベクターストアを保存済みのファイルから開いた場合は、同じフォルダに保存した転置インデックスもメモリマップで開く
+
+    Args:
+        vectorstore: open_query_vector_store() で取得したベクターストア
+        manifest: インデックスのマニフェスト
+
+    Returns:
+        転置インデックス
+    """
+    # 保存済みの転置インデックスは、同じフォルダから開いたベクターストアと行の並びが一致する場合のみ使う
+    # （ベクトルの保持形式の変更などで、ベクターストアをコレクションから作り直した場合は、転置インデックスも作り直す）
+    if isinstance(vectorstore, NumpyVectorStore) and isinstance(vectorstore.vectors, np.memmap):
+        lexical_index = LexicalIndex.load(get_numpy_index_path(manifest["version"]), vectorstore)
+        if lexical_index is not None:
+            return lexical_index
+    return LexicalIndex.from_vectorstore(vectorstore)
+
+
+def save_query_vector_store(index, manifest):
+    """
+    検索に使うベクターストアがNumPyの配列の場合、他のワーカーや次回の起動時に読み取り専用で開けるよう、
+    転置インデックスとあわせてバージョンごとのフォルダに保存し、古いバージョンのフォルダを削除
+    マニフェストより先に保存し、他のプロセスが新しいバージョンを検知した時点でファイルが揃っているようにする
+
+    Args:
+        index: 共有するインデックスの辞書
+        manifest: これから保存するマニフェスト（ベクトルの次元数が分かる場合は「embedding_dimension」に記録する）
+
+    Returns:
+        保存したファイルをメモリマップで開き直したインデックス（NumPyの配列を使わない場合・開けない場合は、引数のインデックス）
+        メモリ上に作成した配列は手放し、他のワーカーと同じファイルのページキャッシュを共有する
+    """
+    store = index["retriever"].vectorstore if index else None
+    if not isinstance(store, NumpyVectorStore):
+        return index
+
+    # 以降にコレクションが空になった場合も、埋め込みモデルを呼び出さずに同じ次元数の配列を作成できるよう記録する
+    if store.vectors.shape[1]:
+        manifest["embedding_dimension"] = int(store.vectors.shape[1])
+
+    path = get_numpy_index_path(manifest["version"])
+    if not os.path.isdir(path):
+        # 書き込み途中のフォルダを他のワーカーが開かないよう、プロセスごとの一時フォルダに書き込んでから名前を変える
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        store.save(tmp_path)
+        index["retriever"].lexical_index.save(tmp_path)
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            # 他のワーカーが先に同じバージョンを保存した場合は、そちらを使う
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    # 差し替え直後はまだ前のバージョンで検索中のセッションがあり得るため、2世代前以前のみ削除
+    for name in os.listdir(ct.NUMPY_INDEX_DIR_PATH):
+        version = name[1:]
+        if name.startswith("v") and version.isdigit() and int(version) < manifest["version"] - 1:
+            shutil.rmtree(os.path.join(ct.NUMPY_INDEX_DIR_PATH, name), ignore_errors=True)
+
+    # すでにファイルから開いたものの場合は、そのまま使う
+    if isinstance(store.vectors, np.memmap):
+        return index
+    saved_store = NumpyVectorStore.load(path, store.embeddings)
+    if saved_store is None or saved_store.info != store.info:
+        return index
+    saved_lexical_index = LexicalIndex.load(path, saved_store)
+    if saved_lexical_index is None:
+        return index
+    return assemble_index(saved_store, saved_lexical_index, index["csv_tables"], index["roster"], manifest)
+
+
+def get_numpy_index_path(version):
+    """
+    NumPyの配列の保存先フォルダのパスを取得
+
+    Args:
+        version: インデックスのバージョン
+
+    Returns:
+        保存先フォルダのパス
+    """
+    return os.path.join(ct.NUMPY_INDEX_DIR_PATH, f"v{version}")
+
+
+def get_query_vector_store_info(manifest):
+    """
+    NumPyの配列と一緒に保存する、作成元の情報を取得
+
+    Args:
+        manifest: インデックスのマニフェスト
+
+    Returns:
+        作成元のコレクション名・作成日時・ベクトルの保持形式の辞書
+    """
+    return {
+        "collection": manifest["collection"],
+        "built_at": manifest["built_at"],
+        "dtype": ct.NUMPY_VECTOR_DTYPE,
+    }
+
+
+def copy_collection(src_db, dst_db, exclude_ids):
+    """
+    コレクションのベクトル・本文・メタデータを別のコレクションに複製（埋め込みのやり直しは発生しない）
+
+    Args:
+        src_db: 複製元のベクターストア
+        dst_db: 複製先のベクターストア
+        exclude_ids: 複製しないチャンクIDの集合
+    """
+    offset = 0
+    while True:
+        records = src_db._collection.get(
+            include=["embeddings", "documents", "metadatas"],
+            limit=ct.COLLECTION_COPY_PAGE_SIZE,
+            offset=offset
+        )
+        if not records["ids"]:
+            break
+        offset += len(records["ids"])
+
+        rows = [
+            row for row in zip(records["ids"], records["embeddings"], records["documents"], records["metadatas"])
+            if row[0] not in exclude_ids
+        ]
+        if rows:
+            ids, vectors, documents, metadatas = zip(*rows)
+            dst_db._collection.upsert(ids=list(ids), embeddings=list(vectors), documents=list(documents), metadatas=list(metadatas))
+
+
+def drop_old_collections(db, keep_names):
+    """
+    使われなくなった古いバージョンのコレクションを削除
+
+    Args:
+        db: ベクターストア（クライアントの取得に使う）
+        keep_names: 削除せずに残すコレクション名の集合
+    """
+    for collection in db._client.list_collections():
+        if collection.name.startswith(ct.COLLECTION_NAME) and collection.name not in keep_names:
+            db._client.delete_collection(collection.name)
+
+
+def check_web_sources(web_urls, old_sources, new_sources):
+    """
+    Webページをキャッシュから読み込み、前回作成時から内容が変わったものを抽出
+    （Webページの再取得は web_cache の定期処理で行い、ここではキャッシュがないWebページのみ取得する）
+    読み込めなかったWebページは、前回のベクトルがあればそのまま残し、次回作成時に再度読み込みを試みる
+
+    Args:
+        web_urls: 対象のWebページのURLの一覧
+        old_sources: 前回作成時のマニフェストのデータソース一覧
+        new_sources: 今回のマニフェストのデータソース一覧（この関数内でWebページの分を追加する）
+
+    Returns:
+        URLをキー、読み込んだドキュメントの一覧を値とする辞書（内容が変わったもののみ）
+    """
+    web_docs_all = web_cache.load_web_documents(web_urls)
+
+    changed_web_docs = {}
+    for web_url in web_urls:
+        web_docs = web_docs_all.get(web_url)
+        if web_docs is None:
+            _restore_source_entry(web_url, old_sources, new_sources)
+            continue
+        old_entry = old_sources.get(web_url)
+        fingerprint = {"sha256": get_docs_hash(web_docs)}
+        if old_entry and old_entry["sha256"] == fingerprint["sha256"]:
+            new_sources[web_url] = {**fingerprint, "ids": old_entry["ids"]}
+            continue
+        new_sources[web_url] = fingerprint
+        changed_web_docs[web_url] = web_docs
+
+    return changed_web_docs
+
+
+def iter_changed_sources(changed_paths, changed_web_docs, old_sources, new_sources):
+    """
+    追加・変更されたデータソースを1件ずつ読み込んで返すジェネレーター
+    読み込みに失敗したファイルは、前回のベクトルがあればそのまま残し、次回作成時に再度読み込みを試みる
+
+    Args:
+        changed_paths: 追加・変更されたファイルパスの一覧
+        changed_web_docs: 内容が変わったWebページのドキュメントの辞書
+        old_sources: 前回作成時のマニフェストのデータソース一覧
+        new_sources: 今回のマニフェストのデータソース一覧
+
+    Yields:
+        (ファイルパスまたはURL, ドキュメントの一覧) のタプル
+    """
+    logger = logging.getLogger(ct.LOGGER_NAME)
+
+    # ファイルは複数プロセスで並列に読み込み、読み込みが終わったものから順に後続の処理へ渡す
+    for path, docs, error in load_files(changed_paths):
+        if error is not None:
+            logger.error(f"{ct.FILE_LOAD_ERROR_MESSAGE} {path}\n{error}")
+            _restore_source_entry(path, old_sources, new_sources)
+            continue
+        yield path, docs
+
+    yield from changed_web_docs.items()
+
+
+def _restore_source_entry(key, old_sources, new_sources):
+    """
+    読み込みに失敗したデータソースのマニフェストのエントリを、前回作成時の状態に戻す
+
+    Args:
+        key: ファイルパスまたはURL
+        old_sources: 前回作成時のマニフェストのデータソース一覧
+        new_sources: 今回のマニフェストのデータソース一覧
+    """
+    if key in old_sources:
+        new_sources[key] = old_sources[key]
+    else:
+        new_sources.pop(key, None)
+
+
+def iter_split_chunks(db, sources, old_sources, new_sources):
+    """
+    データソースごとに文字列調整とチャンク分割を行い、チャンクを1件ずつ返すジェネレーター
+    変更前より減ったチャンクのベクトルは、この時点で削除する
+
+    Args:
+        db: ベクターストア
+        sources: (ファイルパスまたはURL, ドキュメントの一覧) のタプルのイテラブル
+        old_sources: 前回作成時のマニフェストのデータソース一覧
+        new_sources: 今回のマニフェストのデータソース一覧（チャンクIDをこの関数内で設定する）
+
+    Yields:
+        (チャンク, チャンクID) のタプル（CSVファイルの行のうち、変更前と内容が同じものは除く）
+    """
+    for key, docs in sources:
+        splitted_docs = split_documents(docs)
+        # 検索対象を絞り込めるよう、フォルダ構成から作成したメタデータを持たせる
+        path_metadata = get_path_metadata(key)
+        # 検索結果のうち、隣り合うチャンクを結合できるよう、データソース内での位置を持たせる
+        for i, doc in enumerate(splitted_docs):
+            doc.metadata.update(path_metadata)
+            doc.metadata["chunk_index"] = i
+        ids = [get_chunk_id(key, i, doc) for i, doc in enumerate(splitted_docs)]
+        new_sources[key]["ids"] = ids
+
+        # 同じIDのチャンクは上書きされるため、変更前にしか存在しないチャンクのみ削除
+        old_ids = set(old_sources.get(key, {}).get("ids", []))
+        stale_ids = sorted(old_ids - set(ids))
+        if stale_ids:
+            db.delete(ids=stale_ids)
+
+        # 内容から作成したIDが変更前にもある場合は、同じ内容のチャンクが保存済みのため埋め込み・保存を省略する
+        yield from (
+            (doc, chunk_id) for doc, chunk_id in zip(splitted_docs, ids)
+            if not (doc.metadata.get("type") == "csv" and chunk_id in old_ids)
+        )
+
+
+def iter_embedding_batches(chunks):
+    """
+    チャンクを、件数（BATCH_SIZE）とトークン数の上限を超えないバッチにまとめて返すジェネレーター
+
+    Args:
+        chunks: (チャンク, チャンクID) のタプルのイテラブル
+
+    Yields:
+        (ドキュメントの一覧, IDの一覧) のタプル
+    """
+    batch_docs, batch_ids, batch_tokens = [], [], 0
+    for doc, doc_id in chunks:
+        tokens = count_tokens(doc.page_content, ct.EMBEDDING_ENCODING_NAME)
+        # 件数またはトークン数が上限に達する場合、新しいバッチを開始
+        if batch_docs and (len(batch_docs) >= ct.BATCH_SIZE or batch_tokens + tokens > ct.EMBEDDING_BATCH_MAX_TOKENS):
+            yield batch_docs, batch_ids
+            batch_docs, batch_ids, batch_tokens = [], [], 0
+        batch_docs.append(doc)
+        batch_ids.append(doc_id)
+        batch_tokens += tokens
+    if batch_docs:
+        yield batch_docs, batch_ids
+
+
+def embed_and_store(db, embeddings, batches):
+    """
+    バッチを並行して埋め込み、完了したバッチから順次ベクターストアに追加するジェネレーター
+    同時に処理中のバッチ数を制限し、埋め込み待ちのチャンクがメモリ上に溜まらないようにする
+
+    Args:
+        db: ベクターストア
+        embeddings: 埋め込みモデル
+        batches: (ドキュメントの一覧, IDの一覧) のタプルのイテラブル
+
+    Yields:
+        ベクターストアに追加したチャンク数（バッチごと）
+    """
+    def embed_batch(batch):
+        batch_docs, batch_ids = batch
+        return batch_docs, batch_ids, embed_with_retry(embeddings, [doc.page_content for doc in batch_docs])
+
+    with ThreadPoolExecutor(max_workers=ct.EMBEDDING_MAX_WORKERS) as executor:
+        # ベクターストアへの書き込みはこのスレッドのみで行う
+        for batch_docs, batch_ids, vectors in bounded_map(executor, embed_batch, batches, ct.EMBEDDING_MAX_WORKERS * 2):
+            db._collection.upsert(
+                ids=batch_ids,
+                embeddings=vectors,
+                metadatas=[doc.metadata for doc in batch_docs],
+                documents=[doc.page_content for doc in batch_docs]
+            )
+            yield len(batch_ids)
+
+
+def bounded_map(executor, fn, items, max_pending):
+    """
+    同時に処理中の件数を制限しながら、executorでfnを各要素に適用するジェネレーター
+    （入力を先読みしすぎないため、前段のジェネレーターとの間のキューとして働く）
+
+    Args:
+        executor: スレッドプールまたはプロセスプール
+        fn: 各要素に適用する関数
+        items: 入力のイテラブル
+        max_pending: 同時に処理中とする最大件数
+
+    Yields:
+        fnの戻り値（入力と同じ順序）
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def embed_with_retry(embeddings, texts):
+    """
+    レート制限（HTTP 429）に達した場合は待機して再試行しながら、文字列の一覧を埋め込み
+
+    Args:
+        embeddings: 埋め込みモデル
+        texts: 埋め込み対象の文字列の一覧
+
+    Returns:
+        ベクトルの一覧
+    """
+    for attempt in range(ct.EMBEDDING_MAX_RETRIES + 1):
+        try:
+            return embeddings.embed_documents(texts)
+        except openai.RateLimitError as e:
+            if attempt == ct.EMBEDDING_MAX_RETRIES:
+                raise
+            # APIから待機時間が指定されていればそれに従い、なければ指数バックオフ（ゆらぎ付き）で待機
+            retry_after = e.response.headers.get("retry-after") if e.response is not None else None
+            try:
+                wait_seconds = float(retry_after)
+            except (TypeError, ValueError):
+                wait_seconds = min(ct.EMBEDDING_RETRY_BASE_SECONDS * 2 ** attempt, ct.EMBEDDING_RETRY_MAX_SECONDS)
+                wait_seconds *= 0.5 + random.random()
+            logging.getLogger(ct.LOGGER_NAME).warning(f"{ct.EMBEDDING_RATE_LIMIT_MESSAGE} {wait_seconds:.1f}秒後に再試行します。")
+            time.sleep(wait_seconds)
+
+
+@functools.lru_cache(maxsize=1)
+def create_embeddings():
+    """
+    インデックス作成用の埋め込みモデルの作成
+    （同じチャンク文字列は再度APIを呼ばないよう、キャッシュを挟む）
+    SQLiteの接続を部分更新のたびに開き直さないよう、プロセス内で1つのインスタンスを使い回す
+
+    Returns:
+        埋め込みモデル
+    """
+    return CachedEmbeddings(OpenAIEmbeddings(model=ct.EMBEDDING_MODEL), ct.EMBEDDING_MODEL)
+
+
+def open_vector_store(embeddings, collection_name):
+    """
+    ディスクに永続化されたベクターストアを開く（存在しない場合は新規作成）
+
+    Args:
+        embeddings: 埋め込みモデル
+        collection_name: コレクション名
+
+    Returns:
+        ベクターストア
+    """
+    return Chroma(
+        collection_name=collection_name,
+        embedding_function=embeddings,
+        persist_directory=ct.VECTOR_STORE_DIR_PATH,
+        # 距離関数はコレクションの新規作成時のみ反映される（変更時は INDEX_SCHEMA_VERSION を上げて作り直す）
+        collection_metadata={"hnsw:space": ct.VECTOR_STORE_DISTANCE}
+    )
+
+
+def get_index_settings():
+    """
+    インデックスの内容に影響する設定値の取得（マニフェストと比較し、変更があれば作り直す）
+
+    Returns:
+        設定値の辞書
+    """
+    return {
+        "schema_version": ct.INDEX_SCHEMA_VERSION,
+        "embedding_model": ct.EMBEDDING_MODEL,
+        "chunk_token_size": ct.CHUNK_TOKEN_SIZE,
+        "chunk_encoding_name": ct.CHUNK_ENCODING_NAME,
+        "heading_max_length": ct.HEADING_MAX_LENGTH,
+        "separator": ct.SEPARATOR,
+    }
+
+
+def load_manifest():
+    """
+    マニフェストファイルの読み込み
+
+    Returns:
+        マニフェストの辞書（ファイルが存在しない・壊れている場合は空のマニフェスト）
+    """
+    manifest = {
+        "settings": None,
+        "sources": {},
+        "collection": None,
+        "previous_collection": None,
+        "version": 0,
+        "built_at": None,
+        "embedding_dimension": None,
+    }
+    try:
+        with open(ct.INDEX_MANIFEST_PATH, encoding="utf-8") as f:
+            saved = json.load(f)
+        if "settings" in saved and "sources" in saved:
+            # バージョン管理を行う前に作成されたマニフェストは、固定名のコレクションを指す
+            manifest["collection"] = ct.COLLECTION_NAME
+            manifest.update(saved)
+    except (OSError, ValueError):
+        pass
+    return manifest
+
+
+def save_manifest(manifest):
+    """
+    マニフェストファイルの保存
+    書き込み途中でプロセスが落ちてもファイルが壊れないよう、一時ファイルに書き込んでから置き換える
+
+    Args:
+        manifest: マニフェストの辞書
+    """
+    dir_path = os.path.dirname(ct.INDEX_MANIFEST_PATH)
+    os.makedirs(dir_path, exist_ok=True)
+    # 複数のプロセスが同時に保存しても同じ一時ファイルに書き込まないよう、一時ファイルの名前は保存ごとに作る
+    fd, tmp_path = tempfile.mkstemp(dir=dir_path, prefix=os.path.basename(ct.INDEX_MANIFEST_PATH), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, ct.INDEX_MANIFEST_PATH)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+def get_file_fingerprint(path, old_entry=None):
+    """
+    ファイルのフィンガープリント（更新日時・サイズ・ハッシュ値）を取得
+
+    Args:
+        path: ファイルパス
+        old_entry: 前回作成時のマニフェストのエントリ
+
+    Returns:
+        フィンガープリントの辞書
+    """
+    stat = os.stat(path)
+    fingerprint = {"mtime": stat.st_mtime, "size": stat.st_size}
+
+    # 更新日時とサイズが前回と同じであれば、ファイルを読み込まずに前回のハッシュ値を使う
+    if old_entry and old_entry.get("mtime") == fingerprint["mtime"] and old_entry.get("size") == fingerprint["size"]:
+        fingerprint["sha256"] = old_entry["sha256"]
+        return fingerprint
+
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(block)
+    fingerprint["sha256"] = sha256.hexdigest()
+    return fingerprint
+
+
+def get_docs_hash(docs):
+    """
+    ドキュメント一覧の内容からハッシュ値を作成
+
+    Args:
+        docs: ドキュメントの一覧
+
+    Returns:
+        ハッシュ値
+    """
+    sha256 = hashlib.sha256()
+    for doc in docs:
+        sha256.update(doc.page_content.encode("utf-8"))
+    return sha256.hexdigest()
+
+
+def get_source_id(key):
+    """
+    データソース（ファイルパスまたはURL）から、チャンクIDの接頭辞を作成
+
+    Args:
+        key: ファイルパスまたはURL
+
+    Returns:
+        チャンクIDの接頭辞
+    """
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def get_chunk_id(key, chunk_index, doc):
+    """
+    チャンクIDの作成
+    通常はデータソース内での位置から作成し、CSVファイルの行は内容（本文とメタデータ）のハッシュ値から作成する
+    （行の内容から作成することで、1行だけ変更されたCSVファイルでは、その行のみが埋め込み・保存の対象となる）
+
+    Args:
+        key: ファイルパスまたはURL
+        chunk_index: データソース内でのチャンクの位置
+        doc: チャンク
+
+    Returns:
+        チャンクID
+    """
+    if doc.metadata.get("type") != "csv":
+        return f"{get_source_id(key)}-{chunk_index}"
+    content = json.dumps([doc.page_content, doc.metadata], ensure_ascii=False, sort_keys=True)
+    return f"{get_source_id(key)}-{doc.metadata['row_id']}-{hashlib.sha1(content.encode('utf-8')).hexdigest()[:12]}"
+
+
+def get_path_metadata(key):
+    """
+    データソースのフォルダ構成から、検索対象の絞り込みに使うメタデータを作成
+    （例: 「MTG議事録/顧客/既存/<顧客名>/」→ カテゴリ・顧客区分・顧客名、「MTG議事録/<部署>/」→ カテゴリ・部署）
+
+    Args:
+        key: ファイルパスまたはURL
+
+    Returns:
+        「category」「department」「customer_status」「customer」のうち、該当するものをキーに持つ辞書
+    """
+    if key.startswith("http"):
+        return {"category": ct.WEB_SOURCE_CATEGORY}
+
+    # ファイル名を除いた、データソースのフォルダからの相対パスのフォルダ名の一覧
+    relative_path = os.path.relpath(key, ct.RAG_TOP_FOLDER_PATH)
+    folders = os.path.normpath(os.path.dirname(relative_path)).split(os.sep)
+    folders = [adjust_string(folder) for folder in folders if folder not in ("", ".")]
+    if not folders or folders[0] == "..":
+        return {}
+
+    metadata = {"category": folders[0]}
+    if folders[0] == ct.MEETING_MINUTES_FOLDER_NAME and len(folders) >= 2:
+        if folders[1] == ct.CUSTOMER_MINUTES_FOLDER_NAME:
+            if len(folders) >= 3:
+                metadata["customer_status"] = folders[2]
+            if len(folders) >= 4:
+                metadata["customer"] = folders[3]
+        else:
+            metadata["department"] = folders[1]
+    return metadata
+
+
+def split_documents(docs):
+    """
+    ドキュメントの文字列調整とチャンク分割
+
+    Args:
+        docs: ドキュメントの一覧
+
+    Returns:
+        チャンク分割後のドキュメントの一覧
+    """
+    # OSがWindowsの場合、Unicode正規化と、cp932（Windows用の文字コード）で表現できない文字を除去
+    for doc in docs:
+        doc.page_content = adjust_string(doc.page_content)
+        for key in doc.metadata:
+            doc.metadata[key] = adjust_string(doc.metadata[key])
+
+    # CSVファイルの行は1件で1チャンクとする（行の途中で分割しない）
+    if docs and all(doc.metadata.get("type") == "csv" for doc in docs):
+        return docs
+
+    # 見出しの構造に沿って、トークン数の上限までチャンク分割を実施
+    return split_structured_documents(
+        docs,
+        ct.CHUNK_TOKEN_SIZE,
+        lambda text: count_tokens(text, ct.CHUNK_ENCODING_NAME)
+    )
+
+
+def load_files(paths):
+    """
+    複数のファイルを並列に読み込むジェネレーター
+    PDFの解析などCPU負荷の高い処理を複数コアで行うため、プロセスプールを使う
+
+    Args:
+        paths: 読み込み対象のファイルパスの一覧
+
+    Yields:
+        (ファイルパス, ドキュメントの一覧, エラー内容) のタプル（順序は引数と同じ）
+    """
+    # PDFなどの解析の負荷が高いファイルの合計サイズが小さい場合は、
+    # ワーカーの起動（ライブラリの読み込み）のコストの方が大きいため同じプロセス内で読み込む
+    if len(paths) < 2 or get_parse_load_bytes(paths) < ct.LOAD_PARALLEL_MIN_BYTES:
+        for path in paths:
+            yield (path, *load_file_safely(path))
+        return
+
+    # スレッドを持つプロセス（Streamlitのサーバー）からのforkは安全でないため、spawnでワーカーを起動する
+    # （ワーカーで実行する関数は file_loader.py に置き、ワーカーがChromaなどの読み込みに使わないライブラリを読み込まないようにする）
+    max_workers = min(ct.LOAD_MAX_WORKERS or os.cpu_count() or 1, len(paths))
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        # 入力と同じ順序で結果を返すため、実行ごとに結果の順序が変わらない
+        # 読み込み済みで後続の処理待ちのファイルが溜まらないよう、先読みする件数を制限する
+        results = bounded_map(executor, load_file_safely, paths, max_workers * 2)
+        for path, result in zip(paths, results):
+            yield (path, *result)
+
+
+def get_parse_load_bytes(paths):
+    """
+    並列読み込みの要否の判定に使う、解析の負荷が高いファイル（LOAD_PARALLEL_EXTENSIONS）の合計サイズを取得
+
+    Args:
+        paths: 読み込み対象のファイルパスの一覧
+
+    Returns:
+        合計サイズ（バイト）
+    """
+    total_bytes = 0
+    for path in paths:
+        if os.path.splitext(path)[1].lower() not in ct.LOAD_PARALLEL_EXTENSIONS:
+            continue
+        try:
+            total_bytes += os.path.getsize(path)
+        except OSError:
+            # 削除されたファイルは、読み込み時にエラーとして扱う
+            continue
+    return total_bytes
+
+
+def collect_source_files(path):
+    """
+    RAGの参照先となるファイルパスの一覧を取得
+
+    Args:
+        path: 読み込み対象のフォルダのパス
+
+    Returns:
+        読み込み対象のファイルパスの一覧（実行ごとに順序が変わらないようソート済み）
+    """
+    source_paths = []
+    for dir_path, dir_names, file_names in os.walk(path):
+        for file_name in file_names:
+            # 想定していたファイル形式の場合のみ対象とする
+            if os.path.splitext(file_name)[1].lower() in ct.SUPPORTED_EXTENSIONS:
+                source_paths.append(os.path.join(dir_path, file_name))
+
+    return sorted(source_paths)
+
+
+def load_csv_tables(source_paths):
+    """
+    CSVファイルをDataFrameとして読み込み
+
+    Args:
+        source_paths: 読み込み対象のファイルパスの一覧
+
+    Returns:
+        ファイル名をキー、DataFrameを値とする辞書
+    """
+    csv_tables = {}
+    for path in source_paths:
+        if os.path.splitext(path)[1].lower() != ".csv":
+            continue
+        try:
+            csv_tables[os.path.basename(path)] = pd.read_csv(path)
+        except Exception:
+            # 文字コードなどで失敗した場合は、構造化クエリの対象外とする
+            continue
+
+    return csv_tables
+
+
+def adjust_string(s):
+    """
+    Windows環境でRAGが正常動作するよう調整
+
+    Args:
+        s: 調整を行う文字列
+
+    Returns:
+        調整を行った文字列
+    """
+    # 調整対象は文字列のみ
+    if type(s) is not str:
+        return s
+
+    # まず全OSでUnicode正規化を適用
+    s = unicodedata.normalize('NFC', s)
+    # OSがWindowsの場合のみ、cp932（Windows用の文字コード）で表現できない文字を除去
+    if sys.platform.startswith("win"):
+        s = s.encode("cp932", "ignore").decode("cp932")
+    return s
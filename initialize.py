@@ -9,19 +9,10 @@ import os
 import logging
 from logging.handlers import TimedRotatingFileHandler
 from uuid import uuid4
-import sys
-import unicodedata
-import time
 from dotenv import load_dotenv
 import streamlit as st
-from docx import Document
-from langchain_community.document_loaders import WebBaseLoader
-from langchain.text_splitter import CharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
 import constants as ct
-import pandas as pd
-from langchain.schema import Document as LangchainDocument
+import indexer
 
 
 ############################################################
@@ -50,7 +41,7 @@ def initialize():
     # RAGのRetrieverを作成
     initialize_retriever()
 
-    print("initialize(): done")    # ← ここ追加
+    logging.getLogger(ct.LOGGER_NAME).info("initialize(): done")
 
 
 def initialize_logger():
@@ -107,42 +98,12 @@ def initialize_session_id():
 
 def initialize_retriever():
     """
-    画面読み込み時にRAGのRetriever（ベクターストアから検索するオブジェクト）を作成
+    画面読み込み時にRAGのRetriever（ベクターストアから検索するオブジェクト）を用意
+    Retrieverはプロセス全体で共有するインデックスから取得するため、作成処理は最初の1回のみ実行される
+    （インデックスはバックグラウンドで差し替わるため、セッションには保持せず、利用のたびに indexer.get_shared_index() から取得する）
     """
-    # ロガーを読み込むことで、後続の処理中に発生したエラーなどがログファイルに記録される
-    logger = logging.getLogger(ct.LOGGER_NAME)
-
-    # すでにRetrieverが作成済みの場合、後続の処理を中断
-    if "retriever" in st.session_state:
-        return
-    
-    # RAGの参照先となるデータソースの読み込み
-    docs_all = load_data_sources()
-
-    # OSがWindowsの場合、Unicode正規化と、cp932（Windows用の文字コード）で表現できない文字を除去
-    for doc in docs_all:
-        doc.page_content = adjust_string(doc.page_content)
-        for key in doc.metadata:
-            doc.metadata[key] = adjust_string(doc.metadata[key])
-    
-    # 埋め込みモデルの用意
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-    
-    # チャンク分割用のオブジェクトを作成
-    text_splitter = CharacterTextSplitter(
-        chunk_size = ct.CHUNK_SIZE,
-        chunk_overlap = ct.CHUNK_OVERLAP,
-        separator = ct.SEPARATOR
-    )
-
-    # チャンク分割を実施
-    splitted_docs = text_splitter.split_documents(docs_all)
-
-    # ベクターストアの作成
-    db = Chroma.from_documents(splitted_docs, embedding=embeddings)
-
-    # ベクターストアを検索するRetrieverの作成
-    st.session_state.retriever = db.as_retriever(search_kwargs=ct.SEARCH_KWARGS)
+    # 共有インデックスが検索可能になるまで待つ（未作成の場合は作成を開始し、他セッションが作成中の場合は完了を待つ）
+    indexer.get_shared_index()
 
 
 def initialize_session_state():
@@ -154,119 +115,7 @@ def initialize_session_state():
         st.session_state.messages = []
         # 「LLMとのやりとり用」の会話ログを順次格納するリストを用意
         st.session_state.chat_history = []
-
-
-def load_data_sources():
-    """
-    RAGの参照先となるデータソースの読み込み
-
-    Returns:
-        読み込んだ通常データソース
-    """
-    # データソースを格納する用のリスト
-    docs_all = []
-    # ファイル読み込みの実行（渡した各リストにデータが格納される）
-    recursive_file_check(ct.RAG_TOP_FOLDER_PATH, docs_all)
-
-    web_docs_all = []
-    # ファイルとは別に、指定のWebページ内のデータも読み込み
-    # 読み込み対象のWebページ一覧に対して処理
-    for web_url in ct.WEB_URL_LOAD_TARGETS:
-        # 指定のWebページを読み込み
-        loader = WebBaseLoader(web_url)
-        web_docs = loader.load()
-        # for文の外のリストに読み込んだデータソースを追加
-        web_docs_all.extend(web_docs)
-    # 通常読み込みのデータソースにWebページのデータを追加
-    docs_all.extend(web_docs_all)
-
-    return docs_all
-
-
-def recursive_file_check(path, docs_all):
-    """
-    RAGの参照先となるデータソースの読み込み
-
-    Args:
-        path: 読み込み対象のファイル/フォルダのパス
-        docs_all: データソースを格納する用のリスト
-    """
-    # パスがフォルダかどうかを確認
-    if os.path.isdir(path):
-        # フォルダの場合、フォルダ内のファイル/フォルダ名の一覧を取得
-        files = os.listdir(path)
-        # 各ファイル/フォルダに対して処理
-        for file in files:
-            # ファイル/フォルダ名だけでなく、フルパスを取得
-            full_path = os.path.join(path, file)
-            # フルパスを渡し、再帰的にファイル読み込みの関数を実行
-            recursive_file_check(full_path, docs_all)
-    else:
-        # パスがファイルの場合、ファイル読み込み
-        file_load(path, docs_all)
-
-
-def file_load(path, docs_all):
-    """
-    ファイル内のデータ読み込み
-
-    Args:
-        path: ファイルパス
-        docs_all: データソースを格納する用のリスト
-    """
-    # ファイルの拡張子を取得
-    file_extension = os.path.splitext(path)[1].lower()
-    # ファイル名（拡張子を含む）を取得
-    file_name = os.path.basename(path)
-
-    # 想定していたファイル形式の場合のみ読み込む
-    if file_extension in ct.SUPPORTED_EXTENSIONS:
-        # CSV は構造化データなので、DataFrame として保持しつつ
-        # ベクターストアには「全データを一つの Document」として格納する
-        if file_extension == ".csv":
-            try:
-                df = pd.read_csv(path)
-            except Exception:
-                # 文字コードなどで失敗した場合は、TextLoader にフォールバック
-                loader = ct.SUPPORTED_EXTENSIONS[file_extension](path)
-                docs = loader.load()
-                docs_all.extend(docs)
-                return
-
-            # セッションに DataFrame を保存して、構造的クエリで直接参照できるようにする
-            if "csv_tables" not in st.session_state:
-                st.session_state["csv_tables"] = {}
-            st.session_state["csv_tables"][os.path.basename(path)] = df
-
-            # DataFrame を CSV 文字列としてまとめて Document にする（分割されないように1ドキュメント）
-            content = df.to_csv(index=False)
-            doc = LangchainDocument(page_content=content, metadata={"source": path, "file_name": os.path.basename(path), "type": "csv"})
-            docs_all.append(doc)
-            return
-
-        # 通常のファイルは既存の loader を使う
-        loader = ct.SUPPORTED_EXTENSIONS[file_extension](path)
-        docs = loader.load()
-        docs_all.extend(docs)
-
-
-def adjust_string(s):
-    """
-    Windows環境でRAGが正常動作するよう調整
-    
-    Args:
-        s: 調整を行う文字列
-    
-    Returns:
-        調整を行った文字列
-    """
-    # 調整対象は文字列のみ
-    if type(s) is not str:
-        return s
-
-    # まず全OSでUnicode正規化を適用
-    s = unicodedata.normalize('NFC', s)
-    # OSがWindowsの場合のみ、cp932（Windows用の文字コード）で表現できない文字を除去
-    if sys.platform.startswith("win"):
-        s = s.encode("cp932", "ignore").decode("cp932")
-    return s
\ No newline at end of file
+        # 「LLMとのやりとり用」の会話ログのうち、上限を超えて要約した古い会話の要約文
+        st.session_state.chat_summary = ""
+        # バックグラウンドで実行中の、古い会話の要約（完了後、次の回答の作成開始時に反映する）
+        st.session_state.chat_compaction = None
@@ -0,0 +1,577 @@
+"""
+このファイルは、文字n-gramの転置インデックスによる語句検索と、ベクトル検索との組み合わせ（ハイブリッド検索）に関する処理が記述されたファイルです。
+顧客名・社員ID・製品名などの固有名詞は、埋め込みベクトルの類似度だけでは上位に来にくいため、
+文字の2-gram・3-gramで語句が一致するチャンクを検索し、ベクトル検索の結果と順位の逆数の和（RRF）で統合します。
+"""
+
+############################################################
+# ライブラリの読み込み
+############################################################
+import math
+import os
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Any, Optional
+import numpy as np
+from langchain_core.retrievers import BaseRetriever
+from langchain.schema import Document as LangchainDocument
+import constants as ct
+from numpy_vector_store import NumpyVectorStore, StringTable, splice_values
+
+
+############################################################
+# 設定関連
+############################################################
+# 完全一致の判定に使う語句（英数字・カタカナ・漢字が3文字以上連続する部分）を抽出する正規表現
+# 「グローバルフュージョン株式会社」のように、ひらがな（助詞など）や記号で区切られるまでを1つの語句とする
+_TERM_PATTERN = re.compile(r"[0-9a-zァ-ヿ一-鿿々\-_.]{3,}")
+# n-gramの最大の文字数（n-gramの配列は、この文字数の固定長の文字列として保持する）
+_MAX_GRAM_LENGTH = 3
+# 保存する際のファイル名の接頭辞と、保存する配列の名前
+_LEXICAL_FILE_PREFIX = "lexical_"
+_LEXICAL_ARRAY_NAMES = ["grams", "offsets", "posting_docs", "posting_counts", "doc_lengths"]
+
+
+############################################################
+# クラス定義
+############################################################
+
+class LexicalIndex:
+    """
+    チャンクの文字の2-gram・3-gramによる転置インデックス（BM25で順位付けする）
+    n-gramごとの出現ドキュメントは連続した配列（CSR形式）で保持し、ベクターストアと同じフォルダに保存してメモリマップで開ける
+    """
+
+    def __init__(self, docs, normalized_texts, grams, offsets, posting_docs, posting_counts, doc_lengths, metadatas,
+                 metadata_postings=None):
+        """
+        Args:
+            docs: インデックスに含めるドキュメントの一覧（番号でドキュメントを取得できるもの）
+            normalized_texts: 完全一致の判定に使う、正規化した本文の一覧
+            grams: n-gramの配列（昇順）
+            offsets: n-gramごとの、posting_docs・posting_counts 上の開始位置の配列（要素数はn-gramの件数+1）
+            posting_docs: n-gramが出現するドキュメントの番号の配列
+            posting_counts: n-gramの出現回数の配列
+            doc_lengths: ドキュメントごとのn-gramの件数の配列
+            metadatas: ドキュメントのメタデータの一覧
+            metadata_postings: 作成済みのメタデータの値ごとのドキュメントの番号の集合（省略時は metadatas から作成する）
+        """
+        self.docs = docs
+        self.normalized_texts = normalized_texts
+        self.grams = grams
+        self.offsets = offsets
+        self.posting_docs = posting_docs
+        self.posting_counts = posting_counts
+        self.doc_lengths = doc_lengths
+        self.average_length = float(np.mean(doc_lengths)) if len(doc_lengths) else 0.0
+        # BM25の文書長による補正項は、検索のたびに計算しないよう事前に計算しておく
+        b = ct.LEXICAL_BM25_B
+        self.length_norms = 1 - b + b * np.asarray(doc_lengths, dtype=np.float32) / max(self.average_length, 1.0)
+        # (メタデータの項目名, 値) をキー、該当するドキュメントの番号の集合を値とする辞書（検索対象の絞り込み用）
+        if metadata_postings is None:
+            metadata_postings = defaultdict(set)
+            add_metadata_postings(metadata_postings, metadatas, 0)
+        self.metadata_postings = metadata_postings
+
+    @classmethod
+    def build(cls, docs, texts, metadatas):
+        """
+        本文から転置インデックスを作成
+
+        Args:
+            docs: インデックスに含めるドキュメントの一覧（番号でドキュメントを取得できるもの）
+            texts: ドキュメントの本文の一覧
+            metadatas: ドキュメントのメタデータの一覧
+
+        Returns:
+            転置インデックス
+        """
+        normalized_texts = [normalize_text(text) for text in texts]
+        return cls(docs, normalized_texts, *build_postings(normalized_texts), metadatas)
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore):
+        """
+        ベクターストアに保存されたチャンクから転置インデックスを作成
+        （ベクトル検索と同じチャンクを対象にするため、チャンク分割をやり直さずにそのまま使う）
+
+        Args:
+            vectorstore: ベクターストア
+
+        Returns:
+            転置インデックス
+        """
+        # NumPyのベクターストアは、本文・メタデータを番号で参照できるため、ドキュメントの一覧として直接使う
+        if isinstance(vectorstore, NumpyVectorStore):
+            return cls.build(vectorstore, vectorstore.documents, vectorstore.metadatas)
+
+        docs = []
+        offset = 0
+        # 件数が多い場合に備え、分割して取得する
+        while True:
+            page = vectorstore.get(include=["documents", "metadatas"], limit=ct.COLLECTION_COPY_PAGE_SIZE, offset=offset)
+            if not page["ids"]:
+                break
+            for page_content, metadata in zip(page["documents"], page["metadatas"]):
+                docs.append(LangchainDocument(page_content=page_content, metadata=metadata or {}))
+            offset += len(page["ids"])
+        return cls.build(docs, [doc.page_content for doc in docs], [doc.metadata for doc in docs])
+
+    @classmethod
+    def load(cls, dir_path, vectorstore):
+        """
+        保存した転置インデックスを読み取り専用で開く（配列はメモリマップで開き、複数のプロセスで共有される）
+
+        Args:
+            dir_path: 保存先のフォルダのパス
+            vectorstore: 同じフォルダから開いたNumPyのベクターストア
+
+        Returns:
+            転置インデックス（保存されていない・壊れている場合はNone）
+        """
+        try:
+            arrays = {
+                name: np.load(os.path.join(dir_path, f"{_LEXICAL_FILE_PREFIX}{name}.npy"), mmap_mode="r")
+                for name in _LEXICAL_ARRAY_NAMES
+            }
+            normalized_texts = StringTable.load(dir_path, f"{_LEXICAL_FILE_PREFIX}texts")
+        except (OSError, ValueError):
+            return None
+        if len(arrays["doc_lengths"]) != len(vectorstore):
+            return None
+        return cls(vectorstore, normalized_texts, metadatas=vectorstore.metadatas, **arrays)
+
+    def apply_changes(self, kept_rows, docs, added_texts):
+        """
+        指定したドキュメントを残し、追加されたドキュメントを末尾に加えた、新しい転置インデックスを作成
+        n-gramの抽出は追加されたドキュメントのみに行い、残すドキュメントの出現情報は番号を振り直して引き継ぐ
+        （元の転置インデックスは検索中のセッションが使い続けるため書き換えない）
+
+        Args:
+            kept_rows: 残すドキュメントの番号の配列（昇順。NumpyVectorStore.get_kept_rows() の戻り値）
+            docs: 変更後のドキュメントの一覧（NumpyVectorStore.apply_changes() で作成したベクターストア）
+            added_texts: 末尾に加えるドキュメントの本文の一覧
+
+        Returns:
+            転置インデックス
+        """
+        kept_count = len(kept_rows)
+        added_normalized_texts = [normalize_text(text) for text in added_texts]
+        added_grams, added_offsets, added_docs, added_counts, added_lengths = build_postings(added_normalized_texts)
+
+        # 残すドキュメントの新しい番号（削除されたドキュメントは-1）
+        remap = np.full(len(self.doc_lengths), -1, dtype=np.int64)
+        remap[kept_rows] = np.arange(kept_count)
+        old_docs = remap[self.posting_docs]
+        valid = old_docs >= 0
+
+        # 変更前と追加分のn-gramを合わせた一覧上での、出現情報ごとのn-gramの位置を求める
+        grams = np.union1d(self.grams, added_grams)
+        old_gram_indexes = np.repeat(np.searchsorted(grams, self.grams), np.diff(self.offsets))[valid]
+        added_gram_indexes = np.repeat(np.searchsorted(grams, added_grams), np.diff(added_offsets))
+        gram_indexes = np.concatenate([old_gram_indexes, added_gram_indexes])
+        # 同じn-gramの中ではドキュメントの番号順に並ぶよう、変更前の分を先にした上で安定ソートする
+        order = np.argsort(gram_indexes, kind="stable")
+        posting_docs = np.concatenate([old_docs[valid], added_docs.astype(np.int64) + kept_count]).astype(np.int32)[order]
+        posting_counts = np.concatenate([np.asarray(self.posting_counts)[valid], added_counts])[order]
+
+        # 出現するドキュメントがなくなったn-gramを除く
+        gram_sizes = np.bincount(gram_indexes, minlength=len(grams))
+        offsets = np.zeros(int(np.count_nonzero(gram_sizes)) + 1, dtype=np.int64)
+        np.cumsum(gram_sizes[gram_sizes > 0], out=offsets[1:])
+
+        metadata_postings = defaultdict(set)
+        for key, doc_indexes in self.metadata_postings.items():
+            kept = {int(remap[doc_index]) for doc_index in doc_indexes if remap[doc_index] >= 0}
+            if kept:
+                metadata_postings[key] = kept
+        add_metadata_postings(metadata_postings, docs.metadatas[kept_count:], kept_count)
+
+        return LexicalIndex(
+            docs,
+            splice_values(self.normalized_texts, kept_rows, added_normalized_texts),
+            grams[gram_sizes > 0],
+            offsets,
+            posting_docs,
+            posting_counts,
+            np.concatenate([np.asarray(self.doc_lengths)[kept_rows], added_lengths]),
+            docs.metadatas,
+            metadata_postings
+        )
+
+    def save(self, dir_path):
+        """
+        転置インデックスを、読み取り専用で開くためのファイルとして保存
+
+        Args:
+            dir_path: 保存先のフォルダのパス（作成済みのもの）
+        """
+        for name in _LEXICAL_ARRAY_NAMES:
+            np.save(os.path.join(dir_path, f"{_LEXICAL_FILE_PREFIX}{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        StringTable.save(dir_path, f"{_LEXICAL_FILE_PREFIX}texts", self.normalized_texts)
+
+    def get_postings(self, gram):
+        """
+        n-gramが出現するドキュメントの番号と出現回数を取得
+
+        Args:
+            gram: n-gram
+
+        Returns:
+            (ドキュメントの番号の配列, 出現回数の配列) のタプル（出現しない場合は空の配列）
+        """
+        gram_index = int(np.searchsorted(self.grams, gram))
+        if gram_index >= len(self.grams) or self.grams[gram_index] != gram:
+            return self.posting_docs[:0], self.posting_counts[:0]
+        start, end = self.offsets[gram_index], self.offsets[gram_index + 1]
+        return self.posting_docs[start:end], self.posting_counts[start:end]
+
+    def search(self, query, k, candidates=None):
+        """
+        語句検索
+
+        Args:
+            query: 検索クエリ
+            k: 取得件数
+            candidates: 検索対象とするドキュメントの番号の集合（省略時は全件）
+
+        Returns:
+            (ドキュメント, BM25スコア) のタプルの一覧（スコアの高い順）
+        """
+        doc_count = len(self.doc_lengths)
+        if not doc_count:
+            return []
+
+        scores = np.zeros(doc_count, dtype=np.float32)
+        k1 = ct.LEXICAL_BM25_K1
+        for gram in set(get_ngrams(query)):
+            doc_indexes, counts = self.get_postings(gram)
+            if not len(doc_indexes):
+                continue
+            idf = math.log(1 + (doc_count - len(doc_indexes) + 0.5) / (len(doc_indexes) + 0.5))
+            counts = counts.astype(np.float32)
+            scores[doc_indexes] += idf * counts * (k1 + 1) / (counts + k1 * self.length_norms[doc_indexes])
+
+        if candidates is not None:
+            mask = np.zeros(doc_count, dtype=bool)
+            mask[list(candidates)] = True
+            scores[~mask] = 0
+        hit_indexes = np.flatnonzero(scores > 0)
+        if len(hit_indexes) > k:
+            hit_indexes = hit_indexes[np.argpartition(-scores[hit_indexes], k - 1)[:k]]
+        hit_indexes = hit_indexes[np.argsort(-scores[hit_indexes], kind="stable")]
+        return [(self.docs[int(doc_index)], float(scores[doc_index])) for doc_index in hit_indexes]
+
+    def find_documents_containing(self, term):
+        """
+        語句を完全に含むドキュメントの検索（転置インデックスで候補を絞ってから、本文で確認する）
+
+        Args:
+            term: 正規化した語句
+
+        Returns:
+            語句を含むドキュメントの番号の集合
+        """
+        n = min(len(term), _MAX_GRAM_LENGTH)
+        grams = {term[i:i + n] for i in range(len(term) - n + 1)}
+        postings = [self.get_postings(gram)[0] for gram in grams]
+        if not postings or not all(len(posting) for posting in postings):
+            return set()
+        # 出現するドキュメントが少ないn-gramから順に絞り込む
+        postings.sort(key=len)
+        candidates = postings[0]
+        for posting in postings[1:]:
+            candidates = np.intersect1d(candidates, posting, assume_unique=True)
+        return {int(doc_index) for doc_index in candidates if term in self.normalized_texts[doc_index]}
+
+    def filter_documents(self, search_filter):
+        """
+        メタデータが絞り込み条件にすべて一致するドキュメントの検索
+
+        Args:
+            search_filter: メタデータの項目名をキー、値を値とする辞書
+
+        Returns:
+            条件に一致するドキュメントの番号の集合
+        """
+        doc_indexes = None
+        for field, value in search_filter.items():
+            matched = self.metadata_postings.get((field, value), set())
+            doc_indexes = set(matched) if doc_indexes is None else doc_indexes & matched
+        return doc_indexes if doc_indexes is not None else set(range(len(self.docs)))
+
+    def get_facets(self):
+        """
+        検索対象の絞り込みに使えるメタデータの値の一覧を取得
+
+        Returns:
+            メタデータの項目名をキー、値の一覧（昇順）を値とする辞書
+        """
+        facets = {field: set() for field in ct.SEARCH_FILTER_FIELDS}
+        for field, value in self.metadata_postings:
+            facets[field].add(value)
+        return {field: sorted(values) for field, values in facets.items()}
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    ベクトル検索と語句検索の結果を、順位の逆数の和（Reciprocal Rank Fusion）で統合するRetriever
+    絞り込み条件（search_filter）を指定した場合は、メタデータが一致するチャンクのみを検索する
+    """
+    vectorstore: Any
+    lexical_index: Any
+    k: int = ct.SEARCH_KWARGS["k"]
+    fetch_k: int = ct.HYBRID_FETCH_K
+    search_filter: Optional[dict] = None
+    # Trueの場合、絞り込んだ結果が0件であれば絞り込まずに検索し直す（入力から自動で設定した条件の場合に使う）
+    filter_fallback: bool = False
+
+    def with_filter(self, search_filter, fallback=False):
+        """
+        絞り込み条件を指定したRetrieverを作成（共有のRetrieverは変更しない）
+
+        Args:
+            search_filter: メタデータの項目名をキー、値を値とする辞書（Noneの場合は絞り込まない）
+            fallback: 絞り込んだ結果が0件の場合に、絞り込まずに検索し直すかどうか
+
+        Returns:
+            Retriever
+        """
+        if not search_filter:
+            return self
+        return self.model_copy(update={"search_filter": search_filter, "filter_fallback": fallback})
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        """
+        ハイブリッド検索
+
+        Args:
+            query: 検索クエリ
+
+        Returns:
+            統合後の順位の高い順に並んだドキュメントの一覧
+        """
+        return self._search_with_fallback(query, None)
+
+    def search_with_threshold(self, query, score_threshold):
+        """
+        関連があると判断できるドキュメントのみのハイブリッド検索
+        ベクトル検索は関連度スコアが下限以上のもの、語句検索は検索クエリ中の固有名詞などの語句を完全に含むもののみを対象とする
+
+        Args:
+            query: 検索クエリ
+            score_threshold: ベクトル検索の関連度スコアの下限
+
+        Returns:
+            統合後の順位の高い順に並んだドキュメントの一覧（関連するものがない場合は空）
+        """
+        return self._search_with_fallback(query, score_threshold)
+
+    def _search_with_fallback(self, query, score_threshold):
+        """
+        絞り込み条件で検索し、結果が0件かつ filter_fallback がTrueの場合は絞り込まずに検索し直す
+
+        Args:
+            query: 検索クエリ
+            score_threshold: ベクトル検索の関連度スコアの下限（Noneの場合は下限なし）
+
+        Returns:
+            統合後の順位の高い順に並んだドキュメントの一覧
+        """
+        docs = self._search(query, score_threshold, self.search_filter)
+        if not docs and self.search_filter and self.filter_fallback:
+            docs = self._search(query, score_threshold, None)
+        return docs
+
+    def _search(self, query, score_threshold, search_filter):
+        """
+        ハイブリッド検索の本体
+
+        Args:
+            query: 検索クエリ
+            score_threshold: ベクトル検索の関連度スコアの下限（Noneの場合は下限なし）
+            search_filter: 絞り込み条件（Noneの場合は絞り込まない）
+
+        Returns:
+            統合後の順位の高い順に並んだドキュメントの一覧
+        """
+        # 絞り込み条件は、ベクトル検索ではベクターストアのメタデータ検索、語句検索では検索対象のドキュメントの番号で指定する
+        vector_filter = to_chroma_filter(search_filter)
+        candidates = self.lexical_index.filter_documents(search_filter) if search_filter else None
+        if candidates is not None and not candidates:
+            return []
+
+        if score_threshold is None:
+            vector_docs = self.vectorstore.similarity_search(query, k=self.fetch_k, filter=vector_filter)
+            lexical_docs = [doc for doc, _ in self.lexical_index.search(query, self.fetch_k, candidates=candidates)]
+            return reciprocal_rank_fusion([vector_docs, lexical_docs])[:self.k]
+
+        vector_docs = [
+            doc for doc, score in self.vectorstore.similarity_search_with_relevance_scores(query, k=self.fetch_k, filter=vector_filter)
+            if score >= score_threshold
+        ]
+
+        # 「株式会社」のように多くのチャンクに含まれる語句は、一致しても関連があるとは言えないため除く
+        max_doc_count = max(1, int(len(self.lexical_index.docs) * ct.LEXICAL_EXACT_TERM_MAX_DOC_RATIO))
+        matched = set()
+        for term in extract_terms(query):
+            doc_indexes = self.lexical_index.find_documents_containing(term)
+            if len(doc_indexes) <= max_doc_count:
+                matched.update(doc_indexes)
+        if candidates is not None:
+            matched &= candidates
+        lexical_docs = [doc for doc, _ in self.lexical_index.search(query, self.fetch_k, candidates=matched)] if matched else []
+
+        return reciprocal_rank_fusion([vector_docs, lexical_docs])[:self.k]
+
+
+############################################################
+# 関数定義
+############################################################
+
+def reciprocal_rank_fusion(ranked_lists, rrf_k=None):
+    """
+    複数の検索結果を、順位の逆数の和（RRF）で統合
+
+    Args:
+        ranked_lists: 順位の高い順に並んだドキュメントの一覧の一覧
+        rrf_k: 順位に加える定数（大きいほど下位の結果も重視される。省略時は HYBRID_RRF_K）
+
+    Returns:
+        統合後の順位の高い順に並んだドキュメントの一覧
+    """
+    if rrf_k is None:
+        rrf_k = ct.HYBRID_RRF_K
+
+    scores = defaultdict(float)
+    docs = {}
+    for ranked_docs in ranked_lists:
+        for rank, doc in enumerate(ranked_docs, start=1):
+            key = get_doc_key(doc)
+            scores[key] += 1 / (rrf_k + rank)
+            docs.setdefault(key, doc)
+
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+def to_chroma_filter(search_filter):
+    """
+    絞り込み条件を、ベクターストア（Chroma）のメタデータ検索の条件に変換
+
+    Args:
+        search_filter: メタデータの項目名をキー、値を値とする辞書（Noneの場合は絞り込まない）
+
+    Returns:
+        Chromaの「where」条件（絞り込まない場合はNone）
+    """
+    if not search_filter:
+        return None
+    conditions = [{field: {"$eq": value}} for field, value in search_filter.items()]
+    # 条件が複数の場合は「$and」でまとめる必要がある
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def build_postings(normalized_texts):
+    """
+    正規化した本文から、n-gramごとの出現ドキュメントの配列（CSR形式）を作成
+
+    Args:
+        normalized_texts: 正規化した本文の一覧
+
+    Returns:
+        (n-gramの配列, 開始位置の配列, 出現ドキュメントの番号の配列, 出現回数の配列, ドキュメントごとのn-gramの件数の配列) のタプル
+    """
+    # n-gramをキー、(ドキュメントの番号, 出現回数) の一覧を値とする辞書
+    postings = defaultdict(list)
+    doc_lengths = np.zeros(len(normalized_texts), dtype=np.int32)
+    for doc_index, text in enumerate(normalized_texts):
+        grams = get_ngrams(text)
+        doc_lengths[doc_index] = len(grams)
+        for gram, count in Counter(grams).items():
+            postings[gram].append((doc_index, count))
+
+    grams = sorted(postings)
+    offsets = np.zeros(len(grams) + 1, dtype=np.int64)
+    np.cumsum([len(postings[gram]) for gram in grams], out=offsets[1:])
+    posting_docs = np.empty(offsets[-1], dtype=np.int32)
+    posting_counts = np.empty(offsets[-1], dtype=np.uint16)
+    for gram_index, gram in enumerate(grams):
+        doc_indexes, counts = zip(*postings[gram])
+        posting_docs[offsets[gram_index]:offsets[gram_index + 1]] = doc_indexes
+        posting_counts[offsets[gram_index]:offsets[gram_index + 1]] = np.minimum(counts, np.iinfo(np.uint16).max)
+
+    return np.array(grams, dtype=f"<U{_MAX_GRAM_LENGTH}"), offsets, posting_docs, posting_counts, doc_lengths
+
+
+def add_metadata_postings(metadata_postings, metadatas, start):
+    """
+    (メタデータの項目名, 値) ごとの該当ドキュメントの番号の集合に、ドキュメントを追加
+
+    Args:
+        metadata_postings: (メタデータの項目名, 値) をキー、ドキュメントの番号の集合を値とする辞書（この関数内で追加する）
+        metadatas: 追加するドキュメントのメタデータの一覧
+        start: 追加するドキュメントの最初の番号
+    """
+    for doc_index, metadata in enumerate(metadatas, start):
+        for field in ct.SEARCH_FILTER_FIELDS:
+            if metadata.get(field):
+                metadata_postings[(field, metadata[field])].add(doc_index)
+
+
+def get_doc_key(doc):
+    """
+    検索結果を統合する際に、同じチャンクかどうかを判定するキーを取得
+
+    Args:
+        doc: ドキュメント
+
+    Returns:
+        データソースとチャンクの位置の組（位置を持たない場合は本文）
+    """
+    if "chunk_index" in doc.metadata:
+        return (doc.metadata.get("source"), doc.metadata["chunk_index"])
+    return (doc.metadata.get("source"), doc.page_content)
+
+
+def normalize_text(text):
+    """
+    語句検索用の文字列の正規化（全角・半角の統一、英字の小文字化、空白の除去）
+
+    Args:
+        text: 対象の文字列
+
+    Returns:
+        正規化した文字列
+    """
+    return "".join(unicodedata.normalize("NFKC", text).lower().split())
+
+
+def get_ngrams(text):
+    """
+    文字列の2-gram・3-gramの一覧を作成（日本語は単語の区切りがないため、形態素解析の代わりに文字n-gramを使う）
+
+    Args:
+        text: 対象の文字列（正規化前・正規化後のどちらでもよい）
+
+    Returns:
+        n-gramの一覧（重複を含む）
+    """
+    text = normalize_text(text)
+    grams = []
+    for n in range(2, _MAX_GRAM_LENGTH + 1):
+        grams.extend(text[i:i + n] for i in range(len(text) - n + 1))
+    return grams
+
+
+def extract_terms(query):
+    """
+    検索クエリから、完全一致の判定に使う語句（固有名詞などの英数字・カタカナ・漢字の連続）を抽出
+
+    Args:
+        query: 検索クエリ
+
+    Returns:
+        正規化した語句の一覧
+    """
+    return _TERM_PATTERN.findall(normalize_text(query))
@@ -0,0 +1,561 @@
+"""
+このファイルは、NumPyの配列によるプロセス内のベクターストアに関する処理が記述されたファイルです。
+Chromaのコレクションの内容（正規化した埋め込みベクトル・本文・メタデータ）を連続した配列に展開し、
+検索は全件との内積（1回の行列積）と argpartition による厳密な上位k件の取得で行います。
+ベクトル・本文・メタデータは読み取り専用のファイル（np.save 形式）に保存し、起動時はメモリマップで開きます。
+同じファイルを開いた複数のプロセス（アプリのワーカー）は、OSのページキャッシュ上の1つの実体を共有します。
+"""
+
+############################################################
+# ライブラリの読み込み
+############################################################
+import os
+import json
+import numpy as np
+from langchain.schema import Document as LangchainDocument
+import constants as ct
+
+
+############################################################
+# 設定関連
+############################################################
+# 保存先フォルダ内のファイル名
+_VECTORS_FILE_NAME = "vectors.npy"
+_SCALES_FILE_NAME = "scales.npy"
+_INFO_FILE_NAME = "info.json"
+# 文字列の一覧を保存する際の名前（「<名前>_data.npy」「<名前>_offsets.npy」の2ファイルになる）
+_IDS_TABLE_NAME = "ids"
+_DOCUMENTS_TABLE_NAME = "documents"
+_METADATAS_TABLE_NAME = "metadatas"
+
+
+############################################################
+# クラス定義
+############################################################
+
+class NumpyVectorStore:
+    """
+    正規化した埋め込みベクトルを1つの配列で保持し、全件の内積で検索するベクターストア
+    （HybridRetriever から使うメソッドは、Chromaと同じ名前・引数とする）
+    """
+
+    def __init__(self, ids, vectors, scales, documents, metadatas, embedding, info=None):
+        """
+        Args:
+            ids: チャンクIDの一覧（リスト、またはファイルから開いた StringTable）
+            vectors: 正規化した埋め込みベクトルの配列（float32、float16、またはint8に量子化したもの）
+            scales: int8に量子化した場合の、行ごとの倍率の配列（それ以外はNone）
+            documents: チャンクの本文の一覧（リスト、またはファイルから開いた StringTable）
+            metadatas: チャンクのメタデータの一覧（リスト、またはファイルから開いた JsonTable）
+            embedding: 検索クエリの埋め込みに使う埋め込みモデル
+            info: 保存時に一緒に記録する情報（作成元のコレクション名など）
+        """
+        self.ids = ids
+        self.vectors = vectors
+        self.scales = scales
+        self.documents = documents
+        self.metadatas = metadatas
+        self.info = info or {}
+        self._embedding = embedding
+        # メタデータの項目名をキー、全チャンク分の値の配列を値とする辞書（絞り込み時に初めて作成する）
+        self._field_values = {}
+
+    @property
+    def embeddings(self):
+        """
+        検索クエリの埋め込みに使う埋め込みモデル
+        """
+        return self._embedding
+
+    @property
+    def nbytes(self):
+        """
+        ベクトルの配列のバイト数
+        """
+        return self.vectors.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, row):
+        """
+        行番号のチャンクのドキュメントを取得（語句検索用の転置インデックスから、ドキュメントの一覧として参照される）
+        """
+        return self.get_document(row)
+
+    def get_kept_rows(self, removed_ids):
+        """
+        部分更新で残す行（削除・差し替え対象のチャンクID以外の行）の行番号を取得
+
+        Args:
+            removed_ids: 削除・差し替え対象のチャンクIDの集合
+
+        Returns:
+            残す行の行番号の配列（昇順）
+        """
+        return np.array([row for row, chunk_id in enumerate(self.ids) if chunk_id not in removed_ids], dtype=np.int64)
+
+    def apply_changes(self, kept_rows, records, info=None):
+        """
+        指定した行を残し、追加・変更されたチャンクを末尾に加えた、新しいベクターストアを作成
+        （元のベクターストアは検索中のセッションが使い続けるため書き換えない。コレクション全体の読み込みは行わない）
+
+        Args:
+            kept_rows: 残す行の行番号の配列（get_kept_rows() の戻り値）
+            records: 追加するチャンクの「ids」「embeddings」「documents」「metadatas」をキーに持つ辞書（Chromaの get() と同じ形式）
+            info: 保存時に一緒に記録する情報
+
+        Returns:
+            ベクターストア
+        """
+        dtype = "int8" if self.scales is not None else self.vectors.dtype.name
+        # 次元数が不明な空のベクターストアの場合は、追加するベクトルの次元数とする
+        dimension = self.vectors.shape[1]
+        if not dimension and records["ids"]:
+            dimension = len(records["embeddings"][0])
+        matrix = normalize_rows(np.asarray(records["embeddings"], dtype=np.float32).reshape(len(records["ids"]), dimension))
+        quantized, scales = quantize(matrix, dtype)
+        kept_vectors = self.vectors[kept_rows] if self.vectors.shape[1] else np.empty((0, dimension), dtype=quantized.dtype)
+        return NumpyVectorStore(
+            splice_values(self.ids, kept_rows, records["ids"]),
+            np.concatenate([kept_vectors, quantized]),
+            None if scales is None else np.concatenate([self.scales[kept_rows], scales]),
+            splice_values(self.documents, kept_rows, records["documents"]),
+            splice_values(self.metadatas, kept_rows, [metadata or {} for metadata in records["metadatas"]]),
+            self._embedding,
+            info
+        )
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore, dtype="float32", info=None, dimension=None):
+        """
+        Chromaのコレクションの内容から作成
+
+        Args:
+            vectorstore: Chromaのベクターストア
+            dtype: ベクトルの保持形式（「float32」「float16」「int8」）
+            info: 保存時に一緒に記録する情報
+            dimension: コレクションが空の場合に使う、ベクトルの次元数（不明な場合はNone）
+
+        Returns:
+            ベクターストア
+        """
+        ids, vectors, documents, metadatas = [], [], [], []
+        offset = 0
+        # 件数が多い場合に備え、分割して取得する
+        while True:
+            records = vectorstore._collection.get(
+                include=["embeddings", "documents", "metadatas"],
+                limit=ct.COLLECTION_COPY_PAGE_SIZE,
+                offset=offset
+            )
+            if not records["ids"]:
+                break
+            ids.extend(records["ids"])
+            vectors.extend(records["embeddings"])
+            documents.extend(records["documents"])
+            metadatas.extend(metadata or {} for metadata in records["metadatas"])
+            offset += len(records["ids"])
+
+        if ids:
+            matrix = normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1))
+        else:
+            # コレクションが空の場合（データソースがない・すべて読み込みに失敗した場合など）は、
+            # 埋め込みモデルのAPIを呼び出さずに、保存済みの次元数（不明な場合は0）の空の配列とする
+            # （次元数が0の場合は、部分更新で最初にチャンクを追加した時点で、そのベクトルの次元数になる）
+            matrix = np.empty((0, dimension or 0), dtype=np.float32)
+        quantized, scales = quantize(matrix, dtype)
+        return cls(ids, quantized, scales, documents, metadatas, vectorstore.embeddings, info)
+
+    @classmethod
+    def load(cls, dir_path, embedding):
+        """
+        保存したベクターストアを読み取り専用で開く
+        ベクトル・本文・メタデータはいずれもメモリマップで開き、参照された部分のみがページキャッシュから読み込まれる
+
+        Args:
+            dir_path: 保存先のフォルダのパス
+            embedding: 検索クエリの埋め込みに使う埋め込みモデル
+
+        Returns:
+            ベクターストア（保存されていない・壊れている場合はNone）
+        """
+        try:
+            with open(os.path.join(dir_path, _INFO_FILE_NAME), encoding="utf-8") as f:
+                info = json.load(f)
+            vectors = np.load(os.path.join(dir_path, _VECTORS_FILE_NAME), mmap_mode="r")
+            scales_path = os.path.join(dir_path, _SCALES_FILE_NAME)
+            scales = np.load(scales_path, mmap_mode="r") if os.path.exists(scales_path) else None
+            ids = StringTable.load(dir_path, _IDS_TABLE_NAME)
+            documents = StringTable.load(dir_path, _DOCUMENTS_TABLE_NAME)
+            metadatas = JsonTable.load(dir_path, _METADATAS_TABLE_NAME)
+        except (OSError, ValueError):
+            return None
+        return cls(ids, vectors, scales, documents, metadatas, embedding, info)
+
+    def save(self, dir_path):
+        """
+        ベクターストアを、読み取り専用で開くためのファイルとして保存
+
+        Args:
+            dir_path: 保存先のフォルダのパス（作成済みのもの）
+        """
+        np.save(os.path.join(dir_path, _VECTORS_FILE_NAME), np.ascontiguousarray(self.vectors))
+        if self.scales is not None:
+            np.save(os.path.join(dir_path, _SCALES_FILE_NAME), np.ascontiguousarray(self.scales))
+        StringTable.save(dir_path, _IDS_TABLE_NAME, self.ids)
+        StringTable.save(dir_path, _DOCUMENTS_TABLE_NAME, self.documents)
+        JsonTable.save(dir_path, _METADATAS_TABLE_NAME, self.metadatas)
+        # 他のファイルがすべて書き込まれてから、最後に作成元の情報を書き込む
+        with open(os.path.join(dir_path, _INFO_FILE_NAME), "w", encoding="utf-8") as f:
+            json.dump(self.info, f, ensure_ascii=False)
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        """
+        ベクトル検索
+
+        Args:
+            query: 検索クエリ
+            k: 取得件数
+            filter: Chromaの「where」と同じ形式の絞り込み条件
+
+        Returns:
+            類似度の高い順に並んだドキュメントの一覧
+        """
+        return [doc for doc, _ in self.similarity_search_with_relevance_scores(query, k=k, filter=filter)]
+
+    def similarity_search_with_relevance_scores(self, query, k=4, filter=None, **kwargs):
+        """
+        関連度スコア（コサイン類似度）付きのベクトル検索
+
+        Args:
+            query: 検索クエリ
+            k: 取得件数
+            filter: Chromaの「where」と同じ形式の絞り込み条件
+
+        Returns:
+            (ドキュメント, 関連度スコア) のタプルの一覧（スコアの高い順）
+        """
+        query_vector = self._embedding.embed_query(query)
+        [hits] = self.search_by_vectors([query_vector], k, filter)
+        return [(self.get_document(row), score) for row, score in hits]
+
+    def search_by_vectors(self, query_vectors, k, filter=None):
+        """
+        複数の検索クエリのベクトルでまとめて検索（全件との内積を1回の行列積で計算し、argpartitionで上位k件を取得）
+
+        Args:
+            query_vectors: 検索クエリの埋め込みベクトルの一覧
+            k: 取得件数
+            filter: Chromaの「where」と同じ形式の絞り込み条件
+
+        Returns:
+            検索クエリごとの (行番号, コサイン類似度) のタプルの一覧（類似度の高い順）
+        """
+        queries = normalize_rows(np.asarray(query_vectors, dtype=np.float32).reshape(len(query_vectors), -1))
+
+        # 絞り込み条件がある場合は、条件に一致する行のみと内積を計算する
+        rows = None
+        if filter:
+            rows = np.flatnonzero(self.get_filter_mask(filter))
+        candidate_count = len(self) if rows is None else len(rows)
+        k = min(k, candidate_count)
+        if k <= 0:
+            return [[] for _ in range(len(queries))]
+
+        scores = self.compute_scores(queries, rows)
+        # 上位k件を順不同で取り出してから、その中だけを並べ替える（全件の並べ替えは行わない）
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for query_index, columns in enumerate(top):
+            columns = columns[np.argsort(-scores[query_index, columns])]
+            row_indexes = columns if rows is None else rows[columns]
+            results.append([(int(row), float(scores[query_index, column])) for row, column in zip(row_indexes, columns)])
+        return results
+
+    def compute_scores(self, queries, rows=None):
+        """
+        検索クエリと各行のベクトルのコサイン類似度を計算
+        float16・int8で保持している場合は、一時的なfloat32の配列が大きくなりすぎないよう、一定の行数ずつ計算する
+
+        Args:
+            queries: 正規化した検索クエリのベクトルの配列
+            rows: 計算対象の行番号の配列（Noneの場合は全行）
+
+        Returns:
+            (検索クエリ数, 行数) の類似度の配列
+        """
+        vectors = self.vectors if rows is None else self.vectors[rows]
+        scales = self.scales if rows is None or self.scales is None else self.scales[rows]
+
+        if vectors.dtype == np.float32:
+            return queries @ vectors.T
+
+        scores = np.empty((len(queries), len(vectors)), dtype=np.float32)
+        for start in range(0, len(vectors), ct.NUMPY_SCAN_BLOCK_ROWS):
+            end = start + ct.NUMPY_SCAN_BLOCK_ROWS
+            block_scores = queries @ vectors[start:end].astype(np.float32).T
+            if scales is not None:
+                block_scores *= scales[start:end]
+            scores[:, start:end] = block_scores
+        return scores
+
+    def get_filter_mask(self, filter):
+        """
+        絞り込み条件に一致する行の真偽値の配列を作成
+
+        Args:
+            filter: Chromaの「where」と同じ形式の絞り込み条件（「$and」と「$eq」、または値の直接指定に対応）
+
+        Returns:
+            行ごとの真偽値の配列
+        """
+        mask = np.ones(len(self), dtype=bool)
+        conditions = filter["$and"] if "$and" in filter else [{field: value} for field, value in filter.items()]
+        for condition in conditions:
+            for field, value in condition.items():
+                if isinstance(value, dict):
+                    value = value["$eq"]
+                mask &= self.get_field_values(field) == value
+        return mask
+
+    def get_field_values(self, field):
+        """
+        メタデータの1項目の、全チャンク分の値の配列を取得（メタデータと並ぶ配列として保持し、使い回す）
+
+        Args:
+            field: メタデータの項目名
+
+        Returns:
+            値の配列（項目を持たないチャンクはNone）
+        """
+        if field not in self._field_values:
+            self._field_values[field] = np.array([metadata.get(field) for metadata in self.metadatas], dtype=object)
+        return self._field_values[field]
+
+    def get_document(self, row):
+        """
+        行番号のチャンクのドキュメントを作成
+
+        Args:
+            row: 行番号
+
+        Returns:
+            ドキュメント
+        """
+        return LangchainDocument(page_content=self.documents[row], metadata=dict(self.metadatas[row]))
+
+    def get(self, ids=None, where=None, limit=None, offset=None, where_document=None, include=None):
+        """
+        保持しているチャンクの取得（Chromaの get() と同じ形式。語句検索用の転置インデックスの作成に使う）
+
+        Args:
+            limit: 取得件数
+            offset: 取得開始位置
+
+        Returns:
+            「ids」「documents」「metadatas」をキーに持つ辞書
+        """
+        start = offset or 0
+        end = len(self) if limit is None else start + limit
+        return {
+            "ids": self.ids[start:end],
+            "documents": self.documents[start:end],
+            "metadatas": self.metadatas[start:end],
+        }
+
+
+class StringTable:
+    """
+    文字列の一覧を、UTF-8で連結したバイト列と各文字列の開始位置の配列として保持する読み取り専用の表
+    ファイルからメモリマップで開くため、Pythonの文字列としてメモリに載るのは参照された要素のみとなる
+    """
+
+    def __init__(self, data, offsets):
+        """
+        Args:
+            data: 文字列をUTF-8で連結したバイト列の配列（uint8）
+            offsets: 各文字列の開始位置の配列（要素数は文字列の件数+1）
+        """
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        return self.decode(self.data[self.offsets[index]:self.offsets[index + 1]].tobytes())
+
+    def splice(self, kept_rows, values):
+        """
+        指定した行を残し、要素を末尾に加えた新しい表を作成（残す行は復元せず、バイト列のままコピーする）
+
+        Args:
+            kept_rows: 残す行の行番号の配列
+            values: 末尾に加える要素の一覧
+
+        Returns:
+            表（メモリ上に作成したもの）
+        """
+        offsets = np.asarray(self.offsets)
+        lengths = np.diff(offsets)[kept_rows]
+        # 残す行のバイト列の位置を、行ごとの開始位置のずれを繰り返して一度に求める
+        positions = np.repeat(offsets[kept_rows] - np.cumsum(lengths) + lengths, lengths) + np.arange(int(lengths.sum()))
+        added = self.from_values(values)
+        data = np.concatenate([np.asarray(self.data)[positions], added.data])
+        new_offsets = np.zeros(len(lengths) + len(added) + 1, dtype=np.int64)
+        np.cumsum(np.concatenate([lengths, np.diff(added.offsets)]), out=new_offsets[1:])
+        return type(self)(data, new_offsets)
+
+    def decode(self, raw):
+        """
+        バイト列から要素を復元
+
+        Args:
+            raw: 1要素分のバイト列
+
+        Returns:
+            要素
+        """
+        return raw.decode("utf-8")
+
+    @classmethod
+    def encode(cls, value):
+        """
+        要素をバイト列に変換
+
+        Args:
+            value: 要素
+
+        Returns:
+            バイト列
+        """
+        return value.encode("utf-8")
+
+    @classmethod
+    def from_values(cls, values):
+        """
+        要素の一覧から表を作成
+
+        Args:
+            values: 要素の一覧
+
+        Returns:
+            表（メモリ上に作成したもの）
+        """
+        encoded = [cls.encode(value) for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(raw) for raw in encoded], out=offsets[1:])
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return cls(data, offsets)
+
+    @classmethod
+    def save(cls, dir_path, name, values):
+        """
+        文字列の一覧をファイルに保存
+
+        Args:
+            dir_path: 保存先のフォルダのパス
+            name: 表の名前
+            values: 要素の一覧（同じ種類の表の場合は、要素を復元せずにそのまま保存する）
+        """
+        table = values if type(values) is cls else cls.from_values(values)
+        np.save(os.path.join(dir_path, f"{name}_data.npy"), np.asarray(table.data))
+        np.save(os.path.join(dir_path, f"{name}_offsets.npy"), np.asarray(table.offsets))
+
+    @classmethod
+    def load(cls, dir_path, name):
+        """
+        保存した表をメモリマップで開く
+
+        Args:
+            dir_path: 保存先のフォルダのパス
+            name: 表の名前
+
+        Returns:
+            表
+        """
+        data = np.load(os.path.join(dir_path, f"{name}_data.npy"), mmap_mode="r")
+        offsets = np.load(os.path.join(dir_path, f"{name}_offsets.npy"), mmap_mode="r")
+        return cls(data, offsets)
+
+
+class JsonTable(StringTable):
+    """
+    辞書の一覧を、要素ごとのJSON文字列として保持する読み取り専用の表（参照された要素のみを復元する）
+    """
+
+    def decode(self, raw):
+        return json.loads(raw)
+
+    @classmethod
+    def encode(cls, value):
+        return json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+
+############################################################
+# 関数定義
+############################################################
+
+def splice_values(values, kept_rows, new_values):
+    """
+    一覧のうち指定した行を残し、要素を末尾に加えた新しい一覧を作成
+
+    Args:
+        values: 元の一覧（リスト、またはファイルから開いた StringTable）
+        kept_rows: 残す行の行番号の配列
+        new_values: 末尾に加える要素の一覧
+
+    Returns:
+        元の一覧と同じ種類の、新しい一覧
+    """
+    if isinstance(values, StringTable):
+        return values.splice(kept_rows, new_values)
+    return [values[row] for row in kept_rows] + list(new_values)
+
+
+def normalize_rows(matrix):
+    """
+    行ごとにベクトルを長さ1に正規化（内積がそのままコサイン類似度になるようにする）
+
+    Args:
+        matrix: ベクトルを行とする配列
+
+    Returns:
+        正規化した配列
+    """
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def quantize(matrix, dtype):
+    """
+    正規化したベクトルの配列を、保持形式に変換
+
+    Args:
+        matrix: 正規化したfloat32のベクトルの配列
+        dtype: 保持形式（「float32」「float16」「int8」）
+
+    Returns:
+        (変換後の配列, int8の場合は行ごとの倍率の配列（それ以外はNone）) のタプル
+    """
+    if dtype == "float32":
+        return np.ascontiguousarray(matrix), None
+    if dtype == "float16":
+        return matrix.astype(np.float16), None
+    if dtype == "int8":
+        # 行ごとに絶対値の最大値が127になるよう倍率を決める（内積の計算後に倍率を掛けて戻す）
+        scales = np.abs(matrix).max(axis=1, initial=0.0) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.round(matrix / scales[:, None]).astype(np.int8)
+        return quantized, scales.astype(np.float32)
+    raise ValueError(f"未対応のベクトルの保持形式です: {dtype}")
@@ -0,0 +1,303 @@
+"""
+このファイルは、社員名簿（CSV）に対する構造化クエリに関する処理が記述されたファイルです。
+読み込み時に、部署・役職などの列をカテゴリ型に、日付の列を日付型に変換し、
+値ごとの該当行（スキルセット・保有資格はカンマ区切りの値を1つずつに分けたもの）を事前に作成しておくことで、
+質問のたびに全行の文字列検索を行わずに、絞り込み・件数・グループ別の件数・並べ替えに回答します。
+"""
+
+############################################################
+# ライブラリの読み込み
+############################################################
+import re
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+import constants as ct
+from lexical_index import normalize_text
+
+
+############################################################
+# 設定関連
+############################################################
+# 「2020年以降」「2015年より前」などの年の範囲を抽出する正規表現
+_YEAR_RANGE_PATTERN = re.compile(r"(\d{4})年(以降|以後|から|より後|以前|まで|より前)")
+# 年の範囲のうち、指定した年を含まない・終わりを表す語句
+_YEAR_RANGE_AFTER_WORDS = {"より後"}
+_YEAR_RANGE_UNTIL_WORDS = {"以前", "まで", "より前"}
+# 並べ替えの向きを表す語句（「年齢が高い順」「入社日が新しい順」など）のうち、降順を表すもの
+_SORT_DESCENDING_WORDS = {"新しい", "高い", "大きい", "遅い", "多い"}
+_SORT_PATTERN = re.compile(r"(新しい|古い|高い|低い|大きい|小さい|若い|早い|遅い|多い|少ない)順")
+
+
+############################################################
+# クラス定義
+############################################################
+
+class RosterTable:
+    """
+    社員名簿の構造化クエリ用の表
+    カテゴリ型の列・カンマ区切りの列は値ごとの該当行の配列を、日付の列は並べ替え済みの行の順番を事前に作成して保持する
+    """
+
+    def __init__(self, df):
+        """
+        Args:
+            df: 社員名簿のDataFrame（CSVファイルから読み込んだままのもの）
+        """
+        df = df.reset_index(drop=True)
+        # 表示・ダウンロード用に、型を変換する前の値も保持する
+        self.source_df = df
+        df = df.copy()
+        self.category_columns = [column for column in ct.ROSTER_CATEGORY_COLUMNS if column in df.columns]
+        self.multi_value_columns = [column for column in ct.ROSTER_MULTI_VALUE_COLUMNS if column in df.columns]
+        self.date_columns = [column for column in ct.ROSTER_DATE_COLUMNS if column in df.columns]
+
+        for column in self.category_columns:
+            df[column] = df[column].astype("category")
+        for column in self.date_columns:
+            df[column] = pd.to_datetime(df[column], errors="coerce")
+        self.df = df
+
+        # 列名をキー、(値をキー、該当する行番号の配列を値とする辞書) を値とする辞書
+        self.value_rows = {}
+        for column in self.category_columns:
+            codes = df[column].cat.codes.to_numpy()
+            self.value_rows[column] = {
+                value: np.flatnonzero(codes == code) for code, value in enumerate(df[column].cat.categories)
+            }
+        for column in self.multi_value_columns:
+            exploded = df[column].fillna("").str.split(ct.ROSTER_MULTI_VALUE_SEPARATOR).explode().str.strip()
+            exploded = exploded[exploded != ""]
+            self.value_rows[column] = {
+                value: np.unique(rows.to_numpy()) for value, rows in exploded.index.to_series().groupby(exploded.to_numpy())
+            }
+
+        # 日付の列は、範囲での絞り込み（二分探索）と並べ替えに使うため、日付順の行番号と日付の整数値を保持する
+        self.date_orders = {}
+        for column in self.date_columns:
+            values = df[column].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+            valid_rows = np.flatnonzero(df[column].notna().to_numpy())
+            order = valid_rows[np.argsort(values[valid_rows], kind="stable")]
+            self.date_orders[column] = (order, values[order])
+
+        # 質問文から値を見つけるため、(正規化した値, 列名, 値) の一覧を、長い値から順に保持する
+        self.vocabulary = sorted(
+            (
+                (normalize_text(str(value)), column, value)
+                for column, rows_by_value in self.value_rows.items()
+                for value in rows_by_value
+            ),
+            key=lambda item: -len(item[0])
+        )
+
+    @classmethod
+    def from_csv_tables(cls, csv_tables):
+        """
+        CSVファイルから読み込んだDataFrameの辞書から、社員名簿の表を作成
+
+        Args:
+            csv_tables: ファイル名をキー、DataFrameを値とする辞書
+
+        Returns:
+            社員名簿の表（社員名簿がない場合はNone）
+        """
+        df = csv_tables.get(ct.ROSTER_FILE_NAME) if csv_tables else None
+        if df is None:
+            return None
+        return cls(df)
+
+    def select(self, filters=None, date_ranges=None):
+        """
+        条件に一致する行の絞り込み（同じ列の複数の値は「いずれか」、異なる列の条件は「すべて」に一致するもの）
+
+        Args:
+            filters: 列名をキー、値の一覧を値とする辞書
+            date_ranges: 日付の列名をキー、(開始日, 終了日) のタプル（Noneは範囲の指定なし、終了日は含まない）を値とする辞書
+
+        Returns:
+            該当する行番号の配列（昇順）
+        """
+        rows = np.arange(len(self.df))
+        for column, values in (filters or {}).items():
+            rows_by_value = self.value_rows.get(column, {})
+            matched = [rows_by_value[value] for value in values if value in rows_by_value]
+            column_rows = np.unique(np.concatenate(matched)) if matched else rows[:0]
+            rows = np.intersect1d(rows, column_rows, assume_unique=True)
+
+        for column, (start, end) in (date_ranges or {}).items():
+            order, values = self.date_orders[column]
+            lower = 0 if start is None else np.searchsorted(values, pd.Timestamp(start).value, side="left")
+            upper = len(values) if end is None else np.searchsorted(values, pd.Timestamp(end).value, side="left")
+            rows = np.intersect1d(rows, np.sort(order[lower:upper]), assume_unique=True)
+        return rows
+
+    def count_by(self, column, rows):
+        """
+        行をグループに分けた件数の集計
+
+        Args:
+            column: グループ分けに使う列名
+            rows: 集計対象の行番号の配列
+
+        Returns:
+            値をキー、件数を値とする辞書（件数の多い順）
+        """
+        if column in self.category_columns:
+            codes = self.df[column].cat.codes.to_numpy()[rows]
+            counts = np.bincount(codes[codes >= 0], minlength=len(self.df[column].cat.categories))
+            pairs = zip(self.df[column].cat.categories, counts)
+        else:
+            pairs = (
+                (value, len(np.intersect1d(value_rows, rows, assume_unique=True)))
+                for value, value_rows in self.value_rows[column].items()
+            )
+        return dict(sorted(((value, int(count)) for value, count in pairs if count), key=lambda item: -item[1]))
+
+    def sort_rows(self, rows, column, ascending=True):
+        """
+        行の並べ替え
+
+        Args:
+            rows: 並べ替える行番号の配列
+            column: 並べ替えに使う列名
+            ascending: 昇順かどうか
+
+        Returns:
+            並べ替え後の行番号の配列（値が空の行は末尾）
+        """
+        if column in self.date_orders:
+            order = self.date_orders[column][0]
+            order = order[np.isin(order, rows)]
+            if not ascending:
+                order = order[::-1]
+            missing = np.setdiff1d(rows, order, assume_unique=True)
+            return np.concatenate([order, missing])
+        values = self.df[column].to_numpy()[rows]
+        order = np.argsort(values, kind="stable")
+        return rows[order if ascending else order[::-1]]
+
+    def run(self, query):
+        """
+        構造化クエリの実行
+
+        Args:
+            query: parse_question() で作成した構造化クエリ
+
+        Returns:
+            「count」（該当件数）「groups」（グループ別の件数。グループ分けしない場合はNone）「frame」（表示用のDataFrame）をキーに持つ辞書
+        """
+        rows = self.select(query["filters"], query["date_ranges"])
+        if query["sort_by"]:
+            column, ascending = query["sort_by"]
+            rows = self.sort_rows(rows, column, ascending)
+
+        groups = None
+        if query["group_by"]:
+            groups = self.count_by(query["group_by"], rows)
+            frame = pd.DataFrame({query["group_by"]: list(groups), ct.ROSTER_COUNT_COLUMN_NAME: list(groups.values())})
+        else:
+            frame = self.source_df.iloc[rows]
+        return {"count": len(rows), "groups": groups, "frame": frame}
+
+    def parse_question(self, question):
+        """
+        質問文から構造化クエリを作成（社員名簿に関する質問でない場合はNone）
+        部署・役職・スキルなどの値は、名簿に実際に含まれる値と質問文を照合して見つける
+
+        Args:
+            question: ユーザー入力値
+
+        Returns:
+            「filters」「date_ranges」「group_by」「sort_by」をキーに持つ辞書（該当しない場合はNone）
+        """
+        text = normalize_text(question)
+
+        # 「Java」と「Oracle認定Javaプログラマ」のように、長い値の一部として含まれる短い値は除く
+        filters = defaultdict(list)
+        matched_texts = []
+        for value_text, column, value in self.vocabulary:
+            if value_text and value_text in text and not any(value_text in matched for matched in matched_texts):
+                filters[column].append(value)
+                matched_texts.append(value_text)
+
+        date_ranges = {}
+        for keyword, column in ct.ROSTER_DATE_KEYWORDS.items():
+            if column not in self.date_columns or keyword not in question:
+                continue
+            for year, word in _YEAR_RANGE_PATTERN.findall(question):
+                year = int(year)
+                start, end = date_ranges.get(column, (None, None))
+                if word in _YEAR_RANGE_UNTIL_WORDS:
+                    end = f"{year + 1 if word != 'より前' else year}-01-01"
+                else:
+                    start = f"{year + 1 if word in _YEAR_RANGE_AFTER_WORDS else year}-01-01"
+                date_ranges[column] = (start, end)
+
+        group_by = None
+        for keyword, column in ct.ROSTER_GROUP_KEYWORDS.items():
+            if column in self.value_rows and any(f"{keyword}{suffix}" in question for suffix in ct.ROSTER_GROUP_SUFFIXES):
+                group_by = column
+                break
+
+        sort_by = None
+        match = _SORT_PATTERN.search(question)
+        if match:
+            for keyword, column in ct.ROSTER_SORT_KEYWORDS.items():
+                if column in self.df.columns and keyword in question[:match.start()]:
+                    descending = match.group(1) in _SORT_DESCENDING_WORDS
+                    # 「若い順」は、年齢では昇順、生年月日では降順
+                    if match.group(1) == "若い":
+                        descending = column != "年齢"
+                    sort_by = (column, not descending)
+                    break
+
+        # 「年齢が高い順」のような名簿の列による並べ替えの指定がある場合は、社員を表す語句がなくても名簿に関する質問とみなす
+        # それ以外は、一覧・人数を求める語句かグループ分けの指定があり、社員を表す語句か名簿に対する条件がある場合のみ名簿に関する質問とみなす
+        # （「営業部の社員の評価制度について」のような、条件と「社員」だけの質問や、資料・規則などを求める質問は文書の検索として扱う）
+        if sort_by is None:
+            # 「正社員」の「社員」のように、見つけた名簿の値の一部として含まれる語句は数えない
+            remaining_text = text
+            for matched in matched_texts:
+                remaining_text = remaining_text.replace(matched, " ")
+            mentions_roster = bool(filters or date_ranges) or any(
+                normalize_text(keyword) in remaining_text for keyword in ct.ROSTER_QUERY_KEYWORDS
+            )
+            asks_listing = group_by is not None or any(
+                normalize_text(keyword) in remaining_text for keyword in ct.ROSTER_LISTING_KEYWORDS
+            )
+            asks_document = any(normalize_text(keyword) in remaining_text for keyword in ct.ROSTER_DOCUMENT_KEYWORDS)
+            if not mentions_roster or not asks_listing or asks_document:
+                return None
+        return {"filters": dict(filters), "date_ranges": date_ranges, "group_by": group_by, "sort_by": sort_by}
+
+
+############################################################
+# 関数定義
+############################################################
+
+def build_summary(query, result):
+    """
+    構造化クエリの結果の要約文を作成
+
+    Args:
+        query: 構造化クエリ
+        result: RosterTable.run() の結果
+
+    Returns:
+        要約文
+    """
+    conditions = [f"{column}: {'・'.join(map(str, values))}" for column, values in query["filters"].items()]
+    for column, (start, end) in query["date_ranges"].items():
+        bounds = ([f"{start}以降"] if start else []) + ([f"{end}より前"] if end else [])
+        conditions.append(f"{column}: {'・'.join(bounds)}")
+    lines = []
+    if conditions:
+        lines.append(f"条件: {'、'.join(conditions)}")
+    lines.append(f"該当レコード数: {result['count']} 件。")
+    if result["groups"] is not None:
+        lines.append(f"{query['group_by']}ごとの件数:")
+        lines.extend(f"- {value}: {count} 件" for value, count in result["groups"].items())
+    if query["sort_by"]:
+        column, ascending = query["sort_by"]
+        lines.append(f"並び順: {column}の{'昇順' if ascending else '降順'}")
+    return "\n".join(lines)
@@ -0,0 +1,318 @@
+"""
+このファイルは、見出しの構造に沿ったチャンク分割に関する処理が記述されたファイルです。
+議事録（「1. 基本情報」「3.1 開発進捗報告」など）やサービス資料の見出しで区切った節を単位に、
+トークン数の上限（CHUNK_TOKEN_SIZE）まで節をまとめてチャンクにします。
+表（「|」区切りやタブ区切りの連続する行）は、上限を超えない限り途中で分割しません。
+PDFはページごとのドキュメントを別々に分割するため、チャンクがページをまたぐことはありません。
+"""
+
+############################################################
+# ライブラリの読み込み
+############################################################
+import re
+from langchain.schema import Document as LangchainDocument
+import constants as ct
+
+
+############################################################
+# 設定関連
+############################################################
+# 見出しの行を判定する正規表現（「1. 」「3.1 」「(1)」「（1）」「第1章」などで始まる行）
+_HEADING_PATTERN = re.compile(r"^(?:(\d+(?:\.\d+)*)(?:\.|[ 　])|[(（]\d+[)）]|第\d+[章節条])")
+# 議事録の基本情報から、日時を抽出する正規表現
+_MEETING_DATE_PATTERN = re.compile(r"^日時[ 　]*[:：][ 　]*(.+)$")
+# 表の行を判定する正規表現（「|」で囲まれた行、またはタブ区切りの行）
+_TABLE_ROW_PATTERN = re.compile(r"^[|｜].*[|｜]$|\t")
+# 表の見出し行と本文の区切りの行（「|---|---|」など）を判定する正規表現
+_TABLE_DIVIDER_PATTERN = re.compile(r"^[|｜]?[ 　]*:?-{3,}")
+
+
+############################################################
+# 関数定義
+############################################################
+
+def split_structured_documents(docs, chunk_tokens, length_function):
+    """
+    ドキュメントを見出しの構造に沿ってチャンク分割
+    各チャンクには、最初の節の見出し（上位の見出しから「 > 」でつないだもの）と、議事録の場合は日時をメタデータとして持たせる
+
+    Args:
+        docs: ドキュメントの一覧（PDFの場合はページごと）
+        chunk_tokens: 1チャンクあたりのトークン数の上限
+        length_function: 文字列のトークン数を返す関数
+
+    Returns:
+        チャンク分割後のドキュメントの一覧
+    """
+    # 日時は議事録の先頭（PDFの場合は1ページ目）にのみ書かれるため、データソースごとに全ページから探す
+    meeting_dates = find_meeting_dates(docs)
+
+    chunks = []
+    for doc in docs:
+        meeting_date = meeting_dates.get(doc.metadata.get("source"))
+        for text, section in pack_sections(parse_sections(doc.page_content), chunk_tokens, length_function):
+            metadata = dict(doc.metadata)
+            if section:
+                metadata["section"] = section
+            if meeting_date:
+                metadata["meeting_date"] = meeting_date
+            chunks.append(LangchainDocument(page_content=text, metadata=metadata))
+    return chunks
+
+
+def parse_sections(text):
+    """
+    文字列を見出しごとの節に分割（空行は除く）
+
+    Args:
+        text: 対象の文字列
+
+    Returns:
+        「path」（上位の見出しからつないだ見出し）「heading」（見出しの行）「lines」（見出しを含む行の一覧）をキーに持つ辞書の一覧
+    """
+    sections = []
+    # (見出しの階層, 見出しの行) の一覧（現在の節に至るまでの上位の見出し）
+    heading_stack = []
+    current = {"path": "", "heading": None, "lines": []}
+
+    for line in text.split(ct.SEPARATOR):
+        line = line.rstrip()
+        if not line.strip():
+            continue
+
+        level = get_heading_level(line)
+        if not level:
+            current["lines"].append(line)
+            continue
+
+        if current["lines"]:
+            sections.append(current)
+        while heading_stack and heading_stack[-1][0] >= level:
+            heading_stack.pop()
+        heading_stack.append((level, line.strip()))
+        current = {
+            "path": " > ".join(heading for _, heading in heading_stack),
+            "heading": line,
+            "lines": [line],
+        }
+
+    if current["lines"]:
+        sections.append(current)
+    return sections
+
+
+def get_heading_level(line):
+    """
+    行が見出しかどうかを判定し、見出しの階層を取得
+
+    Args:
+        line: 対象の行
+
+    Returns:
+        見出しの階層（「1.」は1、「3.1」は2、「(1)」は3。見出しでない場合は0）
+    """
+    line = line.strip()
+    # 長い行や句点で終わる行は、番号付きの本文とみなす
+    if len(line) > ct.HEADING_MAX_LENGTH or line.endswith("。"):
+        return 0
+    # 「(1)」などで始まる表の行は、見出しとみなさない
+    if is_table_row(line):
+        return 0
+
+    match = _HEADING_PATTERN.match(line)
+    if not match:
+        return 0
+    if match.group(1):
+        return match.group(1).count(".") + 1
+    if line.startswith("第"):
+        return 1
+    return 3
+
+
+def pack_sections(sections, chunk_tokens, length_function):
+    """
+    節を、トークン数の上限までまとめてチャンクの文字列にする
+    上限を超える節は行の区切りで分割し、続きのチャンクの先頭には節の見出しの行を付ける
+
+    Args:
+        sections: parse_sections() で分割した節の一覧
+        chunk_tokens: 1チャンクあたりのトークン数の上限
+        length_function: 文字列のトークン数を返す関数
+
+    Returns:
+        (チャンクの文字列, 最初の節の見出し) のタプルの一覧
+    """
+    chunks = []
+    lines, tokens, section_path = [], 0, None
+
+    def flush():
+        nonlocal lines, tokens, section_path
+        if lines:
+            chunks.append((ct.SEPARATOR.join(lines), section_path))
+        lines, tokens, section_path = [], 0, None
+
+    for section in sections:
+        line_tokens = [length_function(line) + 1 for line in section["lines"]]
+        section_tokens = sum(line_tokens)
+
+        # 節をまるごと追加すると上限を超える場合は、それまでの節でチャンクを区切る
+        if lines and tokens + section_tokens > chunk_tokens:
+            flush()
+        # 見出しより前の文書名などの行のみの場合は、続く節の見出しを使う
+        if not section_path:
+            section_path = section["path"]
+
+        if section_tokens <= chunk_tokens:
+            lines.extend(section["lines"])
+            tokens += section_tokens
+            continue
+
+        # 1つの節だけで上限を超える場合は、行の区切りで分割する（表はまとめたまま、1行だけで上限を超える行はさらに分割する）
+        # 続きのチャンクの先頭には見出しの行を付けるため、見出しの行の分を除いた上限で分割する
+        piece_tokens = chunk_tokens
+        if section["heading"] is not None:
+            piece_tokens = max(1, chunk_tokens - line_tokens[0])
+        pieces = []
+        for block_lines, block_tokens in group_table_rows(section["lines"], line_tokens):
+            if len(block_lines) > 1:
+                pieces.extend(split_table(block_lines, block_tokens, piece_tokens, length_function))
+            elif block_tokens[0] <= piece_tokens:
+                pieces.append((block_lines[0], block_tokens[0]))
+            else:
+                pieces.extend(
+                    (piece, length_function(piece) + 1)
+                    for piece in split_long_line(block_lines[0], block_tokens[0], piece_tokens)
+                )
+
+        for piece, count in pieces:
+            if lines and tokens + count > chunk_tokens:
+                flush()
+                section_path = section["path"]
+                # 続きのチャンクでも、どの節の内容か分かるよう見出しの行を付ける
+                if section["heading"] is not None:
+                    lines.append(section["heading"])
+                    tokens += line_tokens[0]
+            lines.append(piece)
+            tokens += count
+
+    flush()
+    return chunks
+
+
+def is_table_row(line):
+    """
+    行が表の行かどうかを判定
+
+    Args:
+        line: 対象の行
+
+    Returns:
+        表の行の場合はTrue
+    """
+    return bool(_TABLE_ROW_PATTERN.search(line.strip()))
+
+
+def group_table_rows(lines, line_tokens):
+    """
+    連続する表の行を1つのまとまりにする
+
+    Args:
+        lines: 節の行の一覧
+        line_tokens: 各行のトークン数の一覧
+
+    Returns:
+        (行の一覧, トークン数の一覧) のタプルの一覧（表以外の行は1行ずつのまとまりになる）
+    """
+    blocks = []
+    for line, count in zip(lines, line_tokens):
+        if blocks and is_table_row(line) and is_table_row(blocks[-1][0][-1]):
+            blocks[-1][0].append(line)
+            blocks[-1][1].append(count)
+        else:
+            blocks.append(([line], [count]))
+    return blocks
+
+
+def split_table(rows, row_tokens, chunk_tokens, length_function):
+    """
+    表を、トークン数の上限を超えない範囲で行の区切りで分割
+    上限に収まる場合は表全体を1つにまとめ、分割する場合は続きの部分の先頭に表の見出し行を付ける
+
+    Args:
+        rows: 表の行の一覧
+        row_tokens: 各行のトークン数の一覧
+        chunk_tokens: 1チャンクあたりのトークン数の上限
+        length_function: 文字列のトークン数を返す関数
+
+    Returns:
+        (分割した表の文字列, トークン数) のタプルの一覧
+    """
+    if sum(row_tokens) <= chunk_tokens:
+        return [(ct.SEPARATOR.join(rows), sum(row_tokens))]
+
+    # 見出し行（区切りの行がある場合は区切りの行まで）
+    header_length = 2 if len(rows) > 2 and _TABLE_DIVIDER_PATTERN.match(rows[1].strip()) else 1
+    header_tokens = sum(row_tokens[:header_length])
+    if header_tokens * 2 > chunk_tokens:
+        # 見出し行を付けると本文がほとんど入らない場合は、見出し行を付けずに行ごとに分割する
+        header_length, header_tokens = 0, 0
+
+    pieces = []
+    piece_rows, piece_tokens = list(rows[:header_length]), header_tokens
+    for row, count in zip(rows[header_length:], row_tokens[header_length:]):
+        if len(piece_rows) > header_length and piece_tokens + count > chunk_tokens:
+            pieces.append((ct.SEPARATOR.join(piece_rows), piece_tokens))
+            piece_rows, piece_tokens = list(rows[:header_length]), header_tokens
+        if header_tokens + count > chunk_tokens:
+            # 1行だけで上限を超える行は、さらに分割する
+            pieces.extend(
+                (piece, length_function(piece) + 1)
+                for piece in split_long_line(row, count, chunk_tokens)
+            )
+            continue
+        piece_rows.append(row)
+        piece_tokens += count
+    if len(piece_rows) > header_length:
+        pieces.append((ct.SEPARATOR.join(piece_rows), piece_tokens))
+    return pieces
+
+
+def split_long_line(line, line_tokens, chunk_tokens):
+    """
+    1行だけでトークン数の上限を超える行を、文字数で按分して分割
+
+    Args:
+        line: 対象の行
+        line_tokens: 行のトークン数
+        chunk_tokens: 1チャンクあたりのトークン数の上限
+
+    Returns:
+        分割後の文字列の一覧（上限を超えない場合は行そのもののみ）
+    """
+    if line_tokens <= chunk_tokens:
+        return [line]
+    piece_length = max(1, len(line) * chunk_tokens // line_tokens)
+    return [line[i:i + piece_length] for i in range(0, len(line), piece_length)]
+
+
+def find_meeting_dates(docs):
+    """
+    議事録の基本情報から、データソースごとの日時を抽出
+
+    Args:
+        docs: ドキュメントの一覧
+
+    Returns:
+        データソースをキー、最初に見つかった日時の文字列を値とする辞書
+    """
+    meeting_dates = {}
+    for doc in docs:
+        source = doc.metadata.get("source")
+        if source in meeting_dates:
+            continue
+        for line in doc.page_content.split(ct.SEPARATOR):
+            match = _MEETING_DATE_PATTERN.match(line.strip())
+            if match:
+                meeting_dates[source] = match.group(1).strip()
+                break
+    return meeting_dates
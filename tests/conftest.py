@@ -0,0 +1,28 @@
+"""
+このファイルは、テスト全体で共通の設定が記述されたファイルです。
+アプリのモジュールはリポジトリ直下に置かれているため、テストからそのまま読み込めるようにします。
+"""
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import constants as ct
+
+
+@pytest.fixture
+def index_dirs(tmp_path, monkeypatch):
+    """
+    データソース・インデックスの保存先をテストごとの一時フォルダに切り替える
+    """
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    monkeypatch.setattr(ct, "RAG_TOP_FOLDER_PATH", str(data_dir))
+    monkeypatch.setattr(ct, "VECTOR_STORE_DIR_PATH", str(tmp_path / "index" / "chroma"))
+    monkeypatch.setattr(ct, "INDEX_MANIFEST_PATH", str(tmp_path / "index" / "manifest.json"))
+    monkeypatch.setattr(ct, "INDEX_LOCK_PATH", str(tmp_path / "index" / "index.lock"))
+    monkeypatch.setattr(ct, "NUMPY_INDEX_DIR_PATH", str(tmp_path / "index" / "numpy"))
+    monkeypatch.setattr(ct, "WEB_URL_LOAD_TARGETS", [])
+    return data_dir
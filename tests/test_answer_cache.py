@@ -0,0 +1,99 @@
+"""
+このファイルは、回答のキャッシュ（answer_cache.py）のテストが記述されたファイルです。
+"""
+
+import pytest
+import constants as ct
+from answer_cache import SemanticAnswerCache
+
+# 検索クエリの埋め込みベクトルの代わり（言い換えた質問は近いベクトル、別の質問は直交するベクトル）
+_VECTORS = {
+    "経費精算の締め日は？": [1.0, 0.0, 0.0],
+    "経費精算の締め日はいつ？": [0.99, 0.1, 0.0],
+    "出張の申請方法は？": [0.0, 1.0, 0.0],
+    "株主優待の内容は？": [0.0, 0.0, 1.0],
+}
+
+
+class FakeClock:
+    """
+    テストから進められる時計
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def cache(clock):
+    return SemanticAnswerCache(max_entries=2, ttl_seconds=60, similarity_threshold=0.95, clock=clock)
+
+
+def store(cache, query, version=1, mode=ct.ANSWER_MODE_2):
+    cache.store(_VECTORS[query], mode, version, f"{query}の回答", [], elapsed_seconds=2.0)
+
+
+def lookup(cache, query, version=1, mode=ct.ANSWER_MODE_2):
+    cached = cache.lookup(_VECTORS[query], mode, version)
+    return cached["answer"] if cached else None
+
+
+def test_lookup_returns_similar_question(cache):
+    store(cache, "経費精算の締め日は？")
+
+    assert lookup(cache, "経費精算の締め日はいつ？") == "経費精算の締め日は？の回答"
+    assert lookup(cache, "出張の申請方法は？") is None
+    # 回答モードが異なる場合は使わない
+    assert lookup(cache, "経費精算の締め日は？", mode=ct.ANSWER_MODE_1) is None
+
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["saved_seconds"]) == (1, 2, 2.0)
+
+
+def test_entries_expire_after_ttl(cache, clock):
+    store(cache, "経費精算の締め日は？")
+    clock.now += 30
+    store(cache, "出張の申請方法は？")
+
+    clock.now += 31
+    assert lookup(cache, "経費精算の締め日は？") is None
+    assert lookup(cache, "出張の申請方法は？") == "出張の申請方法は？の回答"
+
+    clock.now += 30
+    assert lookup(cache, "出張の申請方法は？") is None
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted(cache):
+    store(cache, "経費精算の締め日は？")
+    store(cache, "出張の申請方法は？")
+    # 参照した回答は、削除の順番が後ろに回る
+    assert lookup(cache, "経費精算の締め日は？") is not None
+
+    store(cache, "株主優待の内容は？")
+
+    assert cache.get_stats()["entries"] == 2
+    assert lookup(cache, "出張の申請方法は？") is None
+    assert lookup(cache, "経費精算の締め日は？") is not None
+    assert lookup(cache, "株主優待の内容は？") is not None
+
+
+def test_index_version_change_invalidates_entries(cache):
+    store(cache, "経費精算の締め日は？", version=1)
+
+    assert lookup(cache, "経費精算の締め日は？", version=2) is None
+    assert cache.get_stats()["entries"] == 0
+
+    # 古いインデックスで作成した回答は、新しいバージョンに切り替わった後は保存しない
+    store(cache, "出張の申請方法は？", version=1)
+    assert cache.get_stats()["entries"] == 0
+    store(cache, "出張の申請方法は？", version=2)
+    assert lookup(cache, "出張の申請方法は？", version=2) == "出張の申請方法は？の回答"
@@ -0,0 +1,65 @@
+"""
+このファイルは、会話履歴の上限管理（chat_memory.py）のテストが記述されたファイルです。
+"""
+
+import pytest
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
+import constants as ct
+import tokenizer
+from chat_memory import build_prompt_history, get_compaction_size
+
+
+@pytest.fixture(autouse=True)
+def count_characters(monkeypatch):
+    """
+    トークン数をエンコーディングに依存せず文字数で数え、メッセージごとの付加分はなくす
+    """
+    monkeypatch.setattr(tokenizer, "count_tokens", lambda text, encoding_name: len(text))
+    monkeypatch.setattr(ct, "CHAT_MESSAGE_TOKEN_OVERHEAD", 0)
+    monkeypatch.setattr(ct, "CHAT_HISTORY_COMPACT_RATIO", 0.5)
+
+
+def make_history(turns, length=10):
+    history = []
+    for i in range(turns):
+        history.extend([HumanMessage(content=f"{i}" * length), AIMessage(content=f"{i}" * length)])
+    return history
+
+
+def test_no_compaction_within_limits():
+    assert get_compaction_size([], token_budget=100, max_turns=5) == 0
+    # トークン数・往復数ともに、上限ちょうどまでは要約しない
+    assert get_compaction_size(make_history(5), token_budget=100, max_turns=5) == 0
+
+
+def test_compaction_by_turns_reduces_to_ratio():
+    # 6往復で上限（5往復）を超えたため、上限の半分（2往復）まで減らす
+    assert get_compaction_size(make_history(6), token_budget=1000, max_turns=5) == 8
+
+
+def test_compaction_by_tokens_reduces_to_ratio():
+    # 120トークンで上限（100）を超えたため、上限の半分（50トークン）以下になるまで古い往復から要約する
+    history = make_history(6)
+
+    size = get_compaction_size(history, token_budget=100, max_turns=100)
+
+    assert size == 8
+    assert sum(len(message.content) for message in history[size:]) <= 50
+
+
+def test_compaction_keeps_latest_turn():
+    # 直近の1往復だけで上限を超えていても、その往復は要約しない
+    history = make_history(2, length=100)
+
+    assert get_compaction_size(history, token_budget=50, max_turns=10) == 2
+    assert get_compaction_size(history[2:], token_budget=50, max_turns=10) == 0
+
+
+def test_build_prompt_history_prepends_summary():
+    history = make_history(1)
+
+    assert build_prompt_history("", history) == history
+    prompt_history = build_prompt_history("経費精算について質問した。", history)
+    assert isinstance(prompt_history[0], SystemMessage)
+    assert prompt_history[0].content == f"{ct.CHAT_SUMMARY_PREFIX}経費精算について質問した。"
+    assert prompt_history[1:] == history
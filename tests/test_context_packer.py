@@ -0,0 +1,89 @@
+"""
+このファイルは、検索結果のチャンクをプロンプトに詰める処理（context_packer.py）のテストが記述されたファイルです。
+"""
+
+import pytest
+from langchain.schema import Document as LangchainDocument
+import tokenizer
+from context_packer import pack_context
+
+
+@pytest.fixture(autouse=True)
+def count_characters(monkeypatch):
+    """
+    トークン数をエンコーディングに依存せず文字数で数える（オフライン環境でも結果が変わらないように）
+    """
+    monkeypatch.setattr(tokenizer, "count_tokens", lambda text, encoding_name: len(text))
+
+
+def make_doc(text, source="a.pdf", chunk_index=0, page=None):
+    metadata = {"source": source, "chunk_index": chunk_index}
+    if page is not None:
+        metadata["page"] = page
+    return LangchainDocument(page_content=text, metadata=metadata)
+
+
+def test_pack_context_respects_token_budget():
+    docs = [
+        make_doc("あ" * 40, source="a.pdf"),
+        make_doc("い" * 40, source="b.pdf"),
+        make_doc("う" * 10, source="c.pdf"),
+    ]
+
+    packed = pack_context(docs, token_budget=55)
+
+    # 上限を超えるチャンクは飛ばし、後ろのより短いチャンクは詰める
+    assert [doc.page_content for doc in packed] == ["あ" * 40, "う" * 10]
+    assert sum(len(doc.page_content) for doc in packed) <= 55
+
+
+def test_pack_context_keeps_relevance_order():
+    docs = [
+        make_doc("経費精算の手順", source="c.pdf"),
+        make_doc("出張の申請方法", source="a.pdf"),
+        make_doc("株主優待の内容", source="b.pdf"),
+    ]
+
+    packed = pack_context(docs, token_budget=1000)
+
+    assert [doc.metadata["source"] for doc in packed] == ["c.pdf", "a.pdf", "b.pdf"]
+
+
+def test_pack_context_drops_near_duplicates():
+    text = "経費精算は月末までに申請し、上長の承認を受けてから経理部に提出する。"
+    docs = [
+        make_doc(text, source="a.pdf"),
+        make_doc(text.replace("。", "！"), source="b.pdf"),
+        make_doc("出張の申請方法と経費の上限", source="c.pdf"),
+    ]
+
+    packed = pack_context(docs, token_budget=1000)
+
+    assert [doc.metadata["source"] for doc in packed] == ["a.pdf", "c.pdf"]
+
+
+def test_pack_context_merges_adjacent_chunks():
+    docs = [
+        make_doc("## 経費精算\n後半の本文", chunk_index=1, page=2),
+        make_doc("## 経費精算\n前半の本文", chunk_index=0, page=2),
+        make_doc("別のページの本文", chunk_index=2, page=3),
+    ]
+
+    packed = pack_context(docs, token_budget=1000)
+
+    # 同じページで隣り合うチャンクは位置の順に結合し、続きのチャンクの見出しの行を除く
+    assert [doc.page_content for doc in packed] == ["## 経費精算\n前半の本文\n後半の本文", "別のページの本文"]
+    assert packed[0].metadata["chunk_index"] == 1
+
+
+def test_pack_context_skips_oversized_first_chunk():
+    docs = [
+        make_doc("あ" * 100, source="a.pdf"),
+        make_doc("い" * 20, source="b.pdf"),
+        make_doc("う" * 20, source="c.pdf"),
+    ]
+
+    packed = pack_context(docs, token_budget=50)
+
+    assert [doc.metadata["source"] for doc in packed] == ["b.pdf", "c.pdf"]
+    assert pack_context(docs[:1], token_budget=50) == []
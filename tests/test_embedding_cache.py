@@ -0,0 +1,106 @@
+"""
+このファイルは、埋め込みベクトルのキャッシュ（embedding_cache.py）のテストが記述されたファイルです。
+"""
+
+import pytest
+from langchain_core.embeddings import Embeddings
+from embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+    """
+    埋め込みを行った文字列を記録する埋め込みモデル
+    """
+
+    def __init__(self):
+        self.document_calls = []
+        self.query_calls = []
+
+    def embed_documents(self, texts):
+        self.document_calls.append(list(texts))
+        return [self.embed(text) for text in texts]
+
+    def embed_query(self, text):
+        self.query_calls.append(text)
+        return self.embed(text)
+
+    def embed(self, text):
+        return [float(len(text)), float(sum(map(ord, text)) % 97), 1.0]
+
+
+@pytest.fixture
+def fake():
+    return CountingEmbeddings()
+
+
+@pytest.fixture
+def cached(fake, tmp_path):
+    return CachedEmbeddings(fake, "fake-model", cache_path=str(tmp_path / "cache" / "embeddings.sqlite3"), query_cache_size=2)
+
+
+def test_query_lookups_do_not_change_chunk_stats(cached, fake):
+    cached.embed_documents(["経費精算の手順", "出張の申請方法"])
+    cached.embed_documents(["経費精算の手順"])
+
+    cached.embed_query("経費精算の締め日は？")
+    cached.embed_query("経費精算の締め日は？")
+
+    stats = cached.get_stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 2, pytest.approx(1 / 3))
+    assert (stats["query_hits"], stats["query_misses"]) == (1, 1)
+
+    cached.reset_stats()
+    assert (cached.get_stats()["hits"], cached.get_stats()["misses"]) == (0, 0)
+
+
+def test_chunk_vectors_are_cached_in_sqlite(cached, fake, tmp_path):
+    texts = ["経費精算の手順", "出張の申請方法", "経費精算の手順"]
+
+    first = cached.embed_documents(texts)
+    # 同じ文字列は1回のみ埋め込む
+    assert fake.document_calls == [["経費精算の手順", "出張の申請方法"]]
+
+    second = cached.embed_documents(["出張の申請方法", "株主優待の内容"])
+    assert fake.document_calls[-1] == ["株主優待の内容"]
+    assert second[0] == first[1]
+    assert (cached.get_stats()["hits"], cached.get_stats()["misses"]) == (2, 3)
+
+    # 別のインスタンス（再起動後と同じ状態）でも、SQLiteに保存したベクトルを使う
+    reopened_fake = CountingEmbeddings()
+    reopened = CachedEmbeddings(reopened_fake, "fake-model", cache_path=str(tmp_path / "cache" / "embeddings.sqlite3"))
+    assert reopened.embed_documents(texts) == first
+    assert reopened_fake.document_calls == []
+
+
+def test_cache_key_includes_model_and_normalized_text(cached, fake, tmp_path):
+    cached.embed_documents(["経費精算の手順"])
+
+    # 改行コード・前後の空白が異なるだけの文字列は、同じキーになる
+    cached.embed_documents(["  経費精算の手順\r\n"])
+    assert len(fake.document_calls) == 1
+
+    # 埋め込みモデルが異なる場合は、キャッシュを使わない
+    other_fake = CountingEmbeddings()
+    other = CachedEmbeddings(other_fake, "other-model", cache_path=str(tmp_path / "cache" / "embeddings.sqlite3"))
+    other.embed_documents(["経費精算の手順"])
+    assert other_fake.document_calls == [["経費精算の手順"]]
+
+
+def test_query_vectors_are_kept_in_memory_lru(cached, fake, tmp_path):
+    cached.embed_query("経費精算")
+    cached.embed_query("出張")
+    # 参照した検索クエリは、削除の順番が後ろに回る
+    cached.embed_query("経費精算")
+    cached.embed_query("株主優待")
+    assert fake.query_calls == ["経費精算", "出張", "株主優待"]
+
+    # 上限（2件）を超えたため、最も長く使われていない検索クエリのみ削除されている
+    cached.embed_query("経費精算")
+    cached.embed_query("出張")
+    assert fake.query_calls == ["経費精算", "出張", "株主優待", "出張"]
+
+    # 検索クエリのベクトルはSQLiteには保存しない
+    reopened_fake = CountingEmbeddings()
+    reopened = CachedEmbeddings(reopened_fake, "fake-model", cache_path=str(tmp_path / "cache" / "embeddings.sqlite3"))
+    reopened.embed_query("経費精算")
+    assert reopened_fake.query_calls == ["経費精算"]
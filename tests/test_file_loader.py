@@ -0,0 +1,40 @@
+"""
+このファイルは、データソースのファイルの読み込み（file_loader.py）のテストが記述されたファイルです。
+"""
+
+import pandas as pd
+import constants as ct
+from file_loader import csv_rows_to_documents, load_file_safely
+
+_CSV = (
+    "社員ID,氏名,部署,保有資格\n"
+    "EMP0001,山田 太郎,営業部,\"簿記2級, 基本情報技術者\"\n"
+    "EMP0002,佐藤 花子,総務部,\n"
+    "EMP0003,鈴木 一郎,営業部,TOEIC 800\n"
+)
+
+
+def test_each_csv_row_becomes_one_document(tmp_path):
+    path = tmp_path / "社員名簿.csv"
+    path.write_text(_CSV, encoding="utf-8")
+
+    docs, error = load_file_safely(str(path))
+
+    assert error is None
+    assert len(docs) == 3
+    assert [doc.metadata["row_id"] for doc in docs] == ["EMP0001", "EMP0002", "EMP0003"]
+    assert all(doc.metadata["type"] == "csv" and doc.metadata["source"] == str(path) for doc in docs)
+    # 本文はファイル名と「列名: 値」の行（値が空の列は除く）で、カンマを含む値も1行に収まる
+    assert docs[0].page_content.split(ct.SEPARATOR) == [
+        "社員名簿.csv", "社員ID: EMP0001", "氏名: 山田 太郎", "部署: 営業部", "保有資格: 簿記2級, 基本情報技術者"
+    ]
+    assert "保有資格" not in docs[1].page_content
+
+
+def test_row_index_is_used_without_id_column():
+    df = pd.DataFrame({"項目": ["経費", "出張"], "上限": [1000, None]})
+
+    docs = csv_rows_to_documents(df, "data/上限.csv")
+
+    assert [doc.metadata["row_id"] for doc in docs] == ["0", "1"]
+    assert docs[1].page_content.split(ct.SEPARATOR) == ["上限.csv", "項目: 出張"]
@@ -0,0 +1,342 @@
+"""
+このファイルは、インデックスの構築・共有（indexer.py）のテストが記述されたファイルです。
+"""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+import httpx
+import numpy as np
+import openai
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain.schema import Document as LangchainDocument
+import constants as ct
+import indexer
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+@pytest.fixture
+def embedding(monkeypatch):
+    embedding = DeterministicFakeEmbedding(size=16)
+    monkeypatch.setattr(indexer, "create_embeddings", lambda: embedding)
+    return embedding
+
+
+@pytest.fixture
+def shared_state(index_dirs, monkeypatch):
+    """
+    共有インデックスの状態をテストごとに初期化する
+    """
+    monkeypatch.setattr(indexer, "_shared_index", None)
+    monkeypatch.setattr(indexer, "_build_thread", None)
+    monkeypatch.setattr(indexer, "_build_state", {"ready": threading.Event(), "error": None})
+    monkeypatch.setattr(indexer, "_manifest_mtime", None)
+
+
+def test_get_shared_index_times_out_on_hung_build(shared_state, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(indexer, "build_index", lambda publish: release.wait())
+    monkeypatch.setattr(ct, "INDEX_BUILD_WAIT_TIMEOUT_SECONDS", 0.1)
+
+    try:
+        with pytest.raises(RuntimeError, match=ct.INDEX_BUILD_ERROR_MESSAGE):
+            indexer.get_shared_index()
+    finally:
+        release.set()
+        indexer._build_thread.join()
+
+
+def test_get_shared_index_keeps_build_error_after_restart(shared_state, monkeypatch):
+    def fail(publish):
+        raise ValueError("embedding API error")
+
+    monkeypatch.setattr(indexer, "build_index", fail)
+
+    with pytest.raises(RuntimeError) as exc_info:
+        indexer.get_shared_index()
+    failed_state = indexer._build_state
+
+    # 失敗した作成処理の例外は、再作成を開始しても戻されない
+    release = threading.Event()
+    monkeypatch.setattr(indexer, "build_index", lambda publish: release.wait())
+    assert indexer.start_index_build()
+    release.set()
+    indexer._build_thread.join()
+
+    assert isinstance(exc_info.value.__cause__, ValueError)
+    assert isinstance(failed_state["error"], ValueError)
+    assert indexer._build_state is not failed_state
+    assert indexer._build_state["error"] is None
+
+
+def test_save_manifest_from_concurrent_writers(index_dirs):
+    manifests = [{**indexer.load_manifest(), "version": version} for version in range(1, 21)]
+    threads = [threading.Thread(target=indexer.save_manifest, args=(manifest,)) for manifest in manifests]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with open(ct.INDEX_MANIFEST_PATH, encoding="utf-8") as f:
+        assert json.load(f)["version"] in range(1, 21)
+    assert sorted(p.name for p in (index_dirs.parent / "index").iterdir()) == ["manifest.json"]
+
+
+@pytest.mark.skipif(fcntl is None, reason="fcntl is not available")
+def test_write_lock_excludes_other_processes(shared_state):
+    with indexer.hold_write_lock():
+        # ロックファイルを別に開いた場合（別のプロセスと同じ状態）は、ロックを取得できない
+        with open(ct.INDEX_LOCK_PATH, "a+b") as f:
+            with pytest.raises(BlockingIOError):
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    with open(ct.INDEX_LOCK_PATH, "a+b") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def test_version_published_by_other_process_is_reloaded(shared_state, index_dirs, embedding):
+    (index_dirs / "a.txt").write_text("会社概要の資料", encoding="utf-8")
+    indexer._publish_index(indexer.build_index(embeddings=embedding))
+    assert indexer.get_shared_index()["version"] == 1
+
+    # 別のプロセスが新しいバージョンを作成・保存した状態にする（このプロセスの共有中のインデックスは差し替えない）
+    (index_dirs / "b.txt").write_text("株主優待の資料", encoding="utf-8")
+    indexer.build_index(embeddings=embedding)
+
+    index = indexer.get_shared_index()
+
+    assert index["version"] == 2
+    assert isinstance(index["retriever"].vectorstore.vectors, np.memmap)
+    assert [doc.page_content for doc in index["retriever"].invoke("株主優待")][0] == "株主優待の資料"
+
+
+def test_update_sources_publishes_saved_files(shared_state, index_dirs, embedding):
+    (index_dirs / "a.txt").write_text("会社概要の資料", encoding="utf-8")
+    indexer._publish_index(indexer.build_index(embeddings=embedding))
+
+    path = index_dirs / "b.txt"
+    path.write_text("株主優待の資料", encoding="utf-8")
+    indexer.update_sources([str(path)])
+
+    index = indexer.get_shared_index()
+    assert index["version"] == 2
+    assert isinstance(index["retriever"].vectorstore.vectors, np.memmap)
+    assert {doc.page_content for doc in index["retriever"].invoke("株主優待")} == {"会社概要の資料", "株主優待の資料"}
+
+
+def test_load_files_in_parallel_matches_serial(index_dirs, monkeypatch):
+    for i in range(3):
+        (index_dirs / f"{i}.txt").write_text(f"資料{i}の本文", encoding="utf-8")
+    (index_dirs / "社員名簿.csv").write_text("社員ID,氏名\nEMP0001,山田\nEMP0002,佐藤\n", encoding="utf-8")
+    paths = indexer.collect_source_files(str(index_dirs)) + [str(index_dirs / "missing.pdf")]
+
+    serial = [(path, [doc.page_content for doc in docs], error) for path, docs, error in indexer.load_files(paths)]
+    monkeypatch.setattr(ct, "LOAD_PARALLEL_MIN_BYTES", 0)
+    monkeypatch.setattr(ct, "LOAD_MAX_WORKERS", 2)
+    parallel = [(path, [doc.page_content for doc in docs], error) for path, docs, error in indexer.load_files(paths)]
+
+    assert parallel == serial
+    assert [path for path, _, _ in serial] == paths
+    assert serial[-1][2] is not None
+
+
+def get_csv_chunk_ids(path):
+    docs, _ = indexer.load_file_safely(str(path))
+    return [indexer.get_chunk_id(str(path), i, doc) for i, doc in enumerate(docs)]
+
+
+def test_csv_chunk_ids_are_stable_and_follow_row_changes(tmp_path):
+    path = tmp_path / "社員名簿.csv"
+    path.write_text("社員ID,氏名,部署\nEMP0001,山田,営業部\nEMP0002,佐藤,総務部\nEMP0003,鈴木,営業部\n", encoding="utf-8")
+
+    ids = get_csv_chunk_ids(path)
+    # 別のプロセス（文字列のハッシュ値の乱数が異なる）で作成しても、同じIDになる
+    script = (
+        "import sys, indexer\n"
+        "docs, _ = indexer.load_file_safely(sys.argv[1])\n"
+        "print('\\n'.join(indexer.get_chunk_id(sys.argv[1], i, doc) for i, doc in enumerate(docs)))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script, str(path)],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env={**os.environ, "PYTHONHASHSEED": "123"},
+        capture_output=True, text=True, check=True
+    )
+
+    assert result.stdout.split() == ids
+    assert len(set(ids)) == 3
+    assert all(chunk_id.split("-")[-2] == row_id for chunk_id, row_id in zip(ids, ["EMP0001", "EMP0002", "EMP0003"]))
+
+    # 内容が変わった行のみ、IDが変わる
+    path.write_text("社員ID,氏名,部署\nEMP0001,山田,営業部\nEMP0002,佐藤,人事部\nEMP0003,鈴木,営業部\n", encoding="utf-8")
+    changed_ids = get_csv_chunk_ids(path)
+
+    assert changed_ids[0] == ids[0]
+    assert changed_ids[1] != ids[1]
+    assert changed_ids[2] == ids[2]
+
+
+def test_chunk_ids_of_other_files_follow_position():
+    doc = LangchainDocument(page_content="本文", metadata={"source": "a.pdf"})
+
+    assert indexer.get_chunk_id("a.pdf", 0, doc) == indexer.get_chunk_id("a.pdf", 0, LangchainDocument(page_content="変更後"))
+    assert indexer.get_chunk_id("a.pdf", 0, doc) != indexer.get_chunk_id("a.pdf", 1, doc)
+    assert indexer.get_chunk_id("a.pdf", 0, doc) != indexer.get_chunk_id("b.pdf", 0, doc)
+
+
+class RateLimitedEmbeddings(DeterministicFakeEmbedding):
+    """
+    最初の数回はレート制限（HTTP 429）のエラーを返す埋め込みモデル
+    """
+
+    failures: int = 0
+    retry_after: str | None = None
+    calls: int = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        if self.calls <= self.failures:
+            headers = {"retry-after": self.retry_after} if self.retry_after else {}
+            response = httpx.Response(429, headers=headers, request=httpx.Request("POST", "https://api.openai.com/v1/embeddings"))
+            raise openai.RateLimitError("Rate limit reached", response=response, body=None)
+        return super().embed_documents(texts)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(indexer.time, "sleep", sleeps.append)
+    monkeypatch.setattr(indexer.random, "random", lambda: 0.5)
+    return sleeps
+
+
+def test_iter_embedding_batches_bounds_count_and_tokens(monkeypatch):
+    monkeypatch.setattr(indexer, "count_tokens", lambda text, encoding_name: len(text))
+    monkeypatch.setattr(ct, "BATCH_SIZE", 3)
+    monkeypatch.setattr(ct, "EMBEDDING_BATCH_MAX_TOKENS", 10)
+    lengths = [2, 2, 2, 2, 6, 5, 20, 1]
+    chunks = [(LangchainDocument(page_content="あ" * length), f"id-{i}") for i, length in enumerate(lengths)]
+
+    batches = list(indexer.iter_embedding_batches(chunks))
+
+    assert [[len(doc.page_content) for doc in docs] for docs, _ in batches] == [[2, 2, 2], [2, 6], [5], [20], [1]]
+    assert [doc_id for _, ids in batches for doc_id in ids] == [f"id-{i}" for i in range(len(lengths))]
+
+
+def test_embed_with_retry_waits_for_retry_after(sleeps):
+    embeddings = RateLimitedEmbeddings(size=4, failures=2, retry_after="3")
+
+    vectors = indexer.embed_with_retry(embeddings, ["経費精算"])
+
+    assert len(vectors) == 1
+    assert embeddings.calls == 3
+    assert sleeps == [3.0, 3.0]
+
+
+def test_embed_with_retry_backs_off_exponentially(sleeps, monkeypatch):
+    monkeypatch.setattr(ct, "EMBEDDING_MAX_RETRIES", 4)
+    monkeypatch.setattr(ct, "EMBEDDING_RETRY_BASE_SECONDS", 1.0)
+    monkeypatch.setattr(ct, "EMBEDDING_RETRY_MAX_SECONDS", 5.0)
+    embeddings = RateLimitedEmbeddings(size=4, failures=4)
+
+    indexer.embed_with_retry(embeddings, ["経費精算"])
+
+    # 1秒・2秒・4秒・上限の5秒に、ゆらぎ（0.5〜1.5倍）を掛けた時間だけ待機する
+    assert sleeps == pytest.approx([1.0, 2.0, 4.0, 5.0])
+
+
+def test_embed_with_retry_gives_up_after_max_retries(sleeps, monkeypatch):
+    monkeypatch.setattr(ct, "EMBEDDING_MAX_RETRIES", 2)
+    embeddings = RateLimitedEmbeddings(size=4, failures=10)
+
+    with pytest.raises(openai.RateLimitError):
+        indexer.embed_with_retry(embeddings, ["経費精算"])
+    assert embeddings.calls == 3
+    assert len(sleeps) == 2
+
+
+class RecordingEmbeddings(DeterministicFakeEmbedding):
+    """
+    埋め込みを行ったチャンクの文字列を記録する埋め込みモデル
+    """
+
+    embedded: list = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+
+def test_build_index_reembeds_only_changed_files(shared_state, index_dirs):
+    files = {
+        "modified.txt": "経費精算の手順",
+        "removed.txt": "株主優待の内容",
+        "same_mtime.txt": "出張の申請方法",
+        "touched.txt": "会社概要",
+        "unchanged.txt": "研修制度の案内",
+    }
+    for name, text in files.items():
+        (index_dirs / name).write_text(text, encoding="utf-8")
+    embeddings = RecordingEmbeddings(size=16)
+    indexer.build_index(embeddings=embeddings)
+    old_manifest = indexer.load_manifest()
+    assert sorted(embeddings.embedded) == sorted(files.values())
+
+    (index_dirs / "modified.txt").write_text("経費精算の手順（改訂版）", encoding="utf-8")
+    (index_dirs / "removed.txt").unlink()
+    (index_dirs / "added.txt").write_text("福利厚生の案内", encoding="utf-8")
+    # 更新日時が前回と同じでも、サイズが異なる場合は変更ありとする
+    same_mtime = index_dirs / "same_mtime.txt"
+    stat = same_mtime.stat()
+    same_mtime.write_text("出張の申請方法と経費の上限", encoding="utf-8")
+    os.utime(same_mtime, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    # 更新日時のみ変わり、内容が同じ場合は変更なしとする
+    touched = index_dirs / "touched.txt"
+    os.utime(touched, ns=(touched.stat().st_atime_ns, touched.stat().st_mtime_ns + 10 ** 9))
+    embeddings.embedded.clear()
+
+    index = indexer.build_index(embeddings=embeddings)
+    manifest = indexer.load_manifest()
+
+    assert sorted(embeddings.embedded) == sorted(["経費精算の手順（改訂版）", "福利厚生の案内", "出張の申請方法と経費の上限"])
+    assert manifest["version"] == old_manifest["version"] + 1
+    sources = {os.path.basename(key): entry for key, entry in manifest["sources"].items()}
+    old_sources = {os.path.basename(key): entry for key, entry in old_manifest["sources"].items()}
+    assert sorted(sources) == ["added.txt", "modified.txt", "same_mtime.txt", "touched.txt", "unchanged.txt"]
+    assert sources["same_mtime.txt"]["mtime"] == old_sources["same_mtime.txt"]["mtime"]
+    assert sources["same_mtime.txt"]["sha256"] != old_sources["same_mtime.txt"]["sha256"]
+    assert sources["touched.txt"]["mtime"] != old_sources["touched.txt"]["mtime"]
+    assert sources["touched.txt"]["sha256"] == old_sources["touched.txt"]["sha256"]
+    assert sources["unchanged.txt"] == old_sources["unchanged.txt"]
+
+    # 削除したファイルのチャンクは、新しいバージョンのベクターストアに残らない
+    contents = set(index["retriever"].vectorstore.documents)
+    assert "株主優待の内容" not in contents
+    assert contents == {"経費精算の手順（改訂版）", "福利厚生の案内", "出張の申請方法と経費の上限", "会社概要", "研修制度の案内"}
+
+
+@pytest.mark.parametrize("relative_path, expected", [
+    ("MTG議事録/顧客/既存/グローバルフュージョン株式会社/議事録.docx", {
+        "category": "MTG議事録", "customer_status": "既存", "customer": "グローバルフュージョン株式会社"
+    }),
+    ("MTG議事録/顧客/見込み/a.pdf", {"category": "MTG議事録", "customer_status": "見込み"}),
+    ("MTG議事録/営業/営業ミーティング議事録.docx", {"category": "MTG議事録", "department": "営業"}),
+    ("MTG議事録/議事録ルール.txt", {"category": "MTG議事録"}),
+    ("サービスについて/利用ガイド.docx", {"category": "サービスについて"}),
+    ("社員名簿.csv", {}),
+])
+def test_get_path_metadata_follows_folders(index_dirs, relative_path, expected):
+    assert indexer.get_path_metadata(os.path.join(str(index_dirs), *relative_path.split("/"))) == expected
+
+
+def test_get_path_metadata_of_web_and_outside_sources(index_dirs):
+    assert indexer.get_path_metadata("https://example.com/") == {"category": ct.WEB_SOURCE_CATEGORY}
+    assert indexer.get_path_metadata(str(index_dirs.parent / "other" / "a.txt")) == {}
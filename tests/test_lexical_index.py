@@ -0,0 +1,173 @@
+"""
+このファイルは、語句検索とハイブリッド検索（lexical_index.py）のテストが記述されたファイルです。
+"""
+
+import math
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+from langchain.schema import Document as LangchainDocument
+import constants as ct
+from lexical_index import HybridRetriever, LexicalIndex, get_ngrams, reciprocal_rank_fusion
+from numpy_vector_store import NumpyVectorStore, normalize_rows
+
+# 語句検索の順位を確認する小さなコーパス
+_TEXTS = [
+    "経費精算の手順。経費精算は月末までに申請する。経費精算の承認は上長が行う",
+    "経費精算の締め日について",
+    "出張の申請方法と経費の上限。出張前に申請書を提出し、出張後に報告書を提出する。宿泊費の上限は地域ごとに異なる",
+    "株主優待の内容と申込方法",
+    "グローバルフュージョン株式会社との定例会議の議事録",
+    "会社概要。本社の所在地と設立年",
+]
+
+
+class KeywordEmbeddings(Embeddings):
+    """
+    本文に含まれるキーワードごとに直交するベクトルを返す埋め込みモデル（ベクトル検索の関連度スコアを決めるため）
+    """
+
+    keywords = ["経費", "出張", "株主", "会社概要"]
+
+    def embed_documents(self, texts):
+        return [self.embed(text, 0) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed(text, 1)
+
+    def embed(self, text, other_dimension):
+        # キーワードを含まないチャンクと検索クエリは、互いに直交する別の次元のベクトルとする
+        vector = [1.0 if keyword in text else 0.0 for keyword in self.keywords] + [0.0, 0.0]
+        if not any(vector):
+            vector[len(self.keywords) + other_dimension] = 1.0
+        return vector
+
+
+def make_docs(texts):
+    return [
+        LangchainDocument(page_content=text, metadata={"source": f"{i}.txt", "chunk_index": 0, "category": "社内文書"})
+        for i, text in enumerate(texts)
+    ]
+
+
+def bm25_scores(texts, query):
+    """
+    転置インデックスを使わずに、全ドキュメントのBM25スコアを直接計算する
+    """
+    doc_grams = [get_ngrams(text) for text in texts]
+    average_length = np.mean([len(grams) for grams in doc_grams])
+    k1, b = ct.LEXICAL_BM25_K1, ct.LEXICAL_BM25_B
+    scores = [0.0] * len(texts)
+    for gram in set(get_ngrams(query)):
+        doc_count = sum(1 for grams in doc_grams if gram in grams)
+        if not doc_count:
+            continue
+        idf = math.log(1 + (len(texts) - doc_count + 0.5) / (doc_count + 0.5))
+        for i, grams in enumerate(doc_grams):
+            count = grams.count(gram)
+            length_norm = 1 - b + b * len(grams) / max(average_length, 1.0)
+            scores[i] += idf * count * (k1 + 1) / (count + k1 * length_norm)
+    return scores
+
+
+@pytest.fixture
+def retriever():
+    docs = make_docs(_TEXTS)
+    embedding = KeywordEmbeddings()
+    vectors = normalize_rows(np.asarray(embedding.embed_documents(_TEXTS), dtype=np.float32))
+    vectorstore = NumpyVectorStore(
+        [f"chunk-{i}" for i in range(len(docs))],
+        vectors,
+        None,
+        [doc.page_content for doc in docs],
+        [doc.metadata for doc in docs],
+        embedding
+    )
+    lexical_index = LexicalIndex.from_vectorstore(vectorstore)
+    return HybridRetriever(vectorstore=vectorstore, lexical_index=lexical_index, k=3, fetch_k=len(docs))
+
+
+@pytest.mark.parametrize("query", ["経費精算", "出張の申請", "グローバルフュージョン", "株主優待の申込"])
+def test_bm25_ranking_matches_direct_computation(query):
+    docs = make_docs(_TEXTS)
+    index = LexicalIndex.build(docs, _TEXTS, [doc.metadata for doc in docs])
+
+    results = index.search(query, k=len(docs))
+
+    expected = sorted(
+        ((text, score) for text, score in zip(_TEXTS, bm25_scores(_TEXTS, query)) if score > 0),
+        key=lambda item: -item[1]
+    )
+    assert [doc.page_content for doc, _ in results] == [text for text, _ in expected]
+    assert [score for _, score in results] == pytest.approx([score for _, score in expected], rel=1e-5)
+
+
+def test_bm25_ranks_frequent_and_short_matches_first():
+    docs = make_docs(_TEXTS)
+    index = LexicalIndex.build(docs, _TEXTS, [doc.metadata for doc in docs])
+
+    results = index.search("経費精算", k=10)
+
+    # 語句を多く含むチャンクが先、語句を含まないチャンクは返さない
+    assert [doc.page_content for doc, _ in results][:2] == [_TEXTS[0], _TEXTS[1]]
+    assert all("経費" in doc.page_content for doc, _ in results)
+    assert len(index.search("経費精算", k=1)) == 1
+    assert [doc.page_content for doc, _ in index.search("経費精算", k=10, candidates={1, 2})] == [_TEXTS[1], _TEXTS[2]]
+    assert index.search("存在しない語句", k=10) == []
+
+
+def test_reciprocal_rank_fusion_orders_and_deduplicates():
+    a, b, c, d = make_docs(["A", "B", "C", "D"])
+    # 同じチャンクは、別のオブジェクトでも1件にまとめ、最初に見つかったものを返す
+    c_copy = LangchainDocument(page_content="C", metadata=dict(c.metadata))
+
+    fused = reciprocal_rank_fusion([[a, b, c], [c_copy, d]], rrf_k=60)
+
+    # C: 1/63 + 1/61、A: 1/61、B・D: 1/62（同点の場合は先に見つかった順）
+    assert [doc.page_content for doc in fused] == ["C", "A", "B", "D"]
+    assert fused[0] is c
+    assert reciprocal_rank_fusion([[a, b], []]) == [a, b]
+    assert reciprocal_rank_fusion([]) == []
+
+
+def test_reciprocal_rank_fusion_uses_chunk_position_as_key():
+    first = LangchainDocument(page_content="本文", metadata={"source": "a.pdf", "chunk_index": 0})
+    second = LangchainDocument(page_content="本文", metadata={"source": "a.pdf", "chunk_index": 1})
+
+    assert reciprocal_rank_fusion([[first], [second]]) == [first, second]
+
+
+def test_hybrid_search_fuses_vector_and_lexical_results(retriever):
+    docs = retriever.invoke("出張の経費")
+
+    assert len(docs) == retriever.k
+    # ベクトル検索・語句検索の両方で上位のチャンクが先頭になる
+    assert docs[0].page_content == _TEXTS[2]
+    assert len({doc.page_content for doc in docs}) == len(docs)
+
+
+def test_search_with_threshold_cuts_off_unrelated_chunks(retriever):
+    # ベクトル検索の関連度スコアが下限未満で、完全一致する語句もない場合は何も返さない
+    assert retriever.search_with_threshold("天気予報", ct.DOC_SEARCH_RELEVANCE_THRESHOLD) == []
+
+    # 下限以上のチャンクのみを返す（「経費」を含まないチャンクは、語句が一部一致しても返さない）
+    docs = retriever.search_with_threshold("経費", ct.DOC_SEARCH_RELEVANCE_THRESHOLD)
+    assert {doc.page_content for doc in docs} == {_TEXTS[0], _TEXTS[1], _TEXTS[2]}
+
+    # 下限を1より大きくすると、ベクトル検索の結果はすべて除かれる
+    assert retriever.search_with_threshold("経費", 1.01) == []
+
+
+def test_search_with_threshold_keeps_exact_rare_terms(retriever):
+    # ベクトル検索では関連がないチャンクでも、検索クエリ中の固有名詞を完全に含む場合は返す
+    docs = retriever.search_with_threshold("グローバルフュージョン株式会社", ct.DOC_SEARCH_RELEVANCE_THRESHOLD)
+
+    assert [doc.page_content for doc in docs] == [_TEXTS[4]]
+
+
+def test_search_with_threshold_ignores_common_terms(retriever, monkeypatch):
+    # 多くのチャンクに含まれる語句は、完全に一致しても関連があるとはみなさない
+    monkeypatch.setattr(ct, "LEXICAL_EXACT_TERM_MAX_DOC_RATIO", 0.2)
+
+    assert retriever.search_with_threshold("申請", ct.DOC_SEARCH_RELEVANCE_THRESHOLD) == []
+    assert [doc.page_content for doc in retriever.search_with_threshold("宿泊費", ct.DOC_SEARCH_RELEVANCE_THRESHOLD)] == [_TEXTS[2]]
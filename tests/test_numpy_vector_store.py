@@ -0,0 +1,207 @@
+"""
+このファイルは、NumPyの配列によるベクターストア（numpy_vector_store.py）のテストが記述されたファイルです。
+"""
+
+import os
+import numpy as np
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+import constants as ct
+import indexer
+from lexical_index import LexicalIndex
+from numpy_vector_store import NumpyVectorStore
+
+_DIMENSION = 16
+
+
+@pytest.fixture
+def embedding():
+    return DeterministicFakeEmbedding(size=_DIMENSION)
+
+
+class QueryCountingEmbedding(DeterministicFakeEmbedding):
+    """
+    検索クエリの埋め込みの回数を数える埋め込みモデル
+    """
+
+    query_count: int = 0
+
+    def embed_query(self, text):
+        self.query_count += 1
+        return super().embed_query(text)
+
+
+def test_empty_collection(index_dirs, embedding):
+    db = indexer.open_vector_store(embedding, f"{ct.COLLECTION_NAME}_v1")
+
+    store = NumpyVectorStore.from_vectorstore(db, dimension=_DIMENSION)
+
+    assert len(store) == 0
+    assert store.vectors.shape == (0, _DIMENSION)
+    assert store.similarity_search_with_relevance_scores("会社概要", k=4) == []
+    assert store.similarity_search("会社概要", k=4, filter={"category": "会社について"}) == []
+    assert store.search_by_vectors([embedding.embed_query("会社概要")], k=4) == [[]]
+
+
+def test_empty_collection_without_dimension_does_not_embed(index_dirs):
+    embedding = QueryCountingEmbedding(size=_DIMENSION)
+    db = indexer.open_vector_store(embedding, f"{ct.COLLECTION_NAME}_v1")
+
+    store = NumpyVectorStore.from_vectorstore(db)
+
+    # 次元数を調べるために、埋め込みモデルのAPIを呼び出さない
+    assert embedding.query_count == 0
+    assert store.vectors.shape == (0, 0)
+    assert store.similarity_search("会社概要", k=4) == []
+
+
+def test_empty_store_round_trip(tmp_path, index_dirs, embedding):
+    db = indexer.open_vector_store(embedding, f"{ct.COLLECTION_NAME}_v1")
+    store = NumpyVectorStore.from_vectorstore(db, dimension=_DIMENSION)
+    lexical_index = LexicalIndex.from_vectorstore(store)
+
+    store.save(str(tmp_path))
+    lexical_index.save(str(tmp_path))
+    loaded = NumpyVectorStore.load(str(tmp_path), embedding)
+    loaded_lexical_index = LexicalIndex.load(str(tmp_path), loaded)
+
+    assert len(loaded) == 0
+    assert loaded.vectors.shape == (0, _DIMENSION)
+    assert loaded.similarity_search_with_relevance_scores("会社概要", k=4) == []
+    assert loaded_lexical_index.search("会社概要", k=4) == []
+
+
+def test_changes_applied_to_empty_store(index_dirs, embedding):
+    db = indexer.open_vector_store(embedding, f"{ct.COLLECTION_NAME}_v1")
+    store = NumpyVectorStore.from_vectorstore(db)
+    lexical_index = LexicalIndex.from_vectorstore(store)
+    records = {
+        "ids": ["a", "b"],
+        "embeddings": [embedding.embed_query("会社概要"), embedding.embed_query("株主優待")],
+        "documents": ["会社概要の資料", "株主優待の資料"],
+        "metadatas": [{"source": "a.txt"}, {"source": "b.txt"}],
+    }
+
+    kept_rows = store.get_kept_rows(set())
+    updated = store.apply_changes(kept_rows, records)
+    updated_lexical_index = lexical_index.apply_changes(kept_rows, updated, records["documents"])
+
+    # 次元数が不明な空のベクターストアは、追加したベクトルの次元数になる
+    assert updated.vectors.shape == (2, _DIMENSION)
+    [(doc, score)] = updated.similarity_search_with_relevance_scores("会社概要", k=1)
+    assert doc.page_content == "会社概要の資料"
+    assert score == pytest.approx(1.0, abs=1e-5)
+    assert [doc.page_content for doc, _ in updated_lexical_index.search("株主優待", k=4)] == ["株主優待の資料"]
+
+
+def make_records(embedding, texts, start):
+    """
+    本文の一覧から、Chromaの get() と同じ形式のチャンクの辞書を作成
+    """
+    departments = ["営業部", "人事部", "開発部"]
+    ids = [f"chunk-{start + i}" for i in range(len(texts))]
+    return {
+        "ids": ids,
+        "embeddings": embedding.embed_documents(texts),
+        "documents": texts,
+        "metadatas": [
+            {"source": f"{chunk_id}.txt", "category": "MTG議事録", "department": departments[(start + i) % 3]}
+            for i, chunk_id in enumerate(ids)
+        ],
+    }
+
+
+@pytest.mark.parametrize("dtype", ["float32", "int8"])
+def test_changes_applied_to_saved_store_match_rebuild(tmp_path, index_dirs, embedding, dtype):
+    texts = [
+        "営業部の定例会議の議事録。新規顧客の開拓について",
+        "人事部の採用計画と新入社員研修の日程",
+        "開発部のリリース計画。テスト自動化の進め方",
+        "営業部の売上報告と来期の目標",
+        "人事部の評価制度の見直しについて",
+        "開発部の障害対応の振り返りと再発防止策",
+        "営業部と開発部の合同会議。顧客要望の共有",
+        "人事部の福利厚生の案内と申請方法",
+    ]
+    db = indexer.open_vector_store(embedding, f"{ct.COLLECTION_NAME}_v1")
+    empty_store = NumpyVectorStore.from_vectorstore(db, dtype)
+    records = make_records(embedding, texts, 0)
+    kept_rows = empty_store.get_kept_rows(set())
+    store = empty_store.apply_changes(kept_rows, records)
+    lexical_index = LexicalIndex.from_vectorstore(empty_store).apply_changes(kept_rows, store, records["documents"])
+
+    # 保存してメモリマップで開き直したものに、削除と追加を反映する
+    saved_path = str(tmp_path / "v1")
+    os.makedirs(saved_path)
+    store.save(saved_path)
+    lexical_index.save(saved_path)
+    loaded = NumpyVectorStore.load(saved_path, embedding)
+    loaded_lexical_index = LexicalIndex.load(saved_path, loaded)
+    assert isinstance(loaded.vectors, np.memmap)
+
+    added_records = make_records(embedding, ["営業部の新規顧客リスト", "開発部のテスト自動化の成果報告", "経理部の決算資料"], 100)
+    added_records["metadatas"][2]["department"] = "経理部"
+    kept_rows = loaded.get_kept_rows({"chunk-0", "chunk-4", "chunk-7"})
+    updated = loaded.apply_changes(kept_rows, added_records)
+    updated_lexical_index = loaded_lexical_index.apply_changes(kept_rows, updated, added_records["documents"])
+
+    # 同じチャンクから作り直したものと比較する
+    final_texts = [texts[row] for row in kept_rows] + added_records["documents"]
+    final_records = make_records(embedding, final_texts, 0)
+    final_records["ids"] = list(updated.ids)
+    final_records["metadatas"] = list(updated.metadatas)
+    rebuilt = empty_store.apply_changes(empty_store.get_kept_rows(set()), final_records)
+    rebuilt_lexical_index = LexicalIndex.build(rebuilt, final_texts, final_records["metadatas"])
+
+    assert list(updated.documents) == final_texts
+    assert [metadata["department"] for metadata in updated.metadatas][-1] == "経理部"
+    for name in ["grams", "offsets", "posting_docs", "posting_counts", "doc_lengths"]:
+        assert np.array_equal(getattr(updated_lexical_index, name), getattr(rebuilt_lexical_index, name)), name
+    assert list(updated_lexical_index.normalized_texts) == list(rebuilt_lexical_index.normalized_texts)
+
+    for query in ["営業部の会議", "テスト自動化", "新入社員研修", "決算", "評価制度"]:
+        expected = [(doc.page_content, score) for doc, score in rebuilt_lexical_index.search(query, k=5)]
+        actual = [(doc.page_content, score) for doc, score in updated_lexical_index.search(query, k=5)]
+        assert [content for content, _ in actual] == [content for content, _ in expected]
+        assert [score for _, score in actual] == pytest.approx([score for _, score in expected])
+        query_vector = [embedding.embed_query(query)]
+        assert updated.search_by_vectors(query_vector, k=5) == rebuilt.search_by_vectors(query_vector, k=5)
+
+    for term in ["営業部", "テスト自動化", "研修"]:
+        assert updated_lexical_index.find_documents_containing(term) == rebuilt_lexical_index.find_documents_containing(term)
+    for search_filter in [{"department": "営業部"}, {"department": "人事部"}, {"department": "経理部"}, {"category": "MTG議事録"}]:
+        assert updated_lexical_index.filter_documents(search_filter) == rebuilt_lexical_index.filter_documents(search_filter)
+        assert (
+            [doc.page_content for doc in updated.similarity_search("会議", k=10, filter=search_filter)]
+            == [doc.page_content for doc in rebuilt.similarity_search("会議", k=10, filter=search_filter)]
+        )
+    assert updated_lexical_index.get_facets() == rebuilt_lexical_index.get_facets()
+    assert updated_lexical_index.get_facets()["department"] == ["人事部", "営業部", "経理部", "開発部"]
+
+
+def test_build_index_with_empty_data_folder(index_dirs, embedding):
+    published = []
+
+    index = indexer.build_index(publish=published.append, embeddings=embedding)
+
+    assert published and published[-1] is index
+    assert len(index["retriever"].vectorstore) == 0
+    assert index["retriever"].invoke("会社概要") == []
+    assert index["retriever"].search_with_threshold("会社概要", ct.DOC_SEARCH_RELEVANCE_THRESHOLD) == []
+    assert os.path.isdir(indexer.get_numpy_index_path(index["version"]))
+
+
+def test_build_index_reuses_saved_dimension_when_collection_empties(index_dirs):
+    embedding = QueryCountingEmbedding(size=_DIMENSION)
+    path = index_dirs / "a.txt"
+    path.write_text("会社概要の資料", encoding="utf-8")
+    indexer.build_index(embeddings=embedding)
+    assert indexer.load_manifest()["embedding_dimension"] == _DIMENSION
+
+    path.unlink()
+    index = indexer.build_index(embeddings=embedding)
+
+    # コレクションが空になっても、マニフェストに記録した次元数で空の配列を作成する
+    assert embedding.query_count == 0
+    assert index["retriever"].vectorstore.vectors.shape == (0, _DIMENSION)
+    assert indexer.load_manifest()["embedding_dimension"] == _DIMENSION
@@ -0,0 +1,76 @@
+"""
+このファイルは、社員名簿の構造化クエリ（roster.py）のテストが記述されたファイルです。
+"""
+
+import os
+import pandas as pd
+import pytest
+import constants as ct
+from roster import RosterTable
+
+_ROSTER_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "社員について", ct.ROSTER_FILE_NAME)
+
+
+@pytest.fixture(scope="module")
+def roster():
+    return RosterTable(pd.read_csv(_ROSTER_PATH))
+
+
+@pytest.mark.parametrize("question", [
+    "社員の育成方針に関するMTGの議事録",
+    "社員の福利厚生について教えて",
+    "新入社員研修の資料はどこ？",
+    "新入社員研修の資料一覧",
+    "社員旅行のルール",
+    "従業員の服装規定",
+    "社員について",
+    "人事部の研修制度の議事録",
+    "会議の参加人数",
+    "EcoTeeの代行出荷サービスについて",
+    "営業部の社員の評価制度について教えて",
+    "女性社員の育休制度について",
+    "正社員の就業規則",
+    "正社員の福利厚生について",
+    "人事部の社員研修の資料はどこ？",
+    "営業部の社員研修の資料一覧",
+    "営業部の会議の参加人数",
+    "部署ごとの研修資料",
+])
+def test_document_questions_are_not_routed_to_roster(roster, question):
+    assert roster.parse_question(question) is None
+
+
+@pytest.mark.parametrize("question", [
+    "人事部に所属している従業員情報を一覧化して",
+    "人事部の社員一覧",
+    "Pythonが得意な社員は誰？",
+    "2020年以降に入社した社員の一覧",
+    "正社員の人数",
+    "女性社員は何名？",
+    "部署ごとの社員数",
+    "社員名簿を見せて",
+    "社員は何名？",
+    "従業員の人数",
+    "全社員の一覧",
+    "営業部のマネージャーを年齢が高い順に",
+])
+def test_roster_questions_are_routed_to_roster(roster, question):
+    assert roster.parse_question(question) is not None
+
+
+def test_filters_match_pandas(roster):
+    query = roster.parse_question("人事部に所属している従業員情報を一覧化して")
+
+    result = roster.run(query)
+
+    assert query["filters"] == {"部署": ["人事部"]}
+    assert result["count"] == int((roster.source_df["部署"] == "人事部").sum())
+    assert (result["frame"]["部署"] == "人事部").all()
+
+
+def test_group_by_counts_match_pandas(roster):
+    query = roster.parse_question("部署ごとの社員数")
+
+    result = roster.run(query)
+
+    assert result["groups"] == roster.source_df["部署"].value_counts().to_dict()
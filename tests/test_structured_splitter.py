@@ -0,0 +1,122 @@
+"""
+このファイルは、見出しの構造に沿ったチャンク分割（structured_splitter.py）のテストが記述されたファイルです。
+"""
+
+import pytest
+from langchain.schema import Document as LangchainDocument
+import constants as ct
+from structured_splitter import split_structured_documents
+
+_MINUTES = "\n".join([
+    "開発ミーティング議事録",
+    "1. 基本情報",
+    "日時：2024年4月10日 10:00〜11:00",
+    "参加者：山田、佐藤",
+    "2. 議題",
+    "開発進捗の報告",
+    "3. 議論内容",
+    "3.1 開発進捗報告",
+    "新機能の実装は予定どおり進んでいる。",
+    "(1) 課題",
+    "テスト環境の不足が課題として挙がった。",
+    "3.2 リリース計画",
+    "リリースは5月を予定している。",
+])
+
+
+def count_characters(text):
+    return len(text)
+
+
+def split(text, chunk_tokens, source="議事録.docx"):
+    doc = LangchainDocument(page_content=text, metadata={"source": source})
+    return split_structured_documents([doc], chunk_tokens, count_characters)
+
+
+def test_chunks_carry_heading_path_and_meeting_date():
+    chunks = split(_MINUTES, chunk_tokens=40)
+
+    sections = [chunk.metadata.get("section") for chunk in chunks]
+    assert "1. 基本情報" in sections
+    assert "3. 議論内容 > 3.1 開発進捗報告 > (1) 課題" in sections
+    # 下位の見出しは、同じ階層の次の見出しで置き換わる
+    assert "3. 議論内容 > 3.2 リリース計画" in sections
+    assert all(chunk.metadata["meeting_date"] == "2024年4月10日 10:00〜11:00" for chunk in chunks)
+    assert all(chunk.metadata["source"] == "議事録.docx" for chunk in chunks)
+
+
+def test_sections_are_packed_until_token_limit():
+    # 上限に余裕がある場合は、全体が1チャンクになる
+    chunks = split(_MINUTES, chunk_tokens=1000)
+
+    assert len(chunks) == 1
+    assert chunks[0].page_content == _MINUTES
+    assert chunks[0].metadata["section"] == "1. 基本情報"
+
+
+def test_pages_are_split_separately():
+    pages = [
+        LangchainDocument(page_content="1. 基本情報\n日時：2024年4月10日", metadata={"source": "議事録.pdf", "page": 0}),
+        LangchainDocument(page_content="2. 議題\n開発進捗の報告", metadata={"source": "議事録.pdf", "page": 1}),
+    ]
+
+    chunks = split_structured_documents(pages, 1000, count_characters)
+
+    assert [chunk.metadata["page"] for chunk in chunks] == [0, 1]
+    # 日時は1ページ目にのみ書かれているが、全ページのチャンクに付ける
+    assert all(chunk.metadata["meeting_date"] == "2024年4月10日" for chunk in chunks)
+
+
+@pytest.mark.parametrize("chunk_tokens", [30, 50, 80])
+def test_long_section_respects_size_and_repeats_heading(chunk_tokens):
+    lines = [f"{i}回目の議論では、開発の進め方について意見が出た。" for i in range(20)]
+    text = "\n".join(["3.1 開発進捗報告"] + lines + ["あ" * 200])
+
+    chunks = split(text, chunk_tokens=chunk_tokens)
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        # 各行のトークン数に改行の分を加えた合計が上限を超えない
+        assert sum(len(line) + 1 for line in chunk.page_content.split(ct.SEPARATOR)) <= chunk_tokens
+        # 続きのチャンクにも、重なりとして節の見出しの行を付ける
+        assert chunk.page_content.startswith("3.1 開発進捗報告\n")
+        assert chunk.metadata["section"] == "3.1 開発進捗報告"
+    # 見出し以外の内容は、欠けも重複もない
+    body = "".join("".join(chunk.page_content.split(ct.SEPARATOR)[1:]) for chunk in chunks)
+    assert body == "".join(lines) + "あ" * 200
+
+
+def test_table_is_kept_intact():
+    table = [
+        "| 項目 | 担当 | 期限 |",
+        "| --- | --- | --- |",
+        "| (1) 設計 | 山田 | 4月 |",
+        "| (2) 実装 | 佐藤 | 5月 |",
+        "| (3) 試験 | 鈴木 | 6月 |",
+    ]
+    text = "\n".join(["3.1 開発進捗報告"] + ["開発の状況を報告した。"] * 6 + table + ["次回までに見直す。"] * 3)
+
+    chunks = split(text, chunk_tokens=120)
+
+    assert len(chunks) > 1
+    # 表は1つのチャンクにまとめて入り、「(1)」で始まるセルも見出しとはみなさない
+    assert sum("\n".join(table) in chunk.page_content for chunk in chunks) == 1
+    assert all(chunk.metadata["section"] == "3.1 開発進捗報告" for chunk in chunks)
+
+
+def test_large_table_is_split_by_rows_with_header():
+    header = ["社員ID\t氏名\t部署", "EMP0000\t氏名0\t営業部"]
+    rows = [f"EMP{i:04d}\t氏名{i}\t営業部" for i in range(1, 30)]
+    text = "\n".join(["2. 担当者一覧"] + header[:1] + [header[1]] + rows)
+
+    chunks = split(text, chunk_tokens=100)
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        chunk_lines = chunk.page_content.split(ct.SEPARATOR)
+        assert sum(len(line) + 1 for line in chunk_lines) <= 100
+        # 分割した表の各部分の先頭には、表の見出し行を付ける
+        assert chunk_lines[:2] == ["2. 担当者一覧", header[0]]
+    # 表の行は、欠けも重複もなく、いずれかのチャンクにそのまま入る
+    body_rows = [line for chunk in chunks for line in chunk.page_content.split(ct.SEPARATOR)[2:]]
+    assert body_rows == [header[1]] + rows
@@ -0,0 +1,133 @@
+"""
+このファイルは、画面表示以外の処理（utils.py）のテストが記述されたファイルです。
+"""
+
+import threading
+import pytest
+import streamlit as st
+from langchain.schema import AIMessage, HumanMessage
+import constants as ct
+import utils
+
+
+@pytest.fixture
+def session_state():
+    """
+    セッションの状態を、テストごとに初期化した状態にする
+    """
+    st.session_state.clear()
+    st.session_state.chat_history = []
+    st.session_state.chat_summary = ""
+    st.session_state.chat_compaction = None
+    yield st.session_state
+    st.session_state.clear()
+
+
+class BlockingSummaryChain:
+    """
+    テストから完了を指示するまで要約を返さないChain
+    """
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.inputs = []
+
+    def invoke(self, inputs):
+        self.inputs.append(inputs)
+        self.release.wait(5)
+        return f"要約{len(self.inputs)}"
+
+
+def test_chat_compaction_runs_in_background(session_state, monkeypatch):
+    chain = BlockingSummaryChain()
+    monkeypatch.setattr(utils, "get_rag_chains", lambda: {"history_summary_chain": chain})
+    monkeypatch.setattr(ct, "CHAT_HISTORY_MAX_TURNS", 2)
+    monkeypatch.setattr(ct, "CHAT_HISTORY_COMPACT_RATIO", 0.5)
+
+    for i in range(3):
+        utils.add_chat_history(f"質問{i}", f"回答{i}")
+
+    # 要約の完了を待たずに戻り、完了するまでは会話履歴をそのまま使う
+    compaction = session_state.chat_compaction
+    assert compaction is not None
+    assert len(utils.get_prompt_history()) == 6
+
+    chain.release.set()
+    compaction["future"].result()
+    prompt_history = utils.get_prompt_history()
+
+    assert session_state.chat_summary == "要約1"
+    assert [message.content for message in session_state.chat_history] == ["質問2", "回答2"]
+    assert prompt_history[0].content == f"{ct.CHAT_SUMMARY_PREFIX}要約1"
+    assert session_state.chat_compaction is None
+
+
+def test_chat_compaction_is_discarded_after_history_reset(session_state, monkeypatch):
+    chain = BlockingSummaryChain()
+    chain.release.set()
+    monkeypatch.setattr(utils, "get_rag_chains", lambda: {"history_summary_chain": chain})
+    monkeypatch.setattr(ct, "CHAT_HISTORY_MAX_TURNS", 1)
+
+    utils.add_chat_history("質問0", "回答0")
+    utils.add_chat_history("質問1", "回答1")
+    session_state.chat_compaction["future"].result()
+    session_state.chat_history = []
+
+    assert utils.get_prompt_history() == []
+    assert session_state.chat_summary == ""
+
+
+_HISTORY = [HumanMessage(content="経費精算の締め日は？"), AIMessage(content="毎月25日です。")]
+
+
+@pytest.mark.parametrize("chat_message", [
+    "それはいつから適用されますか？",
+    "その制度の対象者を詳しく教えてください",
+    "先ほどの回答をもう少し具体的に説明して",
+    "彼の所属部署と役職を教えてください",
+    "人事部は？",
+    "もっと詳しく",
+    "出張で立て替えた費用の場合は？",
+    "新入社員の場合はどうなりますか",
+    "海外出張の宿泊費についても",
+])
+def test_needs_history_rewrite_for_follow_ups(chat_message):
+    assert utils.needs_history_rewrite(chat_message, _HISTORY)
+
+
+@pytest.mark.parametrize("chat_message", [
+    "株主優待制度の内容を教えてください",
+    "人事部に所属している社員の一覧を見せて",
+    "部署ごとにそれぞれの社員数を教えてください",
+    "これから入社する社員向けの研修制度について",
+    "その他の福利厚生にはどのようなものがありますか",
+    "グローバルフュージョン株式会社との打ち合わせの議事録",
+])
+def test_needs_no_history_rewrite_for_self_contained_questions(chat_message):
+    assert not utils.needs_history_rewrite(chat_message, _HISTORY)
+
+
+def test_needs_no_history_rewrite_without_history():
+    assert not utils.needs_history_rewrite("それはいつから？", [])
+
+
+_FACETS = {
+    "category": ["MTG議事録", "サービスについて"],
+    "department": ["営業", "人事"],
+    "customer": ["グローバルフュージョン株式会社", "バーチャルビジョン合同会社"],
+}
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("グローバルフュージョン株式会社との打ち合わせ内容", {"customer": "グローバルフュージョン株式会社"}),
+    # 法人格を省略した顧客名も一致させる
+    ("バーチャルビジョンへの提案はどうなった？", {"customer": "バーチャルビジョン合同会社"}),
+    ("営業の議事録で決まった方針は？", {"department": "営業"}),
+    ("人事MTGの内容", {"department": "人事"}),
+    # 部署名のみ、または議事録を示す語句のみの場合は絞り込まない
+    ("営業の担当者を教えて", None),
+    ("議事録の書き方のルール", None),
+    ("株主優待の内容", None),
+])
+def test_detect_search_filter(query, expected):
+    assert utils.detect_search_filter(query, _FACETS) == expected
@@ -0,0 +1,181 @@
+"""
+このファイルは、Webページのキャッシュ（web_cache.py）のテストが記述されたファイルです。
+外部のWebサイトには接続せず、ローカルに起動した http.server を取得先として使います。
+"""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import constants as ct
+import web_cache
+
+
+class _Site:
+    """
+    テスト用のWebサイトの状態（ページの内容・ETag・応答の遅延など）と、受け取ったリクエストの記録
+    """
+
+    def __init__(self):
+        self.content = "<html><head><title>テスト</title></head><body>最初の内容</body></html>"
+        self.etag = '"v1"'
+        self.last_modified = "Mon, 01 Jan 2024 00:00:00 GMT"
+        self.delay_seconds = 0
+        self.status_code = 200
+        self.requests = []
+
+
+@pytest.fixture
+def site():
+    """
+    ローカルのHTTPサーバーを起動し、(サイトの状態, ページのURL) を返す
+    """
+    state = _Site()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            state.requests.append(dict(self.headers))
+            if state.delay_seconds:
+                time.sleep(state.delay_seconds)
+            if state.status_code != 200:
+                self.send_response(state.status_code)
+                self.end_headers()
+                return
+            if self.headers.get("If-None-Match") == state.etag or self.headers.get("If-Modified-Since") == state.last_modified:
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = state.content.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", state.etag)
+            self.send_header("Last-Modified", state.last_modified)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield state, f"http://127.0.0.1:{server.server_address[1]}/page"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """
+    キャッシュの保存先をテストごとの一時フォルダに切り替える
+    """
+    monkeypatch.setattr(ct, "WEB_CACHE_DIR_PATH", str(tmp_path / "web_cache"))
+    monkeypatch.setattr(ct, "WEB_FETCH_TIMEOUT_SECONDS", 0.5)
+
+
+def test_first_fetch_is_cached(site):
+    state, url = site
+
+    assert web_cache.fetch_web_page(url) is True
+
+    entry = web_cache.load_cache_entry(url)
+    assert entry["etag"] == state.etag
+    assert entry["last_modified"] == state.last_modified
+    assert "最初の内容" in entry["content"]
+    [doc] = web_cache.load_web_documents([url])[url]
+    assert doc.metadata == {"source": url, "title": "テスト"}
+    # キャッシュがあるため、読み込み時に再取得はしない
+    assert len(state.requests) == 1
+
+
+def test_not_modified_reuses_cache(site):
+    state, url = site
+    web_cache.fetch_web_page(url)
+    fetched_content = web_cache.load_cache_entry(url)["content"]
+
+    assert web_cache.refresh_web_cache([url]) == []
+
+    assert state.requests[-1]["If-None-Match"] == state.etag
+    assert state.requests[-1]["If-Modified-Since"] == state.last_modified
+    assert web_cache.load_cache_entry(url)["content"] == fetched_content
+
+
+def test_changed_content_refreshes_cache(site):
+    state, url = site
+    web_cache.fetch_web_page(url)
+
+    state.content = "<html><body>更新後の内容</body></html>"
+    state.etag = '"v2"'
+    state.last_modified = "Tue, 02 Jan 2024 00:00:00 GMT"
+
+    assert web_cache.refresh_web_cache([url]) == [url]
+    entry = web_cache.load_cache_entry(url)
+    assert "更新後の内容" in entry["content"]
+    assert entry["etag"] == '"v2"'
+
+
+def test_same_content_with_new_etag_is_not_a_change(site):
+    state, url = site
+    web_cache.fetch_web_page(url)
+
+    state.etag = '"v2"'
+    state.last_modified = "Tue, 02 Jan 2024 00:00:00 GMT"
+
+    assert web_cache.refresh_web_cache([url]) == []
+    assert web_cache.load_cache_entry(url)["etag"] == '"v2"'
+
+
+def test_timeout_falls_back_to_cache(site):
+    state, url = site
+    web_cache.fetch_web_page(url)
+    fetched_entry = web_cache.load_cache_entry(url)
+
+    state.content = "<html><body>届かない内容</body></html>"
+    state.etag = '"v2"'
+    state.delay_seconds = 2
+
+    assert web_cache.refresh_web_cache([url]) == []
+    assert web_cache.load_cache_entry(url) == fetched_entry
+    [doc] = web_cache.load_web_documents([url])[url]
+    assert "最初の内容" in doc.page_content
+
+
+def test_server_error_falls_back_to_cache(site):
+    state, url = site
+    web_cache.fetch_web_page(url)
+    fetched_entry = web_cache.load_cache_entry(url)
+
+    state.status_code = 500
+
+    assert web_cache.refresh_web_cache([url]) == []
+    assert web_cache.load_cache_entry(url) == fetched_entry
+
+
+def test_unreachable_page_without_cache_is_skipped(site):
+    state, url = site
+    state.status_code = 503
+
+    assert web_cache.load_web_documents([url]) == {}
+    assert web_cache.load_cache_entry(url) is None
+
+
+def test_refresh_loop_waits_one_interval_before_first_fetch(monkeypatch):
+    events = []
+
+    class _Stop(Exception):
+        pass
+
+    def fake_sleep(seconds):
+        events.append(("sleep", seconds))
+        if len(events) > 2:
+            raise _Stop
+
+    monkeypatch.setattr(web_cache.time, "sleep", fake_sleep)
+    monkeypatch.setattr(web_cache, "refresh_web_cache", lambda urls: events.append(("refresh", urls)) or [])
+
+    with pytest.raises(_Stop):
+        web_cache._refresh_loop(lambda urls: None)
+
+    assert events[0] == ("sleep", ct.WEB_REFRESH_INTERVAL_SECONDS)
+    assert events[1] == ("refresh", ct.WEB_URL_LOAD_TARGETS)
@@ -0,0 +1,53 @@
+"""
+このファイルは、トークン数の計算に関する処理が記述されたファイルです。
+回答生成時のコンテキスト・会話履歴の整形からも使うため、インデックス関連のライブラリはここで読み込まないこと。
+"""
+
+############################################################
+# ライブラリの読み込み
+############################################################
+import functools
+import logging
+import tiktoken
+import constants as ct
+
+
+############################################################
+# 関数定義
+############################################################
+
+@functools.lru_cache(maxsize=None)
+def get_token_encoding(encoding_name):
+    """
+    トークン数の計算に使うエンコーディングの取得
+
+    Args:
+        encoding_name: エンコーディング名
+
+    Returns:
+        エンコーディング（取得できなかった場合はNone）
+    """
+    try:
+        return tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        # 初回はエンコーディングの定義ファイルをダウンロードするため、オフライン環境では失敗することがある
+        logging.getLogger(ct.LOGGER_NAME).warning(f"{ct.TOKEN_ENCODING_ERROR_MESSAGE}\n{e}")
+        return None
+
+
+def count_tokens(text, encoding_name):
+    """
+    文字列のトークン数を計算
+
+    Args:
+        text: 対象の文字列
+        encoding_name: エンコーディング名
+
+    Returns:
+        トークン数
+    """
+    encoding = get_token_encoding(encoding_name)
+    if encoding is None:
+        # エンコーディングを取得できない場合、日本語では文字数がトークン数の上限の目安になるため文字数で代用する
+        return len(text)
+    return len(encoding.encode(text, disallowed_special=()))
@@ -6,14 +6,28 @@
 # ライブラリの読み込み
 ############################################################
 import os
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import httpx
 from dotenv import load_dotenv
 import streamlit as st
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.schema import HumanMessage
+from langchain.schema import AIMessage, HumanMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda
 from langchain_openai import ChatOpenAI
-from langchain.chains import create_history_aware_retriever, create_retrieval_chain
+from langchain.chains import create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
 import constants as ct
+import indexer
+from context_packer import pack_context
+from lexical_index import normalize_text
+from answer_cache import SemanticAnswerCache
+from chat_memory import build_prompt_history, get_compaction_size, summarize_history
 
 
 ############################################################
@@ -22,6 +36,24 @@ import constants as ct
 # 「.env」ファイルで定義した環境変数の読み込み
 load_dotenv()
 
+# プロセス全体で共有するLLMとChain（最初の回答生成時に1度だけ作成し、全セッションで使い回す）
+_rag_chains = None
+_rag_chains_lock = threading.Lock()
+
+# 会話履歴を踏まえて書き換えた質問のキャッシュ（(会話履歴のダイジェスト, 入力) をキーとするLRU）
+_rewrite_cache = OrderedDict()
+_rewrite_cache_lock = threading.Lock()
+
+# 過去の類似した質問の回答のキャッシュ（プロセス全体で共有し、インデックスのバージョンが変わった時点で破棄される）
+_answer_cache = SemanticAnswerCache(
+    ct.ANSWER_CACHE_MAX_ENTRIES,
+    ct.ANSWER_CACHE_TTL_SECONDS,
+    ct.ANSWER_CACHE_SIMILARITY_THRESHOLD
+)
+
+# 会話履歴の要約を行うスレッドプール（回答の表示後にバックグラウンドで要約し、次の回答の作成開始時に反映する）
+_summary_executor = ThreadPoolExecutor(max_workers=ct.CHAT_SUMMARY_MAX_WORKERS, thread_name_prefix="chat-summary")
+
 
 ############################################################
 # 関数定義
@@ -62,6 +94,8 @@ def build_error_message(message):
 def get_llm_response(chat_message):
     """
     LLMからの回答取得
+    「社内文書検索」モードの場合は、回答生成用のLLMは呼び出さず、検索結果の関連度スコアのみで回答を作成する
+    過去に類似した質問があった場合は、検索・回答生成を行わずに保存済みの回答を返す
 
     Args:
         chat_message: ユーザー入力値
@@ -69,21 +103,406 @@ def get_llm_response(chat_message):
     Returns:
         LLMからの回答
     """
-    # LLMのオブジェクトを用意
-    llm = ChatOpenAI(model_name=ct.MODEL, temperature=ct.TEMPERATURE)
+    if st.session_state.mode != ct.ANSWER_MODE_1:
+        # 「社内問い合わせ」モードは、逐次返される回答を最後まで受け取る（会話履歴への追加もその中で行われる）
+        # 戻り値の会話履歴は、今回の往復を追加する前のものとする
+        chat_history = get_prompt_history()
+        context, answer_stream = stream_llm_response(chat_message)
+        return {
+            "input": chat_message,
+            "chat_history": chat_history,
+            "context": context,
+            "answer": "".join(answer_stream),
+        }
 
-    # 会話履歴なしでもLLMに理解してもらえる、独立した入力テキストを取得するためのプロンプトテンプレートを作成
-    question_generator_template = ct.SYSTEM_PROMPT_CREATE_INDEPENDENT_TEXT
-    question_generator_prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", question_generator_template),
-            MessagesPlaceholder("chat_history"),
-            ("human", "{input}")
-        ]
+    # プロセス全体で共有するChainを取得（初回のみ作成される）
+    rag_chains = get_rag_chains()
+    chat_history = get_prompt_history()
+    index = indexer.get_shared_index()
+
+    # 会話履歴なしでも理解できる入力テキストで、過去の類似した質問の回答を検索
+    query = get_standalone_question(chat_message, chat_history, rag_chains["question_generator_chain"])
+    search_filter, retriever = get_scoped_retriever(index, query)
+    cached, query_vector = lookup_answer_cache(index, query, ct.ANSWER_MODE_1, search_filter)
+    if cached is not None:
+        llm_response = {
+            "input": chat_message,
+            "chat_history": chat_history,
+            "context": cached["context"],
+            "answer": cached["answer"],
+        }
+    else:
+        start_time = time.perf_counter()
+        # 関連度スコアによるファイルのありかの検索
+        llm_response = search_documents(chat_message, chat_history, query, retriever)
+        _answer_cache.store(
+            query_vector, ct.ANSWER_MODE_1, index["version"],
+            llm_response["answer"], llm_response["context"], time.perf_counter() - start_time, search_filter
+        )
+
+    # LLMレスポンスを会話履歴に追加
+    add_chat_history(chat_message, llm_response["answer"])
+
+    return llm_response
+
+
+def stream_llm_response(chat_message):
+    """
+    「社内問い合わせ」モードの回答を、検索と回答生成に分けて取得
+    検索結果はすぐに返し、回答はトークン単位で逐次返すジェネレーターとして返す
+    （回答を最後まで受け取った時点で、会話履歴に追加される）
+    過去に類似した質問があった場合は、検索・回答生成を行わずに保存済みの回答を一度に返す
+
+    Args:
+        chat_message: ユーザー入力値
+
+    Returns:
+        (検索結果のドキュメントの一覧, 回答のトークンを逐次返すジェネレーター) のタプル
+    """
+    rag_chains = get_rag_chains()
+    chat_history = get_prompt_history()
+    # 回答の作成中にインデックスが差し替わっても、検索とキャッシュのバージョンが一致するよう同じインデックスを使う
+    index = indexer.get_shared_index()
+
+    # 会話履歴なしでも理解できる入力テキストで検索
+    query = get_standalone_question(chat_message, chat_history, rag_chains["question_generator_chain"])
+    search_filter, retriever = get_scoped_retriever(index, query)
+
+    cached, query_vector = lookup_answer_cache(index, query, ct.ANSWER_MODE_2, search_filter)
+    if cached is not None:
+        def cached_answer_stream():
+            yield cached["answer"]
+            # LLMレスポンスを会話履歴に追加
+            add_chat_history(chat_message, cached["answer"])
+
+        return cached["context"], cached_answer_stream()
+
+    start_time = time.perf_counter()
+    # 検索結果は、重複の除去・隣り合うチャンクの結合を行いつつトークン数の上限まで詰める
+    context = pack_context(retriever.invoke(query))
+
+    def answer_stream():
+        tokens = []
+        for token in rag_chains["question_answer_chain"].stream(
+            {"input": chat_message, "chat_history": chat_history, "context": context}
+        ):
+            tokens.append(token)
+            yield token
+        answer = "".join(tokens)
+        # LLMレスポンスを会話履歴に追加
+        add_chat_history(chat_message, answer)
+        _answer_cache.store(
+            query_vector, ct.ANSWER_MODE_2, index["version"], answer, context, time.perf_counter() - start_time, search_filter
+        )
+
+    return context, answer_stream()
+
+
+def get_scoped_retriever(index, query):
+    """
+    検索対象の絞り込み条件と、その条件で検索するRetrieverを取得
+    画面で検索対象を選択した場合はその条件、選択していない場合は入力から自動で判定した条件を使う
+    （自動で判定した条件で0件の場合は、絞り込まずに検索し直す）
+
+    Args:
+        index: 共有インデックス（「retriever」「facets」を使う）
+        query: 会話履歴なしでも理解できる入力テキスト
+
+    Returns:
+        (絞り込み条件の辞書（絞り込まない場合はNone）, Retriever) のタプル
+    """
+    search_filter = st.session_state.get("search_scope")
+    if search_filter:
+        return search_filter, index["retriever"].with_filter(search_filter)
+
+    search_filter = detect_search_filter(query, index["facets"])
+    return search_filter, index["retriever"].with_filter(search_filter, fallback=True)
+
+
+def detect_search_filter(query, facets):
+    """
+    入力から検索対象の絞り込み条件を判定
+    顧客名が含まれる場合はその顧客の資料、部署名と「議事録」などの語句が含まれる場合はその部署の議事録に絞り込む
+
+    Args:
+        query: 会話履歴なしでも理解できる入力テキスト
+        facets: メタデータの項目名をキー、値の一覧を値とする辞書
+
+    Returns:
+        絞り込み条件の辞書（該当しない場合はNone）
+    """
+    normalized_query = normalize_text(query)
+
+    for customer in facets.get("customer", []):
+        # 「グローバルフュージョン」のように、法人格を省略して入力される場合も一致させる
+        name = customer
+        for suffix in ct.COMPANY_NAME_SUFFIXES:
+            name = name.replace(suffix, "")
+        if normalize_text(name) in normalized_query:
+            return {"customer": customer}
+
+    if any(normalize_text(keyword) in normalized_query for keyword in ct.MEETING_MINUTES_KEYWORDS):
+        for department in facets.get("department", []):
+            if normalize_text(department) in normalized_query:
+                return {"department": department}
+
+    return None
+
+
+def lookup_answer_cache(index, query, mode, search_filter=None):
+    """
+    過去の類似した質問の回答をキャッシュから検索
+
+    Args:
+        index: 共有インデックス（「retriever」「version」を使う）
+        query: 会話履歴なしでも理解できる入力テキスト
+        mode: 回答モード
+        search_filter: 検索対象の絞り込み条件（Noneの場合は絞り込みなし）
+
+    Returns:
+        (保存済みの回答の辞書（該当がない場合はNone）, 検索クエリの埋め込みベクトル) のタプル
+    """
+    logger = logging.getLogger(ct.LOGGER_NAME)
+
+    # 埋め込みベクトルは埋め込みキャッシュに保存されるため、続く検索でAPIが再度呼ばれることはない
+    query_vector = index["retriever"].vectorstore.embeddings.embed_query(query)
+    cached = _answer_cache.lookup(query_vector, mode, index["version"], search_filter)
+    if cached is not None:
+        stats = _answer_cache.get_stats()
+        logger.info(
+            f"{ct.ANSWER_CACHE_HIT_MESSAGE} 類似度: {cached['similarity']:.3f}、"
+            f"短縮時間: {cached['elapsed_seconds']:.2f}秒、ヒット率: {stats['hit_rate']:.1%}、"
+            f"累計短縮時間: {stats['saved_seconds']:.1f}秒"
+        )
+    return cached, query_vector
+
+
+def get_answer_cache_stats():
+    """
+    回答キャッシュの利用状況の取得
+
+    Returns:
+        「hits」「misses」「hit_rate」「saved_seconds」「entries」をキーに持つ辞書
+    """
+    return _answer_cache.get_stats()
+
+
+def get_prompt_history():
+    """
+    プロンプトに渡す会話履歴の取得（古い往復の要約文と、直近の往復）
+    バックグラウンドでの要約が完了していれば、先に会話履歴に反映する
+
+    Returns:
+        メッセージの一覧
+    """
+    apply_chat_compaction()
+    return build_prompt_history(st.session_state.get("chat_summary", ""), st.session_state.chat_history)
+
+
+def add_chat_history(chat_message, answer):
+    """
+    ユーザー入力値とLLMからの回答を、LLMとのやりとり用の会話履歴に追加
+    会話履歴がトークン数・往復数の上限を超えた場合は、古い往復の要約をバックグラウンドで開始する
+
+    Args:
+        chat_message: ユーザー入力値
+        answer: LLMからの回答
+    """
+    st.session_state.chat_history.extend([HumanMessage(content=chat_message), AIMessage(content=answer)])
+    start_chat_compaction()
+
+
+def start_chat_compaction():
+    """
+    会話履歴が上限を超えた場合に、古い往復の要約をバックグラウンドで開始
+    （要約のLLM呼び出しで回答の表示や次の入力を待たせないよう、完了は待たずに apply_chat_compaction() で反映する）
+    """
+    # 前回の要約がまだ反映されていない場合は、反映後に改めて判定する
+    if st.session_state.get("chat_compaction") is not None:
+        return
+
+    chat_history = st.session_state.chat_history
+    size = get_compaction_size(chat_history)
+    if not size:
+        return
+
+    messages = chat_history[:size]
+    future = _summary_executor.submit(
+        summarize_old_messages,
+        get_rag_chains()["history_summary_chain"],
+        st.session_state.get("chat_summary", ""),
+        messages
     )
+    st.session_state.chat_compaction = {"future": future, "messages": messages}
+
+
+def summarize_old_messages(summary_chain, summary, messages):
+    """
+    古い往復を要約文にまとめる（バックグラウンドのスレッドで実行される）
+    要約に失敗した場合も、会話履歴が増え続けないよう古い往復は削除するため、それまでの要約文を返す
+
+    Args:
+        summary_chain: 「summary」「conversation」を入力とし、要約文を返すChain
+        summary: これまでの要約文（ない場合は空文字）
+        messages: 要約文にまとめるメッセージの一覧
 
+    Returns:
+        新しい要約文
+    """
+    try:
+        return summarize_history(summary_chain, summary, messages)
+    except Exception as e:
+        logging.getLogger(ct.LOGGER_NAME).warning(f"{ct.CHAT_SUMMARY_ERROR_MESSAGE}\n{e}")
+        return summary
+
+
+def apply_chat_compaction():
+    """
+    バックグラウンドでの要約が完了していれば、要約文を更新し、要約した古い往復を会話履歴から削除
+    （完了していない場合は待たず、今回はそのままの会話履歴を使う）
+    """
+    compaction = st.session_state.get("chat_compaction")
+    if compaction is None or not compaction["future"].done():
+        return
+    st.session_state.chat_compaction = None
+
+    # 要約中に会話履歴が初期化された場合などは、要約した往復が先頭に残っていないため反映しない
+    chat_history = st.session_state.chat_history
+    messages = compaction["messages"]
+    if len(chat_history) < len(messages) or any(a is not b for a, b in zip(chat_history, messages)):
+        return
+
+    st.session_state.chat_summary = compaction["future"].result()
+    st.session_state.chat_history = chat_history[len(messages):]
+    logging.getLogger(ct.LOGGER_NAME).info(
+        f"{ct.CHAT_HISTORY_COMPACTED_MESSAGE} 要約した件数: {len(messages)}件、残りの件数: {len(chat_history) - len(messages)}件"
+    )
+    # 要約中に追加された往復で、再び上限を超えている場合に備える
+    start_chat_compaction()
+
+
+def add_display_message(role, content):
+    """
+    画面表示用の会話ログにメッセージを追加（件数の上限を超えた場合は古いものから削除）
+
+    Args:
+        role: 「user」または「assistant」
+        content: メッセージの内容
+    """
+    messages = st.session_state.messages
+    messages.append({"role": role, "content": content})
+    if len(messages) > ct.CHAT_DISPLAY_MAX_MESSAGES:
+        del messages[:len(messages) - ct.CHAT_DISPLAY_MAX_MESSAGES]
+
+
+def get_rag_chains():
+    """
+    プロセス全体で共有するChainの取得（初回のみ作成）
+    LLMのHTTPクライアントも共有されるため、リクエストごとの接続確立（TLSハンドシェイク）が発生しない
+    検索は実行のたびに共有インデックスから最新のRetrieverを取得して行うため、インデックスが差し替わっても作り直す必要はない
+
+    Returns:
+        「question_generator_chain」「question_answer_chain」「history_summary_chain」をキーに持つ辞書
+    """
+    global _rag_chains
+
+    with _rag_chains_lock:
+        if _rag_chains is None:
+            llm = create_llm()
+            _rag_chains = {
+                "question_generator_chain": create_question_generator_chain(llm),
+                "question_answer_chain": create_question_answer_chain(llm, ct.ANSWER_MODE_2),
+                "history_summary_chain": create_history_summary_chain(llm),
+            }
+        return _rag_chains
+
+
+def create_llm():
+    """
+    LLMのオブジェクトを作成（コネクションを保持して再利用するHTTPクライアントを使う）
+
+    Returns:
+        LLMのオブジェクト
+    """
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=ct.LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=ct.LLM_HTTP_MAX_CONNECTIONS,
+            keepalive_expiry=ct.LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS
+        ),
+        timeout=ct.LLM_HTTP_TIMEOUT_SECONDS
+    )
+    return ChatOpenAI(model_name=ct.MODEL, temperature=ct.TEMPERATURE, http_client=http_client)
+
+
+def search_documents(chat_message, chat_history, query, retriever):
+    """
+    「社内文書検索」モードの検索（回答生成用のLLMは呼び出さない）
+    関連度スコアが DOC_SEARCH_RELEVANCE_THRESHOLD 以上のチャンクも、検索クエリ中の語句を完全に含むチャンクもない場合は「該当資料なし」とする
+
+    Args:
+        chat_message: ユーザー入力値
+        chat_history: 会話履歴
+        query: 会話履歴なしでも理解できる入力テキスト（get_standalone_question() の戻り値）
+        retriever: ハイブリッド検索のRetriever
+
+    Returns:
+        create_rag_chain() のChainと同じ形式の辞書（「input」「chat_history」「context」「answer」）
+    """
+    # 関連があると判断できるチャンクのみを、統合後の順位の高い順に取得
+    context = retriever.search_with_threshold(query, ct.DOC_SEARCH_RELEVANCE_THRESHOLD)
+
+    return {
+        "input": chat_message,
+        "chat_history": chat_history,
+        "context": context,
+        # 回答生成用のプロンプト（SYSTEM_PROMPT_DOC_SEARCH）と同じく、関連がある場合は空文字とする
+        "answer": "" if context else ct.NO_DOC_MATCH_ANSWER,
+    }
+
+
+def create_rag_chain(llm, retriever, mode):
+    """
+    「RAG x 会話履歴の記憶機能」を実現するためのChainを作成
+
+    Args:
+        llm: LLMのオブジェクト
+        retriever: RAGのRetriever（検索クエリの文字列を入力とするRunnable）
+        mode: 回答モード（「社内文書検索」または「社内問い合わせ」）
+
+    Returns:
+        「input」「chat_history」を入力とするChain
+    """
+    # 会話履歴なしでもLLMに理解してもらえる、独立した入力テキストを取得するためのChainを作成
+    question_generator_chain = create_question_generator_chain(llm)
+    # 独立した入力テキストで検索するRetrieverを作成
+    # （書き換えが不要な入力の場合は、LLMを呼び出さずにそのまま検索する）
+    history_aware_retriever = RunnableLambda(
+        lambda inputs: get_standalone_question(inputs["input"], inputs["chat_history"], question_generator_chain)
+    ).with_config(run_name="condense_question") | retriever
+    # 「社内問い合わせ」モードでは、検索結果を重複の除去・隣り合うチャンクの結合を行いつつトークン数の上限まで詰める
+    if mode == ct.ANSWER_MODE_2:
+        history_aware_retriever = history_aware_retriever | RunnableLambda(pack_context).with_config(run_name="pack_context")
+
+    # LLMから回答を取得する用のChainを作成
+    question_answer_chain = create_question_answer_chain(llm, mode)
+    # 「RAG x 会話履歴の記憶機能」を実現するためのChainを作成
+    return create_retrieval_chain(history_aware_retriever, question_answer_chain)
+
+
+def create_question_answer_chain(llm, mode):
+    """
+    検索結果（context）をもとにLLMから回答を取得する用のChainを作成
+
+    Args:
+        llm: LLMのオブジェクト
+        mode: 回答モード（「社内文書検索」または「社内問い合わせ」）
+
+    Returns:
+        「input」「chat_history」「context」を入力とし、回答の文字列を返すChain
+    """
     # モードによってLLMから回答を取得する用のプロンプトを変更
-    if st.session_state.mode == ct.ANSWER_MODE_1:
+    if mode == ct.ANSWER_MODE_1:
         # モードが「社内文書検索」の場合のプロンプト
         question_answer_template = ct.SYSTEM_PROMPT_DOC_SEARCH
     else:
@@ -97,20 +516,122 @@ def get_llm_response(chat_message):
             ("human", "{input}")
         ]
     )
+    return create_stuff_documents_chain(llm, question_answer_prompt)
+
+
+def create_question_generator_chain(llm):
+    """
+    会話履歴なしでもLLMに理解してもらえる、独立した入力テキストを生成するためのChainを作成
+
+    Args:
+        llm: LLMのオブジェクト
 
-    # 会話履歴なしでもLLMに理解してもらえる、独立した入力テキストを取得するためのRetrieverを作成
-    history_aware_retriever = create_history_aware_retriever(
-        llm, st.session_state.retriever, question_generator_prompt
+    Returns:
+        「input」「chat_history」を入力とし、独立した入力テキストを返すChain
+    """
+    # 独立した入力テキストを取得するためのプロンプトテンプレートを作成
+    question_generator_template = ct.SYSTEM_PROMPT_CREATE_INDEPENDENT_TEXT
+    question_generator_prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", question_generator_template),
+            MessagesPlaceholder("chat_history"),
+            ("human", "{input}")
+        ]
     )
+    return question_generator_prompt | llm | StrOutputParser()
 
-    # LLMから回答を取得する用のChainを作成
-    question_answer_chain = create_stuff_documents_chain(llm, question_answer_prompt)
-    # 「RAG x 会話履歴の記憶機能」を実現するためのChainを作成
-    chain = create_retrieval_chain(history_aware_retriever, question_answer_chain)
 
-    # LLMへのリクエストとレスポンス取得
-    llm_response = chain.invoke({"input": chat_message, "chat_history": st.session_state.chat_history})
-    # LLMレスポンスを会話履歴に追加
-    st.session_state.chat_history.extend([HumanMessage(content=chat_message), llm_response["answer"]])
+def create_history_summary_chain(llm):
+    """
+    会話履歴の古い往復を、これまでの要約文に加えて要約するためのChainを作成
+
+    Args:
+        llm: LLMのオブジェクト
+
+    Returns:
+        「summary」「conversation」を入力とし、要約文を返すChain
+    """
+    history_summary_prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", ct.SYSTEM_PROMPT_SUMMARIZE_HISTORY)
+        ]
+    )
+    return history_summary_prompt | llm | StrOutputParser()
+
+
+def get_standalone_question(chat_message, chat_history, question_generator_chain):
+    """
+    会話履歴なしでも理解できる、独立した入力テキストを取得
+    書き換えが不要な場合はユーザー入力値をそのまま返し、書き換えた結果は (会話履歴, 入力) の組ごとにキャッシュする
+
+    Args:
+        chat_message: ユーザー入力値
+        chat_history: 会話履歴
+        question_generator_chain: 独立した入力テキストを生成するChain
+
+    Returns:
+        独立した入力テキスト
+    """
+    if not needs_history_rewrite(chat_message, chat_history):
+        return chat_message
+
+    key = (get_history_digest(chat_history), chat_message)
+    with _rewrite_cache_lock:
+        if key in _rewrite_cache:
+            _rewrite_cache.move_to_end(key)
+            return _rewrite_cache[key]
+
+    standalone_question = question_generator_chain.invoke({"input": chat_message, "chat_history": chat_history})
 
-    return llm_response
\ No newline at end of file
+    with _rewrite_cache_lock:
+        _rewrite_cache[key] = standalone_question
+        # 上限を超えた場合、最も長く使われていないものから削除
+        while len(_rewrite_cache) > ct.HISTORY_REWRITE_CACHE_SIZE:
+            _rewrite_cache.popitem(last=False)
+
+    return standalone_question
+
+
+def needs_history_rewrite(chat_message, chat_history):
+    """
+    ユーザー入力値を、会話履歴を踏まえて書き換える必要があるかを判定
+
+    Args:
+        chat_message: ユーザー入力値
+        chat_history: 会話履歴
+
+    Returns:
+        書き換えが必要な場合はTrue
+    """
+    # 会話履歴がない場合、書き換えても内容は変わらない
+    if not chat_history:
+        return False
+    # 短い入力（「人事部は？」など）は、直前の会話の続きである可能性が高い
+    if len(chat_message.strip()) <= ct.HISTORY_REWRITE_SHORT_INPUT_LENGTH:
+        return True
+    # 主題を省略した質問（「営業部の場合は？」など）は、直前の会話の主題を補う
+    if chat_message.strip().rstrip("？?。").endswith(tuple(ct.HISTORY_ELLIPSIS_ENDINGS)):
+        return True
+    # 指示語など、会話履歴を参照する語句が含まれる場合のみ書き換える（「それぞれ」などの語句の一部は除く）
+    remaining_text = chat_message
+    for word in ct.HISTORY_REFERENCE_EXCLUDED_WORDS:
+        remaining_text = remaining_text.replace(word, "")
+    return any(keyword in remaining_text for keyword in ct.HISTORY_REFERENCE_KEYWORDS)
+
+
+def get_history_digest(chat_history):
+    """
+    会話履歴のダイジェスト（ハッシュ値）を作成
+
+    Args:
+        chat_history: 会話履歴（メッセージ、または回答の文字列の一覧）
+
+    Returns:
+        ハッシュ値
+    """
+    digest = hashlib.sha256()
+    for message in chat_history:
+        role = getattr(message, "type", "ai")
+        content = getattr(message, "content", message)
+        digest.update(f"{role}\x00{content}\x00".encode("utf-8"))
+    return digest.hexdigest()
\ No newline at end of file
@@ -0,0 +1,175 @@
+"""
+このファイルは、RAGの参照先となるデータソースのフォルダを監視し、変更をインデックスに反映する処理が記述されたファイルです。
+watchdog（inotifyなど）が使える場合はOSのファイル変更通知を、使えない場合は更新日時のポーリングを使います。
+"""
+
+############################################################
+# ライブラリの読み込み
+############################################################
+import os
+import logging
+import threading
+import time
+import constants as ct
+import indexer
+
+
+############################################################
+# 設定関連
+############################################################
+# 監視用スレッド（プロセス内で1度だけ起動する）
+_watcher_thread = None
+_watcher_lock = threading.Lock()
+
+# 反映待ちのパスと、最後に変更を検知した時刻
+_pending_paths = set()
+_last_event_time = 0.0
+_pending_lock = threading.Lock()
+
+
+############################################################
+# 関数定義
+############################################################
+
+def start_watcher():
+    """
+    データソースのフォルダの監視を開始（設定で無効の場合、またはすでに監視中の場合は何もしない）
+    """
+    global _watcher_thread
+
+    if not ct.WATCH_DATA_FOLDER:
+        return
+
+    with _watcher_lock:
+        if _watcher_thread is not None:
+            return
+        _watcher_thread = threading.Thread(target=_watch_loop, name="data-folder-watcher", daemon=True)
+        _watcher_thread.start()
+
+
+def add_pending_path(path):
+    """
+    変更を検知したパスを反映待ちに追加
+
+    Args:
+        path: 追加・変更・削除されたファイル、またはフォルダのパス
+    """
+    global _last_event_time
+
+    with _pending_lock:
+        _pending_paths.add(path)
+        _last_event_time = time.monotonic()
+
+
+def _watch_loop():
+    """
+    監視用スレッドで実行する処理
+    変更の検知が落ち着いてから（デバウンス）、変更されたファイルをまとめてインデックスに反映する
+    """
+    logger = logging.getLogger(ct.LOGGER_NAME)
+
+    observer = _start_observer()
+    if observer is not None:
+        logger.info(f"{ct.WATCHER_START_MESSAGE} 方式: ファイル変更通知")
+        poll_interval = None
+    else:
+        logger.info(f"{ct.WATCHER_START_MESSAGE} 方式: 更新日時のポーリング")
+        poll_interval = ct.WATCH_POLL_INTERVAL_SECONDS
+        snapshot = take_snapshot(ct.RAG_TOP_FOLDER_PATH)
+        last_poll_time = time.monotonic()
+
+    while True:
+        time.sleep(1.0)
+
+        # ポーリング方式の場合、前回のスナップショットと比較して変更を検知
+        if poll_interval is not None and time.monotonic() - last_poll_time >= poll_interval:
+            new_snapshot = take_snapshot(ct.RAG_TOP_FOLDER_PATH)
+            for path in diff_snapshots(snapshot, new_snapshot):
+                add_pending_path(path)
+            snapshot = new_snapshot
+            last_poll_time = time.monotonic()
+
+        # 最後の変更からデバウンス時間が経過していれば、反映待ちのパスをまとめて反映
+        with _pending_lock:
+            if not _pending_paths or time.monotonic() - _last_event_time < ct.WATCH_DEBOUNCE_SECONDS:
+                continue
+            paths = sorted(_pending_paths)
+            _pending_paths.clear()
+
+        try:
+            indexer.update_sources(paths)
+        except Exception as e:
+            # 反映に失敗しても監視は継続する（次回の起動時やインデックス更新時に、差分として再度反映される）
+            logger.error(f"{ct.WATCHER_ERROR_MESSAGE}\n{e}")
+
+
+def _start_observer():
+    """
+    watchdogによるファイル変更通知の監視を開始
+
+    Returns:
+        監視中のObserver（watchdogが使えない場合はNone）
+    """
+    try:
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+    except ImportError:
+        return None
+
+    class _DataFolderEventHandler(FileSystemEventHandler):
+        """
+        ファイル変更通知を受け取り、反映待ちに追加するハンドラー
+        """
+        def on_any_event(self, event):
+            # 読み込みのみのイベントは、インデックスに影響しないため無視する
+            if event.event_type in ("opened", "closed_no_write"):
+                return
+            for path in (event.src_path, getattr(event, "dest_path", "")):
+                if path and (event.is_directory or os.path.splitext(path)[1].lower() in ct.SUPPORTED_EXTENSIONS):
+                    add_pending_path(path)
+
+    try:
+        observer = Observer()
+        observer.schedule(_DataFolderEventHandler(), ct.RAG_TOP_FOLDER_PATH, recursive=True)
+        observer.daemon = True
+        observer.start()
+    except Exception:
+        # inotifyの監視数の上限に達した場合などは、ポーリングに切り替える
+        return None
+    return observer
+
+
+def take_snapshot(path):
+    """
+    フォルダ配下のファイルの更新日時とサイズを取得
+
+    Args:
+        path: 対象のフォルダのパス
+
+    Returns:
+        ファイルパスをキー、(更新日時, サイズ) を値とする辞書
+    """
+    snapshot = {}
+    for file_path in indexer.collect_source_files(path):
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            continue
+        snapshot[file_path] = (stat.st_mtime, stat.st_size)
+    return snapshot
+
+
+def diff_snapshots(old_snapshot, new_snapshot):
+    """
+    2つのスナップショットを比較し、追加・変更・削除されたファイルパスを取得
+
+    Args:
+        old_snapshot: 前回のスナップショット
+        new_snapshot: 今回のスナップショット
+
+    Returns:
+        追加・変更・削除されたファイルパスの一覧
+    """
+    changed_paths = [path for path, stat in new_snapshot.items() if old_snapshot.get(path) != stat]
+    removed_paths = [path for path in old_snapshot if path not in new_snapshot]
+    return changed_paths + removed_paths
@@ -0,0 +1,237 @@
+"""
+このファイルは、RAGの参照先となるWebページの取得とローカルキャッシュに関する処理が記述されたファイルです。
+インデックス作成時はキャッシュを読み込むだけで、Webページの再取得はアプリの起動とは独立した周期で行います。
+"""
+
+############################################################
+# ライブラリの読み込み
+############################################################
+import os
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import requests
+from bs4 import BeautifulSoup
+from langchain.schema import Document as LangchainDocument
+import constants as ct
+
+
+############################################################
+# 設定関連
+############################################################
+# 再取得用スレッド（プロセス内で1度だけ起動する）
+_refresher_thread = None
+_refresher_lock = threading.Lock()
+# キャッシュファイルの読み書きの排他制御用ロック
+_cache_lock = threading.Lock()
+
+
+############################################################
+# 関数定義
+############################################################
+
+def load_web_documents(urls):
+    """
+    Webページのドキュメントをキャッシュから読み込み
+    キャッシュがないWebページのみ、その場で取得する（取得に失敗したWebページは結果に含めない）
+
+    Args:
+        urls: 読み込み対象のWebページのURLの一覧
+
+    Returns:
+        URLをキー、ドキュメントの一覧を値とする辞書
+    """
+    missing_urls = [url for url in urls if load_cache_entry(url) is None]
+    if missing_urls:
+        refresh_web_cache(missing_urls)
+
+    web_docs_all = {}
+    for url in urls:
+        entry = load_cache_entry(url)
+        if entry is not None:
+            web_docs_all[url] = html_to_documents(url, entry["content"])
+    return web_docs_all
+
+
+def refresh_web_cache(urls):
+    """
+    Webページを並行して再取得し、キャッシュを更新
+    ETag / Last-Modified による条件付きリクエストを行い、変更がなければ本文は再取得しない
+    取得に失敗した（オフラインなど）場合は、キャッシュをそのまま残す
+
+    Args:
+        urls: 再取得対象のWebページのURLの一覧
+
+    Returns:
+        内容が変わったWebページのURLの一覧
+    """
+    if not urls:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(len(urls), ct.WEB_FETCH_MAX_WORKERS)) as executor:
+        results = list(executor.map(fetch_web_page, urls))
+
+    return [url for url, changed in zip(urls, results) if changed]
+
+
+def fetch_web_page(url):
+    """
+    Webページを1件取得してキャッシュに保存
+
+    Args:
+        url: WebページのURL
+
+    Returns:
+        内容が変わった（新規取得を含む）場合はTrue
+    """
+    logger = logging.getLogger(ct.LOGGER_NAME)
+
+    entry = load_cache_entry(url)
+    headers = {"User-Agent": ct.WEB_FETCH_USER_AGENT}
+    if entry is not None:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    try:
+        response = requests.get(url, headers=headers, timeout=ct.WEB_FETCH_TIMEOUT_SECONDS)
+        # 変更がない場合は、取得日時のみ更新する
+        if response.status_code == 304 and entry is not None:
+            entry["fetched_at"] = datetime.now().isoformat(timespec="seconds")
+            save_cache_entry(url, entry)
+            return False
+        response.raise_for_status()
+    except Exception as e:
+        logger.warning(f"{ct.WEB_FETCH_ERROR_MESSAGE} {url}\n{e}")
+        return False
+
+    # 文字コードの指定がない場合は、本文から推定した文字コードを使う
+    if response.encoding is None or response.encoding.lower() == "iso-8859-1":
+        response.encoding = response.apparent_encoding
+    content = response.text
+    changed = entry is None or entry["content"] != content
+    save_cache_entry(url, {
+        "url": url,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "fetched_at": datetime.now().isoformat(timespec="seconds"),
+        "content": content,
+    })
+    return changed
+
+
+def html_to_documents(url, html):
+    """
+    HTMLから本文のテキストを抽出してドキュメントを作成（WebBaseLoaderと同じ形式）
+
+    Args:
+        url: WebページのURL
+        html: HTMLの文字列
+
+    Returns:
+        ドキュメントの一覧
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    metadata = {"source": url}
+    if soup.title and soup.title.string:
+        metadata["title"] = soup.title.string.strip()
+    description = soup.find("meta", attrs={"name": "description"})
+    if description and description.get("content"):
+        metadata["description"] = description["content"]
+    html_tag = soup.find("html")
+    if html_tag and html_tag.get("lang"):
+        metadata["language"] = html_tag["lang"]
+
+    return [LangchainDocument(page_content=soup.get_text(), metadata=metadata)]
+
+
+def get_cache_path(url):
+    """
+    URLに対応するキャッシュファイルのパスを取得
+
+    Args:
+        url: WebページのURL
+
+    Returns:
+        キャッシュファイルのパス
+    """
+    return os.path.join(ct.WEB_CACHE_DIR_PATH, f"{hashlib.sha1(url.encode('utf-8')).hexdigest()}.json")
+
+
+def load_cache_entry(url):
+    """
+    キャッシュの読み込み
+
+    Args:
+        url: WebページのURL
+
+    Returns:
+        キャッシュの辞書（キャッシュがない・壊れている場合はNone）
+    """
+    with _cache_lock:
+        try:
+            with open(get_cache_path(url), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+def save_cache_entry(url, entry):
+    """
+    キャッシュの保存（書き込み途中で壊れないよう、一時ファイルに書き込んでから置き換える）
+
+    Args:
+        url: WebページのURL
+        entry: キャッシュの辞書
+    """
+    path = get_cache_path(url)
+    with _cache_lock:
+        os.makedirs(ct.WEB_CACHE_DIR_PATH, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+def start_web_refresher(on_changed):
+    """
+    Webページの定期的な再取得を開始（プロセス内で1度だけ実行される）
+
+    Args:
+        on_changed: 内容が変わったWebページがあった場合に、そのURLの一覧を渡して呼び出す関数
+    """
+    global _refresher_thread
+
+    if not ct.WEB_URL_LOAD_TARGETS or ct.WEB_REFRESH_INTERVAL_SECONDS <= 0:
+        return
+
+    with _refresher_lock:
+        if _refresher_thread is not None:
+            return
+        _refresher_thread = threading.Thread(target=_refresh_loop, args=(on_changed,), name="web-cache-refresher", daemon=True)
+        _refresher_thread.start()
+
+
+def _refresh_loop(on_changed):
+    """
+    再取得用スレッドで実行する処理
+    起動直後はインデックス作成時にキャッシュの読み込み・取得を行うため、1周期待ってから最初の再取得を行う
+
+    Args:
+        on_changed: 内容が変わったWebページがあった場合に、そのURLの一覧を渡して呼び出す関数
+    """
+    logger = logging.getLogger(ct.LOGGER_NAME)
+    while True:
+        time.sleep(ct.WEB_REFRESH_INTERVAL_SECONDS)
+        try:
+            changed_urls = refresh_web_cache(ct.WEB_URL_LOAD_TARGETS)
+            if changed_urls:
+                logger.info(f"{ct.WEB_CACHE_UPDATED_MESSAGE} {', '.join(changed_urls)}")
+                on_changed(changed_urls)
+        except Exception as e:
+            logger.error(f"{ct.WEB_FETCH_ERROR_MESSAGE}\n{e}")